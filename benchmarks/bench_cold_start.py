@@ -0,0 +1,178 @@
+"""Cold start of an API worker: import breakdown and startup costs, against a budget
+
+Every run is a fresh interpreter (bytecode already compiled, as in the image),
+no network service needed:
+    - imports: python -X importtime -c "import <module>" for each entry point
+      (api.main by default, --modules e.g. api.ingestion.pipeline for the CLIs);
+      total and wall time, self time grouped by top-level package, heaviest
+      api.* modules, and which heavy packages the import left for later
+    - startup: what the lifespan and the first request still do after the
+      imports, timed step by step (OpenAI / instructor clients, including their
+      deferred imports; Qdrant and LangSmith clients; graph compiled with an
+      in-memory saver; tool descriptions, precomputed and parsed; first agent
+      prompt render). Network setup (Qdrant payload indexes, Postgres pool,
+      local index) is not included.
+Medians over --runs; the api.main import plus the startup steps are compared
+with --budget-ms (--fail-over-budget exits 1 above it).
+
+    PYTHONPATH=src:. python -m benchmarks.bench_cold_start [--runs 5] [--modules api.main api.ingestion.pipeline]
+"""
+
+# stdlib only at module level: probe() runs in the child interpreters and must
+# not import anything the measured startup would otherwise import first
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+# counted against the budget; the tool description steps repeat what the graph import already did
+BUDGET_STEPS = ["import api.main", "openai clients", "qdrant clients", "langsmith client", "compile_graph", "first prompt render"]
+HEAVY_PACKAGES = ["qdrant_client", "openai", "instructor", "langgraph", "langsmith.client", "numpy", "psycopg", "fastapi", "jinja2", "yaml"]
+
+
+#####################################################################################
+# Child interpreters
+#####################################################################################
+
+def probe():
+    """Startup steps after the imports, in order, printed as JSON (runs in the child)."""
+    steps = {}
+
+    def step(name, fn):
+        start = time.perf_counter()
+        result = fn()
+        steps[name] = round((time.perf_counter() - start) * 1000, 2)
+        return result
+
+    step("import api.main", lambda: __import__("api.main"))
+    loaded = {package: package in sys.modules for package in HEAVY_PACKAGES}
+
+    from langgraph.checkpoint.memory import InMemorySaver
+    from api.core.config import config
+    from api.core.langsmith_client import get_langsmith_client
+    from api.core.llm import open_llm_clients
+    from api.core.qdrant import get_qdrant_client, get_async_qdrant_client
+    from api.rag import graph
+    from api.rag.agent import build_agent_messages
+    from api.rag.tool_descriptions import load_tool_descriptions
+    from api.rag.utils.utils import get_tool_descriptions_from_node
+
+    step("openai clients", open_llm_clients)
+    step("qdrant clients", lambda: (get_qdrant_client(), get_async_qdrant_client()))
+    step("langsmith client", get_langsmith_client)
+    step("compile_graph", lambda: graph.compile_graph(InMemorySaver()))
+    step("tool descriptions (precomputed)", lambda: load_tool_descriptions(graph.tool_node))
+    step("tool descriptions (parsed)", lambda: get_tool_descriptions_from_node(graph.tool_node))
+    step("first prompt render", lambda: build_agent_messages(graph.tool_descriptions, []))
+    print(json.dumps({"steps": steps, "loaded": loaded, "precomputed": os.path.exists(config.TOOL_DESCRIPTIONS_PATH)}))
+
+
+def run_importtime(module: str) -> tuple[float, list[tuple]]:
+    """Wall time (ms) of `python -X importtime -c "import module"` and its (depth, module, self_us, cumulative_us) lines."""
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=os.environ.copy(), timeout=300,
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{completed.stderr[-2000:]}")
+
+    lines = []
+    for line in completed.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            lines.append((len(match.group(3)), match.group(4), int(match.group(1)), int(match.group(2))))
+    return wall_ms, lines
+
+
+def run_probe() -> dict:
+    completed = subprocess.run(
+        [sys.executable, "-c", "from benchmarks.bench_cold_start import probe; probe()"],
+        capture_output=True, text=True, env=os.environ.copy(), timeout=300,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"startup probe failed:\n{completed.stderr[-2000:]}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+#####################################################################################
+# Breakdown
+#####################################################################################
+
+def import_breakdown(module: str, runs: int, top: int) -> dict:
+    walls, totals, packages, api_modules, cumulative = [], [], {}, {}, {}
+    for _ in range(runs):
+        wall_ms, lines = run_importtime(module)
+        walls.append(wall_ms)
+        totals.append(sum(self_us for _, _, self_us, _ in lines) / 1000)
+        by_package = {}
+        for depth, name, self_us, cumulative_us in lines:
+            package = name.split(".")[0]
+            by_package[package] = by_package.get(package, 0) + self_us / 1000
+            if package == "api":
+                api_modules.setdefault(name, []).append(self_us / 1000)
+            cumulative.setdefault(name, []).append(cumulative_us / 1000)
+        for package, ms in by_package.items():
+            packages.setdefault(package, []).append(ms)
+
+    def ranked(values: dict) -> dict:
+        medians = {name: round(statistics.median(ms), 1) for name, ms in values.items()}
+        return dict(sorted(medians.items(), key=lambda item: -item[1])[:top])
+
+    return {
+        "wall_ms": round(statistics.median(walls), 1), # interpreter start included
+        "import_ms": round(statistics.median(totals), 1),
+        "packages_self_ms": ranked(packages),
+        "api_modules_self_ms": ranked(api_modules),
+        "modules_cumulative_ms": ranked({name: ms for name, ms in cumulative.items() if name != module}),
+    }
+
+
+def startup_breakdown(runs: int) -> dict:
+    probes = [run_probe() for _ in range(runs)]
+    steps = {name: round(statistics.median(probe["steps"][name] for probe in probes), 2) for name in probes[0]["steps"]}
+    return {"steps_ms": steps, "loaded_by_import": probes[0]["loaded"], "precomputed_tool_descriptions": probes[0]["precomputed"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modules", nargs="+", default=["api.main"], help="entry points to import")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="rows per ranking")
+    parser.add_argument("--budget-ms", type=float, default=4000.0, help="api.main import + startup steps (measured about 3.5 s in the dev container)")
+    parser.add_argument("--fail-over-budget", action="store_true")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    from benchmarks.common import RESULTS_DIR, write_results # sets the offline settings the children inherit
+
+    results = {"params": {"runs": args.runs, "budget_ms": args.budget_ms}, "imports": {}}
+    for module in args.modules:
+        breakdown = results["imports"][module] = import_breakdown(module, args.runs, args.top)
+        print(f"import {module}: {breakdown['import_ms']:.0f} ms (process {breakdown['wall_ms']:.0f} ms)")
+        for package, ms in breakdown["packages_self_ms"].items():
+            print(f"    {package:<32} {ms:>8.1f} ms")
+
+    startup = results["startup"] = startup_breakdown(args.runs)
+    print("startup after import (ms):")
+    for name, ms in startup["steps_ms"].items():
+        print(f"    {name:<32} {ms:>8.1f}")
+    print("loaded by import api.main: " + ", ".join(f"{package}={'yes' if loaded else 'no'}" for package, loaded in startup["loaded_by_import"].items()))
+
+    total = sum(startup["steps_ms"][name] for name in BUDGET_STEPS)
+    results["budget"] = {"total_ms": round(total, 1), "budget_ms": args.budget_ms, "over": total > args.budget_ms}
+    print(f"cold start {total:.0f} ms / budget {args.budget_ms:.0f} ms" + (" OVER BUDGET" if total > args.budget_ms else ""))
+
+    print(f"results written to {write_results(results, args.output or RESULTS_DIR / 'cold_start.json')}")
+    if args.fail_over_budget and results["budget"]["over"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Keyword branch of the hybrid item search: MatchText filter vs BM25 sparse vectors
+
+For each query the source item is the relevant one. Queries are natural-language
+requests built from a few words of the item text plus filler words, and the
+dense query vector is the item vector plus noise (no embeddings API needed).
+For both ITEM_KEYWORD_MODE values it reports:
+    - keyword_recall: relevant item among the keyword prefetch candidates
+    - hit_at_k: relevant item in the fused (RRF) top k
+    - latency of the hybrid query
+
+    # synthetic catalog in an in-memory Qdrant
+    PYTHONPATH=src:. python -m benchmarks.bench_keyword_branch --in-memory 3000 [--output results.json]
+    # against a collection with the bm25 vector (python -m api.rag.sparse backfill)
+    PYTHONPATH=src:. python -m benchmarks.bench_keyword_branch --collection items-bm25
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+
+from benchmarks.common import percentile, write_results
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.models import VectorParams, Distance, PointStruct, FusionQuery
+
+from api.core.config import config
+from api.core.qdrant import get_qdrant_client
+from api.rag import tools
+from api.rag.sparse import encode_document, keyword_prefetch, sparse_vectors_config, tokenize
+
+FILLERS = ["looking", "something", "good", "need", "recommend", "best", "cheap", "gift", "daily", "quality"]
+TEMPLATES = [
+    "i am looking for {} for my home",
+    "can you recommend {} please",
+    "what is the best {} under budget",
+    "need something like {} as a gift",
+]
+
+
+def synthetic_client(n: int, collection: str, dim: int = 256, seed: int = 0) -> QdrantClient:
+    rng = random.Random(seed)
+    vocabulary = [f"w{i}" for i in range(1500)]
+    vectors = np.random.default_rng(seed).standard_normal((n, dim), dtype=np.float32)
+
+    client = QdrantClient(":memory:")
+    client.create_collection(
+        collection,
+        vectors_config=VectorParams(size=dim, distance=Distance.COSINE),
+        sparse_vectors_config=sparse_vectors_config(),
+    )
+    for start in range(0, n, 500):
+        points = []
+        for i in range(start, min(n, start + 500)):
+            text = " ".join(rng.choices(vocabulary, k=rng.randint(8, 40)) + rng.choices(FILLERS, k=2))
+            points.append(PointStruct(
+                id=i,
+                vector={"": vectors[i].tolist(), config.SPARSE_VECTOR_NAME: encode_document(text)},
+                payload={"parent_asin": f"B{i:08d}", "text": text, "price": 10.0},
+            ))
+        client.upsert(collection, points)
+    return client
+
+
+def sample_queries(client: QdrantClient, collection: str, n: int, noise: float, seed: int = 0) -> list[dict]:
+    rng = random.Random(seed)
+    noise_rng = np.random.default_rng(seed)
+    points, _ = client.scroll(collection, limit=max(n * 4, 200), with_payload=["parent_asin", "text"], with_vectors=True)
+    queries = []
+    for point in rng.sample(points, min(n, len(points))):
+        vector = np.asarray(point.vector[""] if isinstance(point.vector, dict) else point.vector, dtype=np.float32)
+        words = tokenize(point.payload["text"]) or ["item"]
+        keywords = " ".join(rng.sample(words, min(3, len(words))))
+        queries.append({
+            "target": point.payload["parent_asin"],
+            "text": rng.choice(TEMPLATES).format(keywords),
+            "embedding": (vector + noise_rng.normal(0, noise * float(np.abs(vector).mean()), vector.shape)).tolist(),
+        })
+    return queries
+
+
+def run_mode(client: QdrantClient, collection: str, queries: list[dict], mode: str, top_k: int) -> dict:
+    config.ITEM_KEYWORD_MODE = mode
+    keyword_hits, fused_hits, latencies = 0, 0, []
+    for query in queries:
+        candidates = client.query_points( # keyword prefetch alone (rrf over one list keeps its order)
+            collection,
+            prefetch=[keyword_prefetch(query["text"], tools.ITEM_PREFETCH_LIMIT)],
+            query=FusionQuery(fusion="rrf"),
+            limit=tools.ITEM_PREFETCH_LIMIT,
+        ).points
+        keyword_hits += query["target"] in [point.payload["parent_asin"] for point in candidates]
+
+        args = tools.item_query_args(query["text"], query["embedding"], top_k)
+        args["collection_name"] = collection
+        start = time.perf_counter()
+        fused = client.query_points(**args).points
+        latencies.append((time.perf_counter() - start) * 1000)
+        fused_hits += query["target"] in [point.payload["parent_asin"] for point in fused]
+
+    return {
+        "keyword_recall": round(keyword_hits / len(queries), 4),
+        "hit_at_k": round(fused_hits / len(queries), 4),
+        "mean_ms": round(statistics.mean(latencies), 3),
+        "p95_ms": round(percentile(latencies, 0.95), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--in-memory", type=int, default=0, help="synthetic catalog size (0: use the configured Qdrant)")
+    parser.add_argument("--collection", default=None, help="collection with the bm25 sparse vector")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--noise", type=float, default=8.0, help="dense query noise, relative to the mean vector magnitude")
+    parser.add_argument("--output", default=None, help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    collection = args.collection or config.QDRANT_COLLECTION_NAME_ITEMS
+    client = synthetic_client(args.in_memory, collection) if args.in_memory else get_qdrant_client()
+    queries = sample_queries(client, collection, args.queries, args.noise)
+
+    results = {
+        "collection": collection,
+        "queries": len(queries),
+        "top_k": args.top_k,
+        **{mode: run_mode(client, collection, queries, mode, args.top_k) for mode in ("text_filter", "bm25")},
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        write_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Local (in-process) item retrieval vs the Qdrant hybrid query
+
+Runs the same hybrid item query (dense + text prefetch, RRF) through Qdrant and
+through api.rag.local_index, and reports latency and how often both return the
+same ranking. Query embeddings are stored item vectors plus noise and the text
+query is a word of the item text, so no embeddings API is needed.
+
+    # against the collection configured in .env
+    PYTHONPATH=src:. python -m benchmarks.bench_local_index
+    # synthetic catalog in an in-memory Qdrant
+    PYTHONPATH=src:. python -m benchmarks.bench_local_index --in-memory 3000 [--output results.json]
+"""
+
+import argparse
+import json
+import random
+import statistics
+import tempfile
+import time
+
+from benchmarks.common import percentile, summarize, write_results
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.models import VectorParams, Distance, PointStruct
+
+from api.core.config import config
+from api.core.qdrant import get_qdrant_client
+from api.rag.local_index import export_local_index, load_current
+from api.rag.tools import item_query_args, ITEM_PREFETCH_LIMIT
+
+WORDS = ["wireless", "earbuds", "charger", "cable", "stand", "case", "speaker", "keyboard", "mouse", "hub"]
+
+
+def synthetic_client(n: int, dim: int = 1536, seed: int = 0) -> QdrantClient:
+    rng = np.random.default_rng(seed)
+    client = QdrantClient(":memory:")
+    client.create_collection(config.QDRANT_COLLECTION_NAME_ITEMS, vectors_config=VectorParams(size=dim, distance=Distance.COSINE))
+    vectors = rng.standard_normal((n, dim), dtype=np.float32)
+    for start in range(0, n, 500):
+        client.upsert(config.QDRANT_COLLECTION_NAME_ITEMS, [
+            PointStruct(id=i, vector=vectors[i].tolist(), payload={
+                "parent_asin": f"B{i:08d}",
+                "text": " ".join(rng.choice(WORDS, size=4)),
+                "price": round(float(rng.uniform(5, 200)), 2),
+            })
+            for i in range(start, min(n, start + 500))
+        ])
+    return client
+
+
+def sample_queries(client: QdrantClient, n: int, seed: int = 0) -> list[tuple[str, list[float]]]:
+    rng = random.Random(seed)
+    points, _ = client.scroll(config.QDRANT_COLLECTION_NAME_ITEMS, limit=max(n * 4, 200), with_payload=["text"], with_vectors=True)
+    queries = []
+    for point in rng.sample(points, min(n, len(points))):
+        vector = np.asarray(point.vector, dtype=np.float32)
+        noisy = vector + np.random.default_rng(rng.randrange(1 << 30)).normal(0, float(np.abs(vector).mean()), vector.shape)
+        words = (point.payload.get("text") or "item").split()
+        queries.append((rng.choice(words), noisy.astype(np.float32).tolist()))
+    return queries
+
+
+def run(client: QdrantClient, queries: int, top_k: int) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        export_local_index(directory, client=client)
+        export_s = time.perf_counter() - start
+        index = load_current(directory)
+
+        qdrant_ms, local_ms, same_ranking, overlap = [], [], 0, []
+        for text, embedding in sample_queries(client, queries):
+            start = time.perf_counter()
+            remote = client.query_points(**item_query_args(text, embedding, top_k)).points
+            qdrant_ms.append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            local = index.query(text, embedding, top_k, ITEM_PREFETCH_LIMIT)
+            local_ms.append((time.perf_counter() - start) * 1000)
+
+            remote_ids = [point.payload["parent_asin"] for point in remote]
+            local_ids = [point.payload["parent_asin"] for point in local]
+            same_ranking += remote_ids == local_ids
+            overlap.append(len(set(remote_ids) & set(local_ids)) / max(1, len(remote_ids)))
+
+        return {
+            "points": len(index),
+            "queries": len(qdrant_ms),
+            "top_k": top_k,
+            "export_s": round(export_s, 2),
+            "qdrant": summarize(qdrant_ms),
+            "local": summarize(local_ms),
+            "same_ranking": round(same_ranking / len(qdrant_ms), 4),
+            "mean_overlap": round(statistics.mean(overlap), 4),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--in-memory", type=int, default=0, help="synthetic catalog size (0: use the configured Qdrant)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--output", default=None, help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    client = synthetic_client(args.in_memory) if args.in_memory else get_qdrant_client()
+    results = run(client, args.queries, args.top_k)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        write_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
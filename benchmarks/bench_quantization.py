@@ -0,0 +1,217 @@
+"""Vector quantization: memory per point, query latency and recall@k vs the unquantized baseline
+
+Two ways to run it:
+    - simulated (default, no services): the quantized search is reproduced with
+      NumPy (int8 codes with quantile bounds, sign bits for binary), brute force
+      over the candidates then rescoring with the float32 vectors. Recall is what
+      the quantization itself costs; latency is NumPy brute force, not HNSW.
+    - --url: real collections on a Qdrant server (the local mode of
+      qdrant-client ignores quantization), one per mode, same vectors, queried
+      with search_params() of api.core.quantization. Ground truth is an exact
+      search of the unquantized collection.
+
+Vectors are a synthetic clustered catalog (embeddings are not isotropic), or
+the points of an existing collection with --source.
+
+    PYTHONPATH=src:. python -m benchmarks.bench_quantization --points 20000 [--output results.json]
+    PYTHONPATH=src:. python -m benchmarks.bench_quantization --url http://localhost:6333 --source reviews
+"""
+
+import argparse
+import json
+import statistics
+import time
+
+from benchmarks.common import percentile, write_results
+
+import numpy as np
+from qdrant_client import QdrantClient, models
+
+from api.core.config import config
+from api.core.quantization import MODES, quantization_config, vectors_config, search_params, vector_ram_bytes
+
+
+def synthetic_vectors(n: int, dim: int, clusters: int = 50, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    vectors = centers[rng.integers(0, clusters, n)] + 0.7 * rng.standard_normal((n, dim), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def source_vectors(client: QdrantClient, collection: str, limit: int) -> np.ndarray:
+    vectors, offset = [], None
+    while len(vectors) < limit:
+        points, offset = client.scroll(collection, limit=min(512, limit - len(vectors)), offset=offset, with_vectors=True)
+        vectors += [point.vector[""] if isinstance(point.vector, dict) else point.vector for point in points]
+        if offset is None:
+            break
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def query_vectors(vectors: np.ndarray, n: int, seed: int = 1) -> np.ndarray:
+    """Queries near the catalog: stored vectors plus noise."""
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.choice(len(vectors), n, replace=False)] + 0.03 * rng.standard_normal((n, vectors.shape[1]), dtype=np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def top(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, len(scores))
+    best = np.argpartition(-scores, k - 1)[:k]
+    return best[np.argsort(-scores[best], kind="stable")]
+
+
+def recall(found: list, truth: list) -> float:
+    return len(set(found) & set(truth)) / max(1, len(truth))
+
+
+def row(mode: str, oversampling: float, rescore: bool, dim: int, recalls: list[float], latencies: list[float]) -> dict:
+    return {
+        "quantization": mode,
+        "oversampling": oversampling,
+        "rescore": rescore,
+        "vector_ram_bytes_per_point": vector_ram_bytes(dim, mode, on_disk=mode != "none"),
+        "vector_ram_bytes_per_point_originals_in_ram": vector_ram_bytes(dim, mode, on_disk=False),
+        "recall_at_k": round(statistics.mean(recalls), 4),
+        "p50_ms": round(percentile(latencies, 0.5), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+    }
+
+
+#####################################################################################
+# Simulated (NumPy)
+#####################################################################################
+
+class SimulatedIndex:
+
+    def __init__(self, vectors: np.ndarray, mode: str, quantile: float):
+        self.vectors = vectors
+        self.mode = mode
+        if mode == "scalar":
+            tail = (1 - quantile) / 2
+            self.low, self.high = np.quantile(vectors, [tail, 1 - tail])
+            step = (self.high - self.low) / 255
+            codes = np.clip(np.round((vectors - self.low) / step), 0, 255)
+            self.approx = (codes * step + self.low).astype(np.float32) # dequantized int8 codes
+        elif mode == "binary":
+            self.approx = np.where(vectors > 0, 1, -1).astype(np.float32)
+
+    def search(self, query: np.ndarray, k: int, oversampling: float, rescore: bool) -> list[int]:
+        if self.mode == "none":
+            return top(self.vectors @ query, k).tolist()
+        encoded = np.where(query > 0, 1, -1).astype(np.float32) if self.mode == "binary" else query
+        candidates = top(self.approx @ encoded, int(k * oversampling) if rescore else k)
+        if not rescore:
+            return candidates.tolist()
+        return candidates[top(self.vectors[candidates] @ query, k)].tolist()
+
+
+def run_simulated(vectors: np.ndarray, queries: np.ndarray, top_k: int, oversamplings: list[float]) -> list[dict]:
+    truth = [top(vectors @ query, top_k).tolist() for query in queries]
+    results = []
+    for mode in MODES:
+        index = SimulatedIndex(vectors, mode, config.QUANTIZATION_SCALAR_QUANTILE)
+        settings = [(1.0, False)] if mode == "none" else [(1.0, False)] + [(o, True) for o in oversamplings]
+        for oversampling, rescore in settings:
+            recalls, latencies = [], []
+            for query, expected in zip(queries, truth):
+                start = time.perf_counter()
+                found = index.search(query, top_k, oversampling, rescore)
+                latencies.append((time.perf_counter() - start) * 1000)
+                recalls.append(recall(found, expected))
+            results.append(row(mode, oversampling, rescore, vectors.shape[1], recalls, latencies))
+    return results
+
+
+#####################################################################################
+# Qdrant server
+#####################################################################################
+
+def build_collection(client: QdrantClient, name: str, vectors: np.ndarray, mode: str):
+    if client.collection_exists(name):
+        client.delete_collection(name)
+    client.create_collection(
+        name,
+        vectors_config=vectors_config(vectors.shape[1], mode),
+        quantization_config=quantization_config(mode),
+    )
+    for start in range(0, len(vectors), 512):
+        client.upload_points(name, [
+            models.PointStruct(id=i, vector=vectors[i].tolist())
+            for i in range(start, min(len(vectors), start + 512))
+        ])
+    while client.get_collection(name).status != models.CollectionStatus.GREEN: # indexing / quantizing done
+        time.sleep(1)
+
+
+def run_qdrant(client: QdrantClient, vectors: np.ndarray, queries: np.ndarray, top_k: int, oversamplings: list[float], prefix: str) -> list[dict]:
+    collections = {mode: f"{prefix}-{mode}" for mode in MODES}
+    for mode, name in collections.items():
+        build_collection(client, name, vectors, mode)
+
+    exact = models.SearchParams(exact=True)
+    truth = [
+        [point.id for point in client.query_points(collections["none"], query=query.tolist(), limit=top_k, search_params=exact).points]
+        for query in queries
+    ]
+
+    results = []
+    for mode in MODES:
+        settings = [(1.0, False)] if mode == "none" else [(1.0, False)] + [(o, True) for o in oversamplings]
+        for oversampling, rescore in settings:
+            config.QUANTIZATION_OVERSAMPLING, config.QUANTIZATION_RESCORE = oversampling, rescore
+            params = search_params()
+            recalls, latencies = [], []
+            for query, expected in zip(queries, truth):
+                start = time.perf_counter()
+                points = client.query_points(collections[mode], query=query.tolist(), limit=top_k, search_params=params).points
+                latencies.append((time.perf_counter() - start) * 1000)
+                recalls.append(recall([point.id for point in points], expected))
+            results.append(row(mode, oversampling, rescore, vectors.shape[1], recalls, latencies))
+
+    for name in collections.values():
+        client.delete_collection(name)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default=None, help="Qdrant server to benchmark (default: NumPy simulation)")
+    parser.add_argument("--source", default=None, help="take the vectors of this collection (needs --url)")
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--oversampling", type=float, nargs="+", default=[1.0, 2.0, 4.0])
+    parser.add_argument("--prefix", default="bench-quantization", help="prefix of the collections created on the server")
+    parser.add_argument("--output", default=None, help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    client = QdrantClient(url=args.url) if args.url else None
+    if args.source:
+        vectors = source_vectors(client, args.source, args.points)
+    else:
+        vectors = synthetic_vectors(args.points, args.dim)
+    queries = query_vectors(vectors, min(args.queries, len(vectors)))
+
+    if client is None:
+        results = run_simulated(vectors, queries, args.top_k, args.oversampling)
+    else:
+        results = run_qdrant(client, vectors, queries, args.top_k, args.oversampling, args.prefix)
+
+    results = {
+        "mode": "qdrant" if client else "simulated",
+        "points": len(vectors),
+        "dim": int(vectors.shape[1]),
+        "queries": len(queries),
+        "top_k": args.top_k,
+        "results": results,
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        write_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""Shared helpers of the offline benchmarks
+
+Import this module before anything from `api`: without a .env it fills in the
+settings api.core.config requires with placeholders, and it always turns
+LangSmith tracing and the on-disk embedding cache off. The offline benchmarks
+never call a network service:
+    - seed_catalog(): QdrantClient(":memory:") with synthetic items and reviews
+    - fake_embedding(): deterministic vector seeded by a hash of the text
+    - offline_services(): the app's shared Qdrant client and embeddings call
+      replaced by the two above, for the duration of a with block
+"""
+
+import hashlib
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+OFFLINE_ENV = {
+    "OPENAI_API_KEY": "offline",
+    "GROQ_API_KEY": "offline",
+    "GOOGLE_API_KEY": "offline",
+    "QDRANT_URL": "localhost",
+    "QDRANT_COLLECTION_NAME_ITEMS": "bench-items",
+    "QDRANT_COLLECTION_NAME_REVIEWS": "bench-reviews",
+    "EMBEDDING_MODEL": "text-embedding-3-small",
+    "EMBEDDING_MODEL_PROVIDER": "openai",
+    "GENERATION_MODEL": "gpt-4.1",
+    "GENERATION_MODEL_PROVIDER": "openai",
+    "LANGSMITH_ENDPOINT": "http://localhost:1",
+    "LANGSMITH_API_KEY": "offline",
+    "LANGSMITH_PROJECT": "benchmarks",
+}
+if not Path(".env").exists(): # a .env (e.g. to benchmark a real Qdrant) takes precedence
+    for key, value in OFFLINE_ENV.items():
+        os.environ.setdefault(key, value)
+os.environ["LANGSMITH_TRACING"] = "false"
+os.environ["EMBEDDING_CACHE_PATH"] = ""
+
+import numpy as np  # noqa: E402
+from unittest import mock  # noqa: E402
+from qdrant_client import QdrantClient  # noqa: E402
+from qdrant_client.models import VectorParams, Distance, PointStruct  # noqa: E402
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+WORDS = [
+    "wireless", "earbuds", "charger", "cable", "stand", "case", "speaker", "keyboard", "mouse", "hub",
+    "usb", "bluetooth", "noise", "cancelling", "battery", "portable", "gaming", "monitor", "laptop", "adapter",
+    "headphones", "waterproof", "fast", "compact", "camera", "tripod", "ssd", "router", "mesh", "smart",
+]
+REVIEW_WORDS = ["great", "sound", "broke", "after", "week", "love", "it", "battery", "life", "poor", "comfortable", "value"]
+
+
+#####################################################################################
+# Fake embedder and synthetic catalog
+#####################################################################################
+
+def fake_embedding(text: str, dim: int = 1536) -> list[float]:
+    seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+    vector = np.random.default_rng(seed).standard_normal(dim, dtype=np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def item_asin(i: int) -> str:
+    return f"B{i:09d}"
+
+
+def seed_catalog(items: int = 1000, reviews_per_item: int = 5, dim: int = 1536, seed: int = 0) -> QdrantClient:
+    """In-memory Qdrant with the items (dense + bm25) and reviews collections of the config."""
+    from api.core.config import config
+    from api.rag.sparse import encode_document, sparse_vectors_config
+
+    rng = random.Random(seed)
+    client = QdrantClient(":memory:")
+    client.create_collection(
+        config.QDRANT_COLLECTION_NAME_ITEMS,
+        vectors_config=VectorParams(size=dim, distance=Distance.COSINE),
+        sparse_vectors_config=sparse_vectors_config(),
+    )
+    client.create_collection(config.QDRANT_COLLECTION_NAME_REVIEWS, vectors_config=VectorParams(size=dim, distance=Distance.COSINE))
+
+    for start in range(0, items, 500):
+        points = []
+        for i in range(start, min(items, start + 500)):
+            text = " ".join(rng.choices(WORDS, k=rng.randint(8, 30)))
+            points.append(PointStruct(
+                id=i,
+                vector={"": fake_embedding(text, dim), config.SPARSE_VECTOR_NAME: encode_document(text)},
+                payload={
+                    "parent_asin": item_asin(i),
+                    "text": text,
+                    "price": round(rng.uniform(5, 300), 2),
+                    "first_large_image": f"https://images.example.com/{item_asin(i)}.jpg",
+                },
+            ))
+        client.upsert(config.QDRANT_COLLECTION_NAME_ITEMS, points)
+
+    review_id = 0
+    for start in range(0, items, 200):
+        points = []
+        for i in range(start, min(items, start + 200)):
+            for _ in range(reviews_per_item):
+                text = " ".join(rng.choices(REVIEW_WORDS, k=rng.randint(5, 40)))
+                points.append(PointStruct(id=review_id, vector=fake_embedding(f"{review_id} {text}", dim), payload={"parent_asin": item_asin(i), "text": text}))
+                review_id += 1
+        client.upsert(config.QDRANT_COLLECTION_NAME_REVIEWS, points)
+    return client
+
+
+@contextmanager
+def offline_services(client: QdrantClient, dim: int = 1536):
+    """Route the app's Qdrant client and embeddings API call to the in-memory catalog and fake embedder."""
+    import api.core.qdrant as qdrant_module
+    import api.rag.embeddings as embeddings_module
+    from api.core.config import config
+
+    def create_embeddings(texts, model):
+        return [fake_embedding(text, dim) for text in texts]
+
+    with mock.patch.object(qdrant_module, "_client", client), \
+            mock.patch.object(embeddings_module, "create_embeddings", create_embeddings), \
+            mock.patch.object(config, "EMBEDDING_BATCHING_ENABLED", False), \
+            mock.patch.object(config, "LOCAL_INDEX_ENABLED", False):
+        yield
+
+
+#####################################################################################
+# Timing and results
+#####################################################################################
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def summarize(latencies_ms: list[float]) -> dict:
+    mean = statistics.mean(latencies_ms)
+    return {
+        "iterations": len(latencies_ms),
+        "mean_ms": round(mean, 4),
+        "p50_ms": round(percentile(latencies_ms, 0.5), 4),
+        "p95_ms": round(percentile(latencies_ms, 0.95), 4),
+        "p99_ms": round(percentile(latencies_ms, 0.99), 4),
+        "ops_per_s": round(1000 / mean, 1) if mean else 0.0,
+    }
+
+
+def measure(fn, iterations: int, warmup: int = 5) -> dict:
+    """Call fn(i) `iterations` times after `warmup` calls, returns the latency summary."""
+    for i in range(warmup):
+        fn(i)
+    latencies = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn(i)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return summarize(latencies)
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+    }
+
+
+def write_results(results: dict, output: str | Path) -> Path:
+    path = Path(output)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({"environment": environment(), **results}, indent=2))
+    return path
@@ -0,0 +1,210 @@
+"""Load test driver: replays a query mix against /rag and reports latency per concurrency level
+
+    PYTHONPATH=src:. python -m benchmarks.loadtest.driver --url http://localhost:8000 \
+        --concurrency 1 4 16 64 --duration 60 [--rps 20] [--queries queries.jsonl] [--endpoint /rag/stream]
+
+Each level runs for --duration seconds:
+    - closed loop (default): `concurrency` virtual users, each sends its next
+      query as soon as the previous answer arrived
+    - open loop (--rps): requests start on a fixed schedule of `rps` per second,
+      at most `concurrency` in flight; latency counts from the scheduled start,
+      so time spent queued behind a slow server is included (no coordinated omission)
+
+Queries come from --queries (JSONL with a "query" key, or one query per line)
+or a synthetic mix. --followup-rate sends that fraction of the queries on an
+existing thread id of the same virtual user (multi-turn, history from Postgres).
+
+Reported per level: throughput, p50 / p95 / p99 latency of the successful
+requests (and time to first event for /rag/stream), errors by kind.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from benchmarks.common import RESULTS_DIR, WORDS, percentile, write_results
+
+import httpx
+
+TEMPLATES = [
+    "I need {} for my desk",
+    "What are the best {} under 50 dollars?",
+    "Can you recommend {}?",
+    "Compare a few {} with good reviews",
+]
+FOLLOWUPS = [
+    "What do the reviews say about the first one?",
+    "Is there a cheaper option?",
+    "Which one has the best battery life?",
+]
+
+
+def load_queries(path: str | None, count: int = 200, seed: int = 0) -> list[str]:
+    if path:
+        queries = []
+        for line in Path(path).read_text().splitlines():
+            line = line.strip()
+            if line:
+                queries.append(json.loads(line)["query"] if line.startswith("{") else line)
+        return queries
+    rng = random.Random(seed)
+    return [rng.choice(TEMPLATES).format(" ".join(rng.sample(WORDS, 2))) for _ in range(count)]
+
+
+class Level:
+    """Outcome of the requests of one concurrency level."""
+
+    def __init__(self):
+        self.latencies = []
+        self.first_event = []
+        self.errors = Counter()
+        self.sent = 0
+
+    def report(self, concurrency: int, rps: float, elapsed: float) -> dict:
+        ok = len(self.latencies)
+        latency = lambda q: round(percentile(self.latencies, q), 1) if ok else None  # noqa: E731
+        report = {
+            "concurrency": concurrency,
+            "target_rps": rps or None,
+            "requests": self.sent,
+            "ok": ok,
+            "throughput_rps": round(ok / elapsed, 2),
+            "p50_ms": latency(0.5),
+            "p95_ms": latency(0.95),
+            "p99_ms": latency(0.99),
+            "error_rate": round(sum(self.errors.values()) / self.sent, 4) if self.sent else 0.0,
+            "errors": dict(self.errors),
+        }
+        if self.first_event:
+            report["first_event_p50_ms"] = round(percentile(self.first_event, 0.5), 1)
+            report["first_event_p95_ms"] = round(percentile(self.first_event, 0.95), 1)
+        return report
+
+
+class Driver:
+
+    def __init__(self, client: httpx.AsyncClient, endpoint: str, queries: list[str], followup_rate: float, seed: int = 0):
+        self.client = client
+        self.endpoint = endpoint
+        self.queries = queries
+        self.followup_rate = followup_rate
+        self.rng = random.Random(seed)
+
+    def next_request(self, threads: list[str]) -> dict:
+        if threads and self.rng.random() < self.followup_rate:
+            return {"query": self.rng.choice(FOLLOWUPS), "thread_id": threads[-1]}
+        threads.append(f"loadtest-{uuid.uuid4().hex[:12]}")
+        return {"query": self.rng.choice(self.queries), "thread_id": threads[-1]}
+
+    async def send(self, payload: dict, level: Level, started: float):
+        level.sent += 1
+        try:
+            if self.endpoint.endswith("/stream"):
+                await self.send_stream(payload, level, started)
+            else:
+                response = await self.client.post(self.endpoint, json=payload)
+                if response.status_code != 200:
+                    level.errors[f"http_{response.status_code}"] += 1
+                    return
+                level.latencies.append((time.perf_counter() - started) * 1000)
+        except httpx.TimeoutException:
+            level.errors["timeout"] += 1
+        except httpx.HTTPError as e:
+            level.errors[type(e).__name__] += 1
+
+    async def send_stream(self, payload: dict, level: Level, started: float):
+        first_event = None
+        async with self.client.stream("POST", self.endpoint, json=payload) as response:
+            if response.status_code != 200:
+                level.errors[f"http_{response.status_code}"] += 1
+                return
+            async for line in response.aiter_lines():
+                if first_event is None and line.startswith("event:"):
+                    first_event = (time.perf_counter() - started) * 1000
+                if line.startswith("event: error"):
+                    level.errors["stream_error"] += 1
+                    return
+        level.latencies.append((time.perf_counter() - started) * 1000)
+        if first_event is not None:
+            level.first_event.append(first_event)
+
+    async def closed_loop(self, concurrency: int, duration: float) -> Level:
+        level = Level()
+        deadline = time.perf_counter() + duration
+
+        async def user():
+            threads = []
+            while time.perf_counter() < deadline:
+                await self.send(self.next_request(threads), level, time.perf_counter())
+
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+        return level
+
+    async def open_loop(self, concurrency: int, duration: float, rps: float) -> Level:
+        level = Level()
+        in_flight = asyncio.Semaphore(concurrency)
+        threads, tasks = [], []
+        start = time.perf_counter()
+
+        async def request(payload: dict, scheduled: float):
+            async with in_flight:
+                await self.send(payload, level, scheduled)
+
+        for n in range(int(duration * rps)):
+            scheduled = start + n / rps
+            await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+            tasks.append(asyncio.create_task(request(self.next_request(threads), scheduled)))
+        await asyncio.gather(*tasks)
+        return level
+
+
+async def run(args) -> list[dict]:
+    limits = httpx.Limits(max_connections=max(args.concurrency) + 8, max_keepalive_connections=max(args.concurrency))
+    timeout = httpx.Timeout(args.timeout, connect=10.0)
+    reports = []
+    async with httpx.AsyncClient(base_url=args.url, timeout=timeout, limits=limits) as client:
+        driver = Driver(client, args.endpoint, load_queries(args.queries), args.followup_rate, args.seed)
+        if args.warmup:
+            await driver.closed_loop(min(args.concurrency), args.warmup)
+        for concurrency in args.concurrency:
+            start = time.perf_counter()
+            if args.rps:
+                level = await driver.open_loop(concurrency, args.duration, args.rps)
+            else:
+                level = await driver.closed_loop(concurrency, args.duration)
+            report = level.report(concurrency, args.rps, time.perf_counter() - start)
+            reports.append(report)
+            print(
+                f"c={concurrency:<4} {report['throughput_rps']:>7.2f} req/s  p50 {report['p50_ms']} p95 {report['p95_ms']} "
+                f"p99 {report['p99_ms']} ms  errors {report['error_rate']:.2%} {report['errors'] or ''}"
+            )
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a query mix against the API at several concurrency levels")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--endpoint", default="/rag", choices=["/rag", "/rag/stream"])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds per concurrency level")
+    parser.add_argument("--rps", type=float, default=0.0, help="open loop arrival rate (default: closed loop)")
+    parser.add_argument("--warmup", type=float, default=10.0, help="seconds of traffic before the first level")
+    parser.add_argument("--queries", default=None, help="JSONL ({\"query\": ...}) or text file, one query per line")
+    parser.add_argument("--followup-rate", type=float, default=0.3)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=str(RESULTS_DIR / "loadtest.json"))
+    args = parser.parse_args()
+
+    levels = asyncio.run(run(args))
+    params = {key: getattr(args, key) for key in ("url", "endpoint", "duration", "rps", "followup_rate", "queries")}
+    print(f"results written to {write_results({'params': params, 'levels': levels}, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
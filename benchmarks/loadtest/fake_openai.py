@@ -0,0 +1,208 @@
+"""OpenAI-compatible stand-in for load tests (no credits, predictable latency)
+
+    PYTHONPATH=src:. python -m benchmarks.loadtest.fake_openai --port 8100 --latency-ms 800 --ms-per-token 10
+    # then run the API with OPENAI_BASE_URL=http://localhost:8100/v1
+
+Endpoints:
+    - POST /v1/embeddings: deterministic unit vectors seeded by a hash of each input
+    - POST /v1/chat/completions: when the request carries tools (instructor's
+      structured output), answers with a call to the first tool whose arguments
+      follow the agent's flow of a turn:
+        1. no tool output yet -> get_formatted_item_context(query=<user message>)
+        2. item context received -> get_formatted_review_context(item_list=<ids>), with --review-step
+        3. otherwise -> final answer citing the items of the tool output
+      without tools, a plain text answer (history summaries). stream=true is
+      answered as server-sent chunks (the /rag/stream path).
+
+Latency: --latency-ms (+- --jitter-ms) before the first token, plus
+--ms-per-token for each output token. --error-rate answers that fraction of
+the requests with a 429 or a 500, to exercise the client retries.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+
+from benchmarks.common import fake_embedding
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+ITEM_ID = re.compile(r"^- ([^,:\s]+)[,:]", re.MULTILINE) # "- <parent_asin>, price: ..." lines of the item tool
+
+
+class Settings:
+    latency_ms = 800.0
+    jitter_ms = 200.0
+    ms_per_token = 10.0
+    embedding_latency_ms = 50.0
+    embedding_dim = 1536
+    error_rate = 0.0
+    review_step = True
+    answer_words = 60
+
+
+settings = Settings()
+stats = {"chat": 0, "embeddings": 0, "errors_injected": 0}
+app = FastAPI()
+
+
+def tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+async def wait(first_token_ms: float, output_tokens: int = 0):
+    jitter = random.uniform(-settings.jitter_ms, settings.jitter_ms) if settings.jitter_ms else 0.0
+    await asyncio.sleep(max(0.0, first_token_ms + jitter + output_tokens * settings.ms_per_token) / 1000)
+
+
+def injected_error():
+    if settings.error_rate and random.random() < settings.error_rate:
+        stats["errors_injected"] += 1
+        status = random.choice([429, 500])
+        return JSONResponse({"error": {"message": "injected by the load test", "type": "server_error"}}, status_code=status)
+    return None
+
+
+def agent_decision(messages: list[dict]) -> dict:
+    """AgentResponse arguments for the current step of the turn (see the module docstring)."""
+    last_user = max(i for i, message in enumerate(messages) if message["role"] == "user")
+    question = str(messages[last_user]["content"])
+    tool_outputs = [str(message.get("content") or "") for message in messages[last_user:] if message["role"] == "tool"]
+
+    if not tool_outputs:
+        return {"answer": "", "final_answer": False, "retrieved_context_ids": [], "tool_calls": [
+            {"name": "get_formatted_item_context", "arguments": {"query": question, "top_k": 5}},
+        ]}
+
+    item_ids = list(dict.fromkeys(ITEM_ID.findall(tool_outputs[0])))[:5]
+    if settings.review_step and len(tool_outputs) == 1 and item_ids:
+        return {"answer": "", "final_answer": False, "retrieved_context_ids": [], "tool_calls": [
+            {"name": "get_formatted_review_context", "arguments": {"query": question, "item_list": item_ids, "top_k": 20}},
+        ]}
+
+    answer = " ".join(["Here", "is", "what", "I", "found", "for", "you."] * (settings.answer_words // 7 + 1))[:settings.answer_words * 6]
+    return {
+        "answer": answer,
+        "final_answer": True,
+        "tool_calls": [],
+        "retrieved_context_ids": [{"id": item_id, "description": f"Matching item {item_id}"} for item_id in item_ids],
+    }
+
+
+def completion(body: dict, content: str | None, tool_call: dict | None) -> dict:
+    message = {"role": "assistant", "content": content}
+    if tool_call:
+        message["tool_calls"] = [tool_call]
+    prompt_tokens = sum(tokens(str(message.get("content") or "")) for message in body.get("messages", []))
+    completion_tokens = tokens(content or tool_call["function"]["arguments"])
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fake"),
+        "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if tool_call else "stop"}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+    }
+
+
+def stream_chunks(body: dict, content: str | None, tool_call: dict | None):
+    """The same completion as chat.completion.chunk events, the text / arguments cut in small deltas."""
+    base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "object": "chat.completion.chunk", "created": int(time.time()), "model": body.get("model", "fake")}
+    text = tool_call["function"]["arguments"] if tool_call else (content or "")
+    pieces = [text[i:i + 16] for i in range(0, len(text), 16)] or [""]
+    for i, piece in enumerate(pieces):
+        if tool_call:
+            call = {"index": 0, "function": {"arguments": piece}}
+            if i == 0:
+                call.update(id=tool_call["id"], type="function", function={"name": tool_call["function"]["name"], "arguments": piece})
+            delta = {"tool_calls": [call]}
+        else:
+            delta = {"content": piece}
+        if i == 0:
+            delta["role"] = "assistant"
+        yield {**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+    yield {**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "tool_calls" if tool_call else "stop"}]}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["chat"] += 1
+    if (error := injected_error()) is not None:
+        return error
+
+    content, tool_call = None, None
+    if body.get("tools"):
+        name = body["tools"][0]["function"]["name"]
+        tool_call = {"id": f"call_{uuid.uuid4().hex[:8]}", "type": "function", "function": {
+            "name": name, "arguments": json.dumps(agent_decision(body["messages"])),
+        }}
+    else:
+        content = "Summary: the user looked at several electronics items and asked follow-up questions."
+    output_tokens = tokens(content or tool_call["function"]["arguments"])
+
+    if not body.get("stream"):
+        await wait(settings.latency_ms, output_tokens)
+        return completion(body, content, tool_call)
+
+    async def events():
+        await wait(settings.latency_ms)
+        chunks = list(stream_chunks(body, content, tool_call))
+        for chunk in chunks:
+            await asyncio.sleep(output_tokens * settings.ms_per_token / 1000 / len(chunks))
+            yield f"data: {json.dumps(chunk)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    stats["embeddings"] += 1
+    if (error := injected_error()) is not None:
+        return error
+
+    inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    await asyncio.sleep(settings.embedding_latency_ms / 1000)
+    prompt_tokens = sum(tokens(text) for text in inputs)
+    return {
+        "object": "list",
+        "model": body.get("model", "fake"),
+        "data": [{"object": "embedding", "index": i, "embedding": fake_embedding(text, settings.embedding_dim)} for i, text in enumerate(inputs)],
+        "usage": {"prompt_tokens": prompt_tokens, "total_tokens": prompt_tokens},
+    }
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stand-in for load tests")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=settings.latency_ms, help="time to first token")
+    parser.add_argument("--jitter-ms", type=float, default=settings.jitter_ms)
+    parser.add_argument("--ms-per-token", type=float, default=settings.ms_per_token)
+    parser.add_argument("--embedding-latency-ms", type=float, default=settings.embedding_latency_ms)
+    parser.add_argument("--embedding-dim", type=int, default=settings.embedding_dim)
+    parser.add_argument("--error-rate", type=float, default=settings.error_rate)
+    parser.add_argument("--no-review-step", action="store_true", help="answer right after the item lookup")
+    args = parser.parse_args()
+
+    settings.latency_ms, settings.jitter_ms, settings.ms_per_token = args.latency_ms, args.jitter_ms, args.ms_per_token
+    settings.embedding_latency_ms, settings.embedding_dim = args.embedding_latency_ms, args.embedding_dim
+    settings.error_rate, settings.review_step = args.error_rate, not args.no_review_step
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Synthetic catalog for load tests, written through the ingestion pipeline
+
+Writes items / reviews dumps in the format of the Amazon dataset and ingests
+them into the configured Qdrant (QDRANT_URL) with api.ingestion.pipeline. The
+embeddings go through OPENAI_BASE_URL, so with the fake server running the
+stored vectors match the query vectors the API gets from it.
+
+    OPENAI_BASE_URL=http://localhost:8100/v1 QDRANT_URL=localhost \
+        PYTHONPATH=src:. python -m benchmarks.loadtest.seed --items 5000 --reviews-per-item 10
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import random
+from pathlib import Path
+
+from benchmarks.common import REVIEW_WORDS, WORDS, item_asin
+
+from api.core.config import config
+from api.core.qdrant import get_async_qdrant_client, close_async_qdrant_client
+from api.ingestion.pipeline import ingest, openai_embedder, hashing_embedder
+
+DATA_DIR = Path("data/loadtest")
+
+
+def write_dumps(items: int, reviews_per_item: int, seed: int = 0) -> tuple[Path, Path]:
+    rng = random.Random(seed)
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    items_path, reviews_path = DATA_DIR / "items.jsonl.gz", DATA_DIR / "reviews.jsonl.gz"
+    with gzip.open(items_path, "wt") as items_file, gzip.open(reviews_path, "wt") as reviews_file:
+        for i in range(items):
+            asin = item_asin(i)
+            items_file.write(json.dumps({
+                "parent_asin": asin,
+                "title": " ".join(rng.choices(WORDS, k=rng.randint(3, 8))),
+                "features": [" ".join(rng.choices(WORDS, k=rng.randint(5, 15))) for _ in range(rng.randint(1, 4))],
+                "price": round(rng.uniform(5, 300), 2),
+                "average_rating": round(rng.uniform(1, 5), 1),
+                "rating_number": rng.randint(0, 5000),
+                "images": [{"large": f"https://images.example.com/{asin}.jpg"}],
+            }) + "\n")
+            for r in range(reviews_per_item):
+                reviews_file.write(json.dumps({
+                    "parent_asin": asin,
+                    "user_id": f"user-{i}-{r}",
+                    "timestamp": 1_600_000_000_000 + r,
+                    "title": " ".join(rng.choices(REVIEW_WORDS, k=3)),
+                    "text": " ".join(rng.choices(REVIEW_WORDS, k=rng.randint(5, 40))),
+                }) + "\n")
+    return items_path, reviews_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed Qdrant with a synthetic catalog for load tests")
+    parser.add_argument("--items", type=int, default=5000)
+    parser.add_argument("--reviews-per-item", type=int, default=10)
+    parser.add_argument("--fake-embeddings", action="store_true", help="embed in process (vectors unrelated to the query vectors)")
+    args = parser.parse_args()
+
+    items_path, reviews_path = write_dumps(args.items, args.reviews_per_item)
+    embedder = hashing_embedder() if args.fake_embeddings else openai_embedder()
+
+    async def run():
+        client = get_async_qdrant_client()
+        try:
+            return {
+                "items": await ingest("items", str(items_path), config.QDRANT_COLLECTION_NAME_ITEMS, embedder, client, restart=True),
+                "reviews": await ingest("reviews", str(reviews_path), config.QDRANT_COLLECTION_NAME_REVIEWS, embedder, client, restart=True),
+            }
+        finally:
+            await close_async_qdrant_client()
+
+    print(json.dumps(asyncio.run(run()), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Offline micro-benchmark suite of the retrieval path
+
+Runs each case against an in-memory Qdrant seeded with a synthetic catalog and
+a hash-based fake embedder (see benchmarks/common.py); no API key or service
+needed. Latencies (p50 / p95 / p99) and ops/s are written as JSON; with
+--baseline the run is compared to an earlier one and p50 regressions above
+--threshold are reported (and fail the run with --fail-on-regression).
+
+    PYTHONPATH=src:. python -m benchmarks.suite [--items 1000] [--iterations 200] [--only retrieve]
+    PYTHONPATH=src:. python -m benchmarks.suite --baseline benchmarks/results/baseline.json
+
+Cases:
+    - retrieve_item_context (text_filter and bm25 keyword branch), retrieve_review_context (grouped and global)
+    - process_item_context / process_review_context formatters
+    - get_tool_descriptions_from_node (parsed) and load_tool_descriptions (precomputed), lc_messages_to_regular_messages
+    - run_agent_wrapper hydration (the graph run is replaced by a canned result)
+"""
+
+import argparse
+import json
+import sys
+from unittest import mock
+
+from benchmarks.common import RESULTS_DIR, WORDS, item_asin, measure, offline_services, seed_catalog, write_results
+
+from langchain_core.messages import AIMessage, ToolMessage  # noqa: E402
+
+from api.core.config import config  # noqa: E402
+from api.rag import graph as graph_module  # noqa: E402
+from api.rag import tools  # noqa: E402
+from api.rag.agent import RAGUsedContext  # noqa: E402
+from api.rag.tool_descriptions import load_tool_descriptions  # noqa: E402
+from api.rag.utils.utils import get_tool_descriptions_from_node, lc_messages_to_regular_messages  # noqa: E402
+
+QUERIES = [" ".join(WORDS[i:i + 3]) for i in range(0, len(WORDS) - 3)]
+
+
+def conversation(turns: int = 5) -> list:
+    """A multi-turn history as stored in the graph state: user dicts, tool calls and long tool outputs."""
+    messages = []
+    for turn in range(turns):
+        messages.append({"role": "user", "content": f"I need {QUERIES[turn]} for my desk"})
+        messages.append(AIMessage(content="", tool_calls=[{
+            "id": f"call_{turn}", "name": "get_formatted_item_context", "args": {"query": QUERIES[turn], "top_k": 5},
+        }]))
+        messages.append(ToolMessage(content="- B0001, price: 19.99, " + " ".join(WORDS) * 8, tool_call_id=f"call_{turn}"))
+        messages.append(AIMessage(content="Here are a few options that match what you described. " * 5))
+    return messages
+
+
+def cases(items: int) -> dict:
+    """name -> fn(i), each run inside offline_services()."""
+    item_lists = [[item_asin((i * 7 + k) % items) for k in range(5)] for i in range(50)]
+    item_context = tools.retrieve_item_context(QUERIES[0], 5)
+    review_context = tools.retrieve_review_context(QUERIES[0], item_lists[0], 20)
+    messages = conversation()
+    canned = {
+        "answer": "Try these.",
+        "retrieved_context_ids": [RAGUsedContext(id=item_asin(k * 3 % items), description=f"item {k}") for k in range(5)],
+        "trace_id": "",
+    }
+
+    def keyword_mode(mode):
+        def run(i):
+            with mock.patch.object(config, "ITEM_KEYWORD_MODE", mode):
+                tools.retrieve_item_context(QUERIES[i % len(QUERIES)], 5)
+        return run
+
+    def review_mode(mode):
+        def run(i):
+            with mock.patch.object(config, "REVIEW_RETRIEVAL_MODE", mode):
+                tools.retrieve_review_context(QUERIES[i % len(QUERIES)], item_lists[i % len(item_lists)], 20)
+        return run
+
+    def run_agent_wrapper(i):
+        with mock.patch.object(graph_module, "run_agent", lambda question, thread_id: canned):
+            graph_module.run_agent_wrapper(QUERIES[i % len(QUERIES)], "bench-thread")
+
+    return {
+        "retrieve_item_context[text_filter]": keyword_mode("text_filter"),
+        "retrieve_item_context[bm25]": keyword_mode("bm25"),
+        "retrieve_review_context[grouped]": review_mode("grouped"),
+        "retrieve_review_context[global]": review_mode("global"),
+        "process_item_context": lambda i: tools.process_item_context(item_context),
+        "process_review_context": lambda i: tools.process_review_context(review_context),
+        "get_tool_descriptions_from_node": lambda i: get_tool_descriptions_from_node(graph_module.tool_node),
+        "load_tool_descriptions": lambda i: load_tool_descriptions(graph_module.tool_node),
+        "lc_messages_to_regular_messages": lambda i: [lc_messages_to_regular_messages(message) for message in messages],
+        "run_agent_wrapper[hydration]": run_agent_wrapper,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[dict]:
+    """Cases whose p50 grew by more than `threshold` (ratio) since the baseline."""
+    regressions = []
+    for name, current in results["cases"].items():
+        previous = baseline.get("cases", {}).get(name)
+        if not previous or not previous["p50_ms"]:
+            continue
+        ratio = current["p50_ms"] / previous["p50_ms"]
+        print(f"{name:<40} p50 {previous['p50_ms']:>9.3f} -> {current['p50_ms']:>9.3f} ms  x{ratio:.2f}")
+        if ratio > threshold:
+            regressions.append({"case": name, "baseline_p50_ms": previous["p50_ms"], "p50_ms": current["p50_ms"], "ratio": round(ratio, 2)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--reviews-per-item", type=int, default=5)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--only", default=None, help="run the cases whose name contains this")
+    parser.add_argument("--output", default=str(RESULTS_DIR / "suite.json"))
+    parser.add_argument("--baseline", default=None, help="earlier results to compare the p50s with")
+    parser.add_argument("--threshold", type=float, default=1.25, help="p50 ratio reported as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    client = seed_catalog(args.items, args.reviews_per_item, args.dim)
+    results = {
+        "params": {key: getattr(args, key) for key in ("items", "reviews_per_item", "dim", "iterations", "warmup")},
+        "cases": {},
+    }
+    with offline_services(client, args.dim):
+        for name, fn in cases(args.items).items():
+            if args.only and args.only not in name:
+                continue
+            results["cases"][name] = measure(fn, args.iterations, args.warmup)
+            stats = results["cases"][name]
+            print(f"{name:<40} p50 {stats['p50_ms']:>9.3f}  p95 {stats['p95_ms']:>9.3f}  p99 {stats['p99_ms']:>9.3f} ms  {stats['ops_per_s']:>10.1f} ops/s")
+
+    if args.baseline:
+        regressions = compare(results, json.loads(open(args.baseline).read()), args.threshold)
+        results["regressions"] = regressions
+        for regression in regressions:
+            print(f"REGRESSION {regression['case']}: x{regression['ratio']}")
+
+    print(f"results written to {write_results(results, args.output)}")
+    if args.baseline and args.fail_on_regression and results["regressions"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
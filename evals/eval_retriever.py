@@ -1,10 +1,10 @@
 import os
 
-from chatbot_ui.core.config import config
-from chatbot_ui.retrieval import rag_pipeline
+from api.core.config import config
+from api.core.qdrant import get_qdrant_client
+from api.rag.retrieval import rag_pipeline
 
 from langsmith import Client
-from qdrant_client import QdrantClient
 from langchain_openai import ChatOpenAI
 from langchain_openai import OpenAIEmbeddings
 
@@ -13,9 +13,7 @@ from ragas.embeddings import LangchainEmbeddingsWrapper
 
 
 ls_client = Client(api_key=config.LANGSMITH_API_KEY)
-qdrant_client = QdrantClient(
-    url=f"http://localhost:6333"
-)
+qdrant_client = get_qdrant_client()
 
 from ragas.dataset_schema import SingleTurnSample 
 from ragas.metrics import Faithfulness, ResponseRelevancy, LLMContextPrecisionWithoutReference, LLMContextRecall, NonLLMContextRecall
@@ -1,10 +1,26 @@
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Request, Depends, Header, HTTPException
+from fastapi.responses import StreamingResponse, Response
+import asyncio
+import hmac
 import logging
 
+from api.core.config import config
+from api.core.catalog_version import abump_catalog_version, acatalog_fingerprint
+from api.core.qdrant import get_async_qdrant_client
 from api.api.models import RAGRequest, RAGResponse, RAGUsedImage, FeedbackRequest, FeedbackResponse
 #from api.rag.retrieval import rag_pipeline_wrapper
-from api.rag.graph import run_agent_wrapper
-from api.processors.submit_feedback import submit_feedback
+from api.rag.graph import arun_agent_wrapper, astream_agent_wrapper
+from api.rag.utils.streaming import sse_event
+from api.processors.feedback_spool import feedback_spool, feedback_spool_stats
+from api.rag.embeddings import embedding_cache_stats, embedding_batcher_stats
+from api.core.postgres import postgres_pool_stats
+from api.core.llm import llm_client_stats
+from api.core import metrics
+from api.core.metrics import request_stages
+from api.rag.utils.utils import prompt_registry
+from api.rag.answer_cache import answer_cache, answer_cache_stats
+from api.rag.history import history_stats
+from api.rag.local_index import local_index, local_index_stats
 
 
 logger = logging.getLogger(__name__)
@@ -12,6 +28,7 @@ logger = logging.getLogger(__name__)
 # Routers 
 rag_router = APIRouter()
 feedback_router = APIRouter()
+stats_router = APIRouter()
 
 # Endpoint for RAG pipeline wrapper
 @rag_router.post("/rag")
@@ -21,7 +38,7 @@ async def rag(
     ) -> RAGResponse: 
     
     #result = rag_pipeline_wrapper(payload.query)
-    result = run_agent_wrapper(payload.query, payload.thread_id)
+    result = await arun_agent_wrapper(payload.query, payload.thread_id)
     
     used_image_urls = [RAGUsedImage(image_url=image["image_url"], price=image["price"], description=image["description"]) for image in result["retrieved_images"]]
     
@@ -33,6 +50,32 @@ async def rag(
     )
 
 
+# Streaming endpoint (server-sent events): node progress, answer tokens, then product cards
+@rag_router.post("/rag/stream")
+async def rag_stream(
+    request: Request,
+    payload: RAGRequest
+    ) -> StreamingResponse:
+
+    request_id = request.state.request_id
+
+    async def event_stream():
+        try:
+            async for event, data in astream_agent_wrapper(payload.query, payload.thread_id):
+                if event == "done": # headers are long gone, the stage durations travel with the last event
+                    data = {"request_id": request_id, **data, "server_timing": request_stages()}
+                yield sse_event(event, data)
+        except Exception as e:
+            logger.exception("Streaming request failed (request_id: %s)", request_id)
+            yield sse_event("error", {"request_id": request_id, "message": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}, # no proxy buffering
+    )
+
+
 # Endpoint for feedback
 @feedback_router.post("/submit_feedback")
 async def send_feedback(
@@ -40,14 +83,59 @@ async def send_feedback(
     payload: FeedbackRequest 
     ) -> FeedbackResponse: 
     
-    submit_feedback(payload.trace_id, payload.feedback_score, payload.feedback_text, payload.feedback_source_type)
+    # spooled on disk (a few ms off the event loop), sent to LangSmith by the background flush
+    await asyncio.to_thread(
+        feedback_spool.enqueue, payload.trace_id, payload.feedback_score, payload.feedback_text, payload.feedback_source_type,
+    )
     
     return FeedbackResponse(
         request_id=request.state.request_id,
         status="success",
     )
 
+# Endpoint for runtime stats (caches, pools)
+@stats_router.get("/stats")
+async def stats() -> dict:
+    return {
+        "embedding_cache": embedding_cache_stats(),
+        "embedding_batcher": embedding_batcher_stats(),
+        "postgres_pool": postgres_pool_stats(),
+        "llm": llm_client_stats(),
+        "prompt_versions": prompt_registry.versions(),
+        "answer_cache": answer_cache_stats(),
+        "history": history_stats(),
+        "local_index": local_index_stats(),
+        "feedback_spool": feedback_spool_stats(),
+    }
+
+# Prometheus scrape endpoint (per-stage latency histograms, see api/core/metrics.py)
+@stats_router.get("/metrics")
+async def prometheus_metrics() -> Response:
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+def require_admin_token(authorization: str = Header(default="")):
+    """Admin endpoints are disabled unless ADMIN_API_TOKEN is set, then need "Authorization: Bearer <token>"."""
+    if not config.ADMIN_API_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_API_TOKEN is not set)")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode("utf-8"), config.ADMIN_API_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Invalid admin token", headers={"WWW-Authenticate": "Bearer"})
+
+# Drop the cached answers and re-export the local items index of every worker (the ingestion jobs
+# do it themselves; this is for changes made outside them): bumps the catalog version of the items
+# collection, which every worker polls, and applies it to this worker right away
+@stats_router.post("/cache/invalidate", dependencies=[Depends(require_admin_token)])
+async def invalidate_cache() -> dict:
+    client = get_async_qdrant_client()
+    version = await abump_catalog_version(client, config.QDRANT_COLLECTION_NAME_ITEMS, "requested via API")
+    answer_cache.check_catalog_version(await acatalog_fingerprint(client, config.QDRANT_COLLECTION_NAME_ITEMS))
+    if config.LOCAL_INDEX_ENABLED:
+        await asyncio.to_thread(local_index.refresh)
+    return {"status": "success", "catalog_version": version}
+
 # Main router for API endpoints
 api_router = APIRouter()
 api_router.include_router(rag_router, tags=["rag"])
-api_router.include_router(feedback_router, tags=["feedback"])
\ No newline at end of file
+api_router.include_router(feedback_router, tags=["feedback"])
+api_router.include_router(stats_router, tags=["stats"])
\ No newline at end of file
@@ -1,21 +1,78 @@
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
-import uuid
+"""Request middleware (plain ASGI, streaming responses pass through untouched)
+
+RequestIdMiddleware, for every HTTP request:
+    - request id: the incoming X-Request-ID (TRUST_REQUEST_ID_HEADER) or a new
+      uuid4, available as request.state.request_id and echoed in X-Request-ID
+    - wall time: observed in rag_request_seconds once the response is fully
+      sent (a streamed response counts until its last chunk), one log line
+    - Server-Timing header: the stage durations collected so far (embed,
+      retrieve, llm, hydrate, checkpoint, see api/core/metrics.py) and "app",
+      the time to the response headers. /rag/stream sends its headers before
+      the agent runs, its stages are in the final "done" event instead.
+"""
+
 import logging
+import time
+import uuid
+
+from api.core.config import config
+from api.core.metrics import REQUEST_SECONDS, request_stages, start_request_stages
 
 logger = logging.getLogger(__name__)
 
-class RequestIdMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        
-        request_id = str(uuid.uuid4())
-        
-        request.state.request_id = request_id
-        logger.info(f"Request started: {request.method} {request.url.path} (request_id: {request_id})")
-        
-        response = await call_next(request)
-        
-        response.headers["X-Request-ID"] = request_id
-        logger.info(f"Request completed: {request.method} {request.url.path} (request_id: {request_id})")
-        
-        return response
\ No newline at end of file
+MAX_REQUEST_ID_LENGTH = 128
+
+
+def incoming_request_id(headers) -> str | None:
+    for name, value in headers:
+        if name == b"x-request-id":
+            value = value.decode("latin-1").strip()
+            if 0 < len(value) <= MAX_REQUEST_ID_LENGTH and value.isprintable():
+                return value
+            return None
+    return None
+
+
+def server_timing(stages: dict, app_ms: float) -> str:
+    return ", ".join([f"{stage};dur={ms}" for stage, ms in stages.items()] + [f"app;dur={app_ms}"])
+
+
+class RequestIdMiddleware:
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = (config.TRUST_REQUEST_ID_HEADER and incoming_request_id(scope["headers"])) or str(uuid.uuid4())
+        scope.setdefault("state", {})["request_id"] = request_id # read back as request.state.request_id
+        start_request_stages()
+        start = time.perf_counter()
+        status = 500 # unless the app starts a response
+
+        async def send_with_headers(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", request_id.encode("latin-1")))
+                if config.SERVER_TIMING_ENABLED:
+                    app_ms = round((time.perf_counter() - start) * 1000, 1)
+                    headers.append((b"server-timing", server_timing(request_stages(), app_ms).encode("latin-1")))
+                message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            elapsed = time.perf_counter() - start
+            # route template (set by the router on the shared scope) keeps the label bounded
+            route = scope.get("route")
+            REQUEST_SECONDS.labels(
+                route=route.path if route is not None else "unmatched",
+                status=f"{status // 100}xx",
+            ).observe(elapsed)
+            logger.info("%s %s %s %.1fms (request_id: %s)", scope["method"], scope["path"], status, elapsed * 1000, request_id)
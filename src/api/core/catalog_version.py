@@ -0,0 +1,83 @@
+"""Catalog versions shared by the API workers and the ingestion jobs
+
+The answer cache and the in-process items index are derived from the content
+of a collection; its points count misses re-embedded items, the BM25 backfill
+and payload-only updates (prices). Every writer bumps the version of the
+collection it changed, stored in a small vectorless Qdrant collection
+(CATALOG_VERSION_COLLECTION, one point per data collection):
+    - api/ingestion/pipeline.py: after a run that wrote points
+    - api/ingestion/reindex.py: after payload updates or deletes
+    - api/rag/sparse.py: after the BM25 backfill
+    - POST /cache/invalidate (ADMIN_API_TOKEN), for changes made outside of these
+Readers poll it (the answer cache every ANSWER_CACHE_VERSION_CHECK_SECONDS, the
+local index every LOCAL_INDEX_REFRESH_SECONDS), so every worker of every host
+picks up a change, whichever process made it.
+
+Collections never bumped have version "". The fingerprint also carries the
+points count, so writes that bypass these paths (the notebooks) are still
+noticed when they add or remove points.
+"""
+
+import logging
+import time
+import uuid
+
+from qdrant_client.models import PointStruct
+
+from api.core.config import config
+
+logger = logging.getLogger(__name__)
+
+
+def _point_id(collection: str) -> str:
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"catalog-version:{collection}"))
+
+
+def _version_point(collection: str, reason: str) -> tuple[str, PointStruct]:
+    version = uuid.uuid4().hex # random: concurrent bumps from different processes never collide
+    return version, PointStruct(
+        id=_point_id(collection),
+        vector={},
+        payload={"collection": collection, "version": version, "reason": reason, "updated_at": time.time()},
+    )
+
+
+def _version_of(records) -> str:
+    return (records[0].payload or {}).get("version", "") if records else ""
+
+
+def catalog_version(client, collection: str) -> str:
+    if not client.collection_exists(config.CATALOG_VERSION_COLLECTION):
+        return ""
+    return _version_of(client.retrieve(config.CATALOG_VERSION_COLLECTION, ids=[_point_id(collection)], with_payload=True))
+
+
+async def acatalog_version(client, collection: str) -> str:
+    if not await client.collection_exists(config.CATALOG_VERSION_COLLECTION):
+        return ""
+    return _version_of(await client.retrieve(config.CATALOG_VERSION_COLLECTION, ids=[_point_id(collection)], with_payload=True))
+
+
+def bump_catalog_version(client, collection: str, reason: str = "") -> str:
+    """Mark the content of `collection` as changed, returns the new version."""
+    if not client.collection_exists(config.CATALOG_VERSION_COLLECTION):
+        client.create_collection(config.CATALOG_VERSION_COLLECTION, vectors_config={})
+    version, point = _version_point(collection, reason)
+    client.upsert(config.CATALOG_VERSION_COLLECTION, points=[point], wait=True)
+    logger.info("Catalog version of %s bumped to %s (%s)", collection, version, reason)
+    return version
+
+
+async def abump_catalog_version(client, collection: str, reason: str = "") -> str:
+    if not await client.collection_exists(config.CATALOG_VERSION_COLLECTION):
+        await client.create_collection(config.CATALOG_VERSION_COLLECTION, vectors_config={})
+    version, point = _version_point(collection, reason)
+    await client.upsert(config.CATALOG_VERSION_COLLECTION, points=[point], wait=True)
+    logger.info("Catalog version of %s bumped to %s (%s)", collection, version, reason)
+    return version
+
+
+async def acatalog_fingerprint(client, collection: str) -> str:
+    """Changes whenever the collection content does: "<version>/<points count>"."""
+    info = await client.get_collection(collection)
+    return f"{await acatalog_version(client, collection)}/{info.points_count}"
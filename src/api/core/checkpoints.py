@@ -0,0 +1,188 @@
+"""Compact storage and retention for the LangGraph Postgres checkpointer
+
+CompressedSerializer: JsonPlusSerializer that zlib-compresses large channel
+values (the growing messages list) before they are written to checkpoint_blobs
+and checkpoint_writes. Compressed blobs are tagged "<type>+zlib", so rows
+written before compression was enabled still load.
+
+TimedAsyncPostgresSaver / TimedPostgresSaver: the checkpointers of the API and
+of the sync run_agent, record the duration of each load / save in the
+Prometheus metrics (see api/core/metrics.py).
+
+Retention job and size report, run from the command line (or cron):
+    python -m api.core.checkpoints report [--limit 20]
+    python -m api.core.checkpoints prune [--days 30] [--dry-run]
+"""
+
+import argparse
+import logging
+import zlib
+
+import psycopg
+from psycopg.rows import dict_row
+from langgraph.checkpoint.postgres import PostgresSaver
+from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from api.core.config import config
+from api.core.metrics import CHECKPOINT_SECONDS, timed
+
+logger = logging.getLogger(__name__)
+
+ZLIB_SUFFIX = "+zlib"
+
+
+class CompressedSerializer(JsonPlusSerializer):
+    """Compress serialized values of at least min_size bytes."""
+
+    def __init__(self, min_size: int = 1024, level: int = 6, **kwargs):
+        super().__init__(**kwargs)
+        self.min_size = min_size
+        self.level = level
+
+    def dumps_typed(self, obj):
+        type_, data = super().dumps_typed(obj)
+        if len(data) >= self.min_size:
+            compressed = zlib.compress(data, self.level)
+            if len(compressed) < len(data):
+                return type_ + ZLIB_SUFFIX, compressed
+        return type_, data
+
+    def loads_typed(self, data):
+        type_, data_ = data
+        if type_.endswith(ZLIB_SUFFIX):
+            return super().loads_typed((type_.removesuffix(ZLIB_SUFFIX), zlib.decompress(data_)))
+        return super().loads_typed(data)
+
+
+def checkpoint_serde() -> JsonPlusSerializer:
+    if not config.CHECKPOINT_COMPRESSION:
+        return JsonPlusSerializer()
+    return CompressedSerializer(min_size=config.CHECKPOINT_COMPRESSION_MIN_BYTES)
+
+
+class TimedAsyncPostgresSaver(AsyncPostgresSaver):
+
+    async def aget_tuple(self, *args, **kwargs):
+        with timed(CHECKPOINT_SECONDS, stage="checkpoint", operation="load"):
+            return await super().aget_tuple(*args, **kwargs)
+
+    async def aput(self, *args, **kwargs):
+        with timed(CHECKPOINT_SECONDS, stage="checkpoint", operation="save"):
+            return await super().aput(*args, **kwargs)
+
+    async def aput_writes(self, *args, **kwargs):
+        with timed(CHECKPOINT_SECONDS, stage="checkpoint", operation="save_writes"):
+            return await super().aput_writes(*args, **kwargs)
+
+
+class TimedPostgresSaver(PostgresSaver):
+
+    def get_tuple(self, *args, **kwargs):
+        with timed(CHECKPOINT_SECONDS, stage="checkpoint", operation="load"):
+            return super().get_tuple(*args, **kwargs)
+
+    def put(self, *args, **kwargs):
+        with timed(CHECKPOINT_SECONDS, stage="checkpoint", operation="save"):
+            return super().put(*args, **kwargs)
+
+    def put_writes(self, *args, **kwargs):
+        with timed(CHECKPOINT_SECONDS, stage="checkpoint", operation="save_writes"):
+            return super().put_writes(*args, **kwargs)
+
+
+#####################################################################################
+# Retention and size report
+#####################################################################################
+
+# Bytes stored per thread across the three checkpointer tables (largest first)
+REPORT_QUERY = """
+WITH c AS (
+    SELECT thread_id, count(*) AS checkpoints,
+           sum(pg_column_size(checkpoint) + pg_column_size(metadata)) AS checkpoint_bytes,
+           max((checkpoint->>'ts')::timestamptz) AS last_checkpoint_at
+    FROM checkpoints GROUP BY thread_id
+), b AS (
+    SELECT thread_id, count(*) AS blobs, sum(coalesce(octet_length(blob), 0)) AS blob_bytes
+    FROM checkpoint_blobs GROUP BY thread_id
+), w AS (
+    SELECT thread_id, sum(coalesce(octet_length(blob), 0)) AS write_bytes
+    FROM checkpoint_writes GROUP BY thread_id
+)
+SELECT c.thread_id, c.checkpoints, coalesce(b.blobs, 0) AS blobs,
+       c.checkpoint_bytes, coalesce(b.blob_bytes, 0) AS blob_bytes, coalesce(w.write_bytes, 0) AS write_bytes,
+       c.checkpoint_bytes + coalesce(b.blob_bytes, 0) + coalesce(w.write_bytes, 0) AS total_bytes,
+       c.last_checkpoint_at
+FROM c LEFT JOIN b USING (thread_id) LEFT JOIN w USING (thread_id)
+ORDER BY total_bytes DESC
+LIMIT %s
+"""
+
+# Threads whose latest checkpoint is older than the retention period
+EXPIRED_THREADS_QUERY = """
+SELECT thread_id FROM checkpoints
+GROUP BY thread_id
+HAVING max((checkpoint->>'ts')::timestamptz) < now() - make_interval(days => %s)
+"""
+
+
+def connect() -> psycopg.Connection:
+    return psycopg.connect(config.POSTGRES_CONN_STRING, autocommit=True, row_factory=dict_row)
+
+
+def checkpoint_report(conn, limit: int = 20) -> list[dict]:
+    with conn.cursor() as cur:
+        cur.execute(REPORT_QUERY, (limit,))
+        return cur.fetchall()
+
+
+def prune_threads(conn, days: int, dry_run: bool = False, batch_size: int = 500) -> list[str]:
+    """Delete every checkpoint, blob and write of the threads inactive for more than `days`."""
+    with conn.cursor() as cur:
+        cur.execute(EXPIRED_THREADS_QUERY, (days,))
+        thread_ids = [row["thread_id"] for row in cur.fetchall()]
+
+        if dry_run:
+            return thread_ids
+
+        for start in range(0, len(thread_ids), batch_size):
+            batch = thread_ids[start:start + batch_size]
+            with conn.transaction():
+                for table in ("checkpoint_writes", "checkpoint_blobs", "checkpoints"):
+                    cur.execute(f"DELETE FROM {table} WHERE thread_id = ANY(%s)", (batch,))
+
+    return thread_ids
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    parser = argparse.ArgumentParser(description="Checkpoint storage report and retention")
+    commands = parser.add_subparsers(dest="command", required=True)
+    report = commands.add_parser("report", help="checkpoint bytes per thread, largest first")
+    report.add_argument("--limit", type=int, default=20)
+    prune = commands.add_parser("prune", help="delete threads inactive for longer than the retention period")
+    prune.add_argument("--days", type=int, default=config.CHECKPOINT_RETENTION_DAYS)
+    prune.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    with connect() as conn:
+        if args.command == "report":
+            rows = checkpoint_report(conn, args.limit)
+            print(f"{'thread_id':<40} {'checkpoints':>11} {'blobs':>6} {'total_kb':>10} {'last_checkpoint_at'}")
+            for row in rows:
+                print(
+                    f"{row['thread_id']:<40} {row['checkpoints']:>11} {row['blobs']:>6} "
+                    f"{row['total_bytes'] / 1024:>10.1f} {row['last_checkpoint_at']}"
+                )
+            print(f"total (listed threads): {sum(row['total_bytes'] for row in rows) / 1024:.1f} kB")
+        else:
+            thread_ids = prune_threads(conn, args.days, dry_run=args.dry_run)
+            logger.info(
+                "%s %s threads inactive for more than %s days",
+                "Would delete" if args.dry_run else "Deleted", len(thread_ids), args.days,
+            )
+
+
+if __name__ == "__main__":
+    main()
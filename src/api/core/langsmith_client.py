@@ -0,0 +1,26 @@
+"""Shared LangSmith client (prompt registry pulls, feedback)
+
+Created on first use instead of at import: Client() reads the settings and
+starts a request to the LangSmith /info endpoint, which every process importing
+the prompt utilities (API workers, evals, benchmarks, CLIs) paid for even when
+it never pulls a prompt or sends feedback. Tracing (@traceable) does not go
+through this client.
+"""
+
+import threading
+
+from langsmith import Client
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_langsmith_client() -> Client:
+    """Return the process-wide LangSmith client, creating it on first use."""
+    global _client
+
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = Client()
+    return _client
@@ -0,0 +1,184 @@
+"""Shared LLM clients (one sync and one async OpenAI client per worker process)
+
+The agent node, the legacy RAG pipeline and the embedding service get their
+client from here instead of building OpenAI() on every call. Both clients sit
+on a long-lived httpx pool (keep-alive, HTTP/2), so TLS sessions are reused
+across agent iterations and requests. They are created once in the app
+lifespan (see api/main.py) and lazily on first use everywhere else (scripts,
+evals). openai and instructor are imported by the first client created, not by
+this module: importing them takes longer than everything else the API imports
+except qdrant_client, and the ingestion CLIs and the /stats endpoint that import
+this module do not need instructor at all.
+
+Every HTTP attempt goes through httpx event hooks that record latency, status
+and retries per endpoint (see llm_client_stats, exposed on /stats).
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING
+
+import httpx
+
+from api.core.config import config
+
+if TYPE_CHECKING:
+    import instructor
+    from openai import OpenAI, AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_async_client = None
+_instructor_client = None
+_async_instructor_client = None
+_client_lock = threading.Lock()
+
+
+class LLMCallMetrics:
+    """Per-endpoint counters and recent latencies of the HTTP calls made by the OpenAI clients."""
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def on_request(self, request: httpx.Request):
+        request.extensions["llm_start"] = time.perf_counter()
+
+    def on_response(self, response: httpx.Response):
+        request = response.request
+        start = request.extensions.get("llm_start")
+        latency_ms = (time.perf_counter() - start) * 1000 if start is not None else 0.0
+        # the openai client numbers its attempts, > 0 means this call is a retry
+        retry = int(request.headers.get("x-stainless-retry-count", "0") or 0) > 0
+        endpoint = request.url.path.removeprefix("/v1")
+
+        with self._lock:
+            stats = self._endpoints.setdefault(endpoint, {
+                "calls": 0, "retries": 0, "errors": 0, "latencies_ms": deque(maxlen=self.window),
+            })
+            stats["calls"] += 1
+            stats["retries"] += retry
+            stats["errors"] += response.status_code >= 400
+            stats["latencies_ms"].append(latency_ms)
+
+    def stats(self) -> dict:
+        with self._lock:
+            result = {}
+            for endpoint, stats in self._endpoints.items():
+                latencies = sorted(stats["latencies_ms"]) # never empty, added on the first call
+                result[endpoint] = {
+                    "calls": stats["calls"],
+                    "retries": stats["retries"],
+                    "errors": stats["errors"],
+                    "avg_ms": round(sum(latencies) / len(latencies), 1),
+                    "p50_ms": round(latencies[len(latencies) // 2], 1),
+                    "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1),
+                }
+            return result
+
+
+llm_metrics = LLMCallMetrics()
+
+
+async def _aon_request(request: httpx.Request):
+    llm_metrics.on_request(request)
+
+
+async def _aon_response(response: httpx.Response):
+    llm_metrics.on_response(response)
+
+
+def _http_client_kwargs() -> dict:
+    return {
+        "http2": config.LLM_HTTP2,
+        "timeout": httpx.Timeout(config.LLM_TIMEOUT, connect=config.LLM_CONNECT_TIMEOUT),
+        "limits": httpx.Limits(
+            max_connections=config.LLM_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=config.LLM_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=config.LLM_POOL_KEEPALIVE_EXPIRY,
+        ),
+    }
+
+
+def get_openai_client() -> "OpenAI":
+    """Return the process-wide OpenAI client, creating it on first use."""
+    global _client
+
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from openai import OpenAI
+                http_client = httpx.Client(
+                    **_http_client_kwargs(),
+                    event_hooks={"request": [llm_metrics.on_request], "response": [llm_metrics.on_response]},
+                )
+                _client = OpenAI(http_client=http_client, base_url=config.OPENAI_BASE_URL or None, max_retries=config.LLM_MAX_RETRIES)
+                logger.info("OpenAI client created (http2: %s)", config.LLM_HTTP2)
+    return _client
+
+
+def get_async_openai_client() -> "AsyncOpenAI":
+    """Return the process-wide async OpenAI client (used by the async /rag path)."""
+    global _async_client
+
+    if _async_client is None:
+        with _client_lock:
+            if _async_client is None:
+                from openai import AsyncOpenAI
+                http_client = httpx.AsyncClient(
+                    **_http_client_kwargs(),
+                    event_hooks={"request": [_aon_request], "response": [_aon_response]},
+                )
+                _async_client = AsyncOpenAI(http_client=http_client, base_url=config.OPENAI_BASE_URL or None, max_retries=config.LLM_MAX_RETRIES)
+    return _async_client
+
+
+def get_instructor_client() -> "instructor.Instructor":
+    """Instructor wrapper over the shared OpenAI client (structured outputs)."""
+    global _instructor_client
+
+    if _instructor_client is None:
+        import instructor
+        _instructor_client = instructor.from_openai(get_openai_client())
+    return _instructor_client
+
+
+def get_async_instructor_client() -> "instructor.AsyncInstructor":
+    global _async_instructor_client
+
+    if _async_instructor_client is None:
+        import instructor
+        _async_instructor_client = instructor.from_openai(get_async_openai_client())
+    return _async_instructor_client
+
+
+def open_llm_clients():
+    """Create both clients up front (called on application startup, in a thread: mostly imports)."""
+    get_instructor_client()
+    get_async_instructor_client()
+
+
+async def close_llm_clients():
+    """Close the shared clients and their connection pools (called on application shutdown)."""
+    global _client, _async_client, _instructor_client, _async_instructor_client
+
+    with _client_lock:
+        client, async_client = _client, _async_client
+        _client = _async_client = _instructor_client = _async_instructor_client = None
+
+    if client is not None:
+        client.close()
+    if async_client is not None:
+        await async_client.close()
+
+
+def llm_client_stats() -> dict:
+    return {
+        "status": "open" if _client is not None or _async_client is not None else "closed",
+        "http2": config.LLM_HTTP2,
+        "endpoints": llm_metrics.stats(),
+    }
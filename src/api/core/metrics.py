@@ -0,0 +1,108 @@
+"""Prometheus metrics of the agent pipeline (exposed on /metrics)
+
+Histograms (seconds):
+    - rag_request_seconds{route, status}: whole HTTP request (api/api/middleware.py)
+    - rag_embedding_seconds{cache}: query embedding, cache = memory / disk / miss
+    - rag_qdrant_seconds{operation}: each Qdrant call (item_search, review_search,
+      review_groups, hydration_scroll)
+    - rag_llm_seconds{node}: each LLM call (agent_node, history_summary)
+    - rag_tool_seconds{tool, status}: one tool execution in the tool node
+    - rag_checkpoint_seconds{operation}: checkpointer load / save / save_writes,
+      async (API) and sync (run_agent) graphs
+    - rag_hydration_seconds: product cards of the cited items
+Counters:
+    - rag_agent_iterations (histogram, per request; _sum is the total)
+    - rag_tool_calls_total{tool, status}
+    - rag_cache_lookups_total{cache, result}: embedding and answer caches, hit / miss
+Feedback spool (api/processors/feedback_spool.py):
+    - rag_feedback_spool_depth: entries waiting to be sent to LangSmith
+    - rag_feedback_flush_seconds: one batch sent
+    - rag_feedback_sent_total{result}: sent / retry / dropped
+
+Every label takes a fixed set of values (route templates, registered tool
+names, "unknown" otherwise) so the number of series stays bounded. With several
+uvicorn workers, set PROMETHEUS_MULTIPROC_DIR to a shared empty directory and
+/metrics aggregates the workers.
+
+timed(..., stage=...) also adds the duration to the stages of the current
+request (embed, retrieve, llm, hydrate, checkpoint), which the middleware sends
+back in the Server-Timing header. Stages are summed per request, so calls that
+run concurrently (parallel tools) can add up to more than the wall time.
+"""
+
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5) # cache hits, Qdrant, checkpoints
+
+REQUEST_SECONDS = Histogram("rag_request_seconds", "HTTP request duration", ["route", "status"], buckets=LATENCY_BUCKETS)
+EMBEDDING_SECONDS = Histogram("rag_embedding_seconds", "Query embedding duration", ["cache"], buckets=FAST_BUCKETS)
+QDRANT_SECONDS = Histogram("rag_qdrant_seconds", "Qdrant call duration", ["operation"], buckets=FAST_BUCKETS)
+LLM_SECONDS = Histogram("rag_llm_seconds", "LLM call duration", ["node"], buckets=LATENCY_BUCKETS)
+TOOL_SECONDS = Histogram("rag_tool_seconds", "Tool execution duration", ["tool", "status"], buckets=LATENCY_BUCKETS)
+CHECKPOINT_SECONDS = Histogram("rag_checkpoint_seconds", "Checkpointer call duration", ["operation"], buckets=FAST_BUCKETS)
+HYDRATION_SECONDS = Histogram("rag_hydration_seconds", "Product card hydration duration", buckets=FAST_BUCKETS)
+
+AGENT_ITERATIONS = Histogram("rag_agent_iterations", "Agent iterations per request", buckets=(1, 2, 3, 4, 5, 6, 8, 10))
+TOOL_CALLS = Counter("rag_tool_calls_total", "Tool calls requested by the agent", ["tool", "status"])
+CACHE_LOOKUPS = Counter("rag_cache_lookups_total", "Cache lookups", ["cache", "result"])
+
+FEEDBACK_SPOOL_DEPTH = Gauge("rag_feedback_spool_depth", "Feedback entries waiting to be sent", multiprocess_mode="max") # workers share the spool
+FEEDBACK_FLUSH_SECONDS = Histogram("rag_feedback_flush_seconds", "Duration of one feedback batch", buckets=LATENCY_BUCKETS)
+FEEDBACK_SENT = Counter("rag_feedback_sent_total", "Feedback entries by outcome", ["result"])
+
+
+# stage -> seconds of the request being served; the dict is shared by the tasks
+# and tool threads the request spawns (they copy the context, not the dict)
+_request_stages = contextvars.ContextVar("request_stages", default=None)
+
+
+def start_request_stages() -> dict:
+    stages = {}
+    _request_stages.set(stages)
+    return stages
+
+
+def add_stage(stage: str, seconds: float):
+    stages = _request_stages.get()
+    if stages is not None:
+        stages[stage] = stages.get(stage, 0.0) + seconds
+
+
+def request_stages() -> dict:
+    """Stage durations (ms) of the current request so far."""
+    return {stage: round(seconds * 1000, 1) for stage, seconds in (_request_stages.get() or {}).items()}
+
+
+@contextmanager
+def timed(histogram: Histogram, stage: str | None = None, **labels):
+    """Observe the duration of the with block (also when it raises), and add it to `stage` of the request."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        (histogram.labels(**labels) if labels else histogram).observe(elapsed)
+        if stage is not None:
+            add_stage(stage, elapsed)
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    CACHE_LOOKUPS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+def render() -> tuple[bytes, str]:
+    """Body and content type of the /metrics response."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
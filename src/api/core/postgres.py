@@ -0,0 +1,64 @@
+"""Postgres connection pool for the LangGraph checkpointer
+
+Opened once at application startup (see lifespan in api/main.py), so requests
+borrow an open connection instead of connecting on every call.
+"""
+
+import logging
+
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+
+from api.core.config import config
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+
+
+async def open_postgres_pool() -> AsyncConnectionPool:
+    global _pool
+
+    if _pool is None:
+        _pool = AsyncConnectionPool(
+            conninfo=config.POSTGRES_CONN_STRING,
+            min_size=config.POSTGRES_POOL_MIN_SIZE,
+            max_size=config.POSTGRES_POOL_MAX_SIZE,
+            timeout=config.POSTGRES_POOL_TIMEOUT,
+            # same connection settings AsyncPostgresSaver.from_conn_string uses
+            kwargs={"autocommit": True, "prepare_threshold": 0, "row_factory": dict_row},
+            open=False,
+        )
+        await _pool.open(wait=True)
+        logger.info("Postgres pool opened (min %s, max %s)", config.POSTGRES_POOL_MIN_SIZE, config.POSTGRES_POOL_MAX_SIZE)
+    return _pool
+
+
+async def close_postgres_pool():
+    global _pool
+
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+def postgres_pool_stats() -> dict:
+    """Pool metrics: size, connections in use, waiting requests and cumulative wait time."""
+    if _pool is None:
+        return {"status": "closed"}
+
+    stats = _pool.get_stats()
+    return {
+        "status": "open",
+        "pool_min": stats.get("pool_min"),
+        "pool_max": stats.get("pool_max"),
+        "pool_size": stats.get("pool_size", 0),
+        "in_use": stats.get("pool_size", 0) - stats.get("pool_available", 0),
+        "available": stats.get("pool_available", 0),
+        "requests_waiting": stats.get("requests_waiting", 0),
+        "requests_num": stats.get("requests_num", 0),
+        "requests_wait_ms": stats.get("requests_wait_ms", 0), # cumulative time spent waiting for a connection
+        "avg_wait_ms": round(stats.get("requests_wait_ms", 0) / stats["requests_num"], 2) if stats.get("requests_num") else 0.0,
+        "requests_errors": stats.get("requests_errors", 0),
+        "connections_num": stats.get("connections_num", 0),
+    }
@@ -0,0 +1,118 @@
+"""Shared Qdrant clients (one sync and one async per worker process)
+
+All tools and wrappers get their client from here instead of building a new
+QdrantClient on every call, so the underlying HTTP/gRPC connections are reused
+across tool calls, agent iterations and requests.
+"""
+
+import logging
+import threading
+import time
+
+import httpx
+from qdrant_client import QdrantClient, AsyncQdrantClient
+from qdrant_client.models import PayloadSchemaType
+
+from api.core.config import config
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_async_client = None
+_client_lock = threading.Lock()
+
+
+def _client_kwargs() -> dict:
+    """Build QdrantClient arguments from config.
+
+    QDRANT_URL can be a bare host ("qdrant", "localhost") or a full url
+    ("http://qdrant:6333"); both are normalized here, in one place.
+    """
+    if "://" in config.QDRANT_URL:
+        location = {"url": config.QDRANT_URL}
+    else:
+        location = {"host": config.QDRANT_URL, "port": config.QDRANT_PORT}
+
+    return {
+        **location,
+        "grpc_port": config.QDRANT_GRPC_PORT,
+        "prefer_grpc": config.QDRANT_PREFER_GRPC,
+        "timeout": config.QDRANT_TIMEOUT,
+        # REST transport: keep-alive connection pool (ignored by gRPC, which multiplexes one channel)
+        "limits": httpx.Limits(
+            max_connections=config.QDRANT_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=config.QDRANT_POOL_MAX_KEEPALIVE,
+        ),
+    }
+
+
+def get_qdrant_client() -> QdrantClient:
+    """Return the process-wide Qdrant client, creating it on first use."""
+    global _client
+
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = QdrantClient(**_client_kwargs())
+                logger.info(
+                    "Qdrant client created (%s, transport: %s)",
+                    config.QDRANT_URL, "grpc" if config.QDRANT_PREFER_GRPC else "rest",
+                )
+    return _client
+
+
+def get_async_qdrant_client() -> AsyncQdrantClient:
+    """Return the process-wide async Qdrant client (used by the async /rag path)."""
+    global _async_client
+
+    if _async_client is None:
+        with _client_lock:
+            if _async_client is None:
+                _async_client = AsyncQdrantClient(**_client_kwargs())
+    return _async_client
+
+
+def close_qdrant_client():
+    """Close the shared sync client (called on application shutdown)."""
+    global _client
+
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+async def close_async_qdrant_client():
+    global _async_client
+
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+
+
+def check_qdrant_health() -> dict:
+    """Cheap round trip to Qdrant, used by the /health endpoint."""
+    start = time.perf_counter()
+    try:
+        get_qdrant_client().get_collections()
+    except Exception as e:
+        logger.warning("Qdrant health check failed: %s", e)
+        return {"status": "error", "error": str(e)}
+
+    return {
+        "status": "ok",
+        "transport": "grpc" if config.QDRANT_PREFER_GRPC else "rest",
+        "latency_ms": round((time.perf_counter() - start) * 1000, 2),
+    }
+
+
+def ensure_payload_index(collection_name: str, field_name: str, field_schema=PayloadSchemaType.KEYWORD):
+    """Create a payload index if it is missing (filters on unindexed fields scan the whole collection)."""
+    client = get_qdrant_client()
+    try:
+        schema = client.get_collection(collection_name).payload_schema
+        if field_name not in schema:
+            client.create_payload_index(collection_name=collection_name, field_name=field_name, field_schema=field_schema, wait=True)
+            logger.info("Created %s payload index on %s.%s", field_schema, collection_name, field_name)
+    except Exception as e:
+        logger.warning("Could not ensure payload index on %s.%s: %s", collection_name, field_name, e)
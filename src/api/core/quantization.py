@@ -0,0 +1,127 @@
+"""Vector quantization of the items and reviews collections
+
+ITEMS_QUANTIZATION / REVIEWS_QUANTIZATION:
+    - "none": float32 vectors in RAM, 4 bytes per dimension (6 KB per 1536-dim point)
+    - "scalar": int8 codes in RAM (1 byte per dimension, 4x smaller)
+    - "binary": 1 bit per dimension in RAM (32x smaller), needs rescoring to keep recall
+With QUANTIZATION_ORIGINALS_ON_DISK the float32 vectors of a quantized
+collection are kept on disk and only read to rescore the candidates.
+
+At query time search_params() asks Qdrant for limit * QUANTIZATION_OVERSAMPLING
+candidates with the quantized vectors, rescored with the originals
+(QUANTIZATION_RESCORE); it has no effect on collections without quantization.
+
+New collections get the configured mode (api/ingestion/pipeline.py), existing
+ones are converted in place (Qdrant rebuilds the quantized vectors in the background):
+    python -m api.core.quantization show
+    python -m api.core.quantization apply reviews [--mode scalar]
+"""
+
+import argparse
+import json
+import logging
+import math
+
+from qdrant_client import models
+
+from api.core.config import config
+from api.core.qdrant import get_qdrant_client
+
+logger = logging.getLogger(__name__)
+
+MODES = ("none", "scalar", "binary")
+
+
+def collection_quantization(kind: str) -> str:
+    return config.ITEMS_QUANTIZATION if kind == "items" else config.REVIEWS_QUANTIZATION
+
+
+def quantization_config(mode: str):
+    if mode == "scalar":
+        return models.ScalarQuantization(scalar=models.ScalarQuantizationConfig(
+            type=models.ScalarType.INT8,
+            quantile=config.QUANTIZATION_SCALAR_QUANTILE,
+            always_ram=config.QUANTIZATION_ALWAYS_RAM,
+        ))
+    if mode == "binary":
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(
+            always_ram=config.QUANTIZATION_ALWAYS_RAM,
+        ))
+    if mode == "none":
+        return None
+    raise ValueError(f"Unknown quantization mode: {mode} (expected one of {MODES})")
+
+
+def originals_on_disk(mode: str) -> bool:
+    return mode != "none" and config.QUANTIZATION_ORIGINALS_ON_DISK
+
+
+def vectors_config(dim: int, mode: str) -> models.VectorParams:
+    return models.VectorParams(size=dim, distance=models.Distance.COSINE, on_disk=originals_on_disk(mode))
+
+
+def search_params() -> models.SearchParams:
+    return models.SearchParams(quantization=models.QuantizationSearchParams(
+        ignore=config.QUANTIZATION_IGNORE,
+        rescore=config.QUANTIZATION_RESCORE,
+        oversampling=config.QUANTIZATION_OVERSAMPLING,
+    ))
+
+
+def vector_ram_bytes(dim: int, mode: str, on_disk: bool | None = None) -> int:
+    """Estimated RAM per point taken by the dense vector (HNSW links and payload excluded)."""
+    on_disk = originals_on_disk(mode) if on_disk is None else on_disk
+    quantized = {"none": 0, "scalar": dim, "binary": math.ceil(dim / 8)}[mode]
+    return quantized + (0 if on_disk else dim * 4)
+
+
+def apply_quantization(client, collection: str, mode: str):
+    """Switch an existing collection to `mode` (and move its originals on / off disk accordingly)."""
+    client.update_collection(
+        collection,
+        quantization_config=quantization_config(mode) or models.Disabled.DISABLED,
+        vectors_config={"": models.VectorParamsDiff(on_disk=originals_on_disk(mode))},
+    )
+    logger.info("Quantization of %s set to %s", collection, mode)
+
+
+def describe(client, collection: str) -> dict:
+    info = client.get_collection(collection)
+    vectors = info.config.params.vectors
+    vectors = vectors.get("") if isinstance(vectors, dict) else vectors
+    quantization = info.config.quantization_config
+    mode = "scalar" if isinstance(quantization, models.ScalarQuantization) else \
+        "binary" if isinstance(quantization, models.BinaryQuantization) else "none"
+    return {
+        "collection": collection,
+        "points": info.points_count,
+        "dim": vectors.size,
+        "quantization": mode,
+        "originals_on_disk": bool(vectors.on_disk),
+        "vector_ram_bytes_per_point": vector_ram_bytes(vectors.size, mode, bool(vectors.on_disk)),
+        "status": str(info.status),
+    }
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    collections = {"items": config.QDRANT_COLLECTION_NAME_ITEMS, "reviews": config.QDRANT_COLLECTION_NAME_REVIEWS}
+    parser = argparse.ArgumentParser(description="Quantization of the items and reviews collections")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("show", help="quantization and estimated vector RAM of both collections")
+    apply = commands.add_parser("apply", help="set the quantization of an existing collection")
+    apply.add_argument("kind", choices=sorted(collections))
+    apply.add_argument("--mode", choices=MODES, default=None, help="default: ITEMS_QUANTIZATION / REVIEWS_QUANTIZATION")
+    args = parser.parse_args()
+
+    client = get_qdrant_client()
+    if args.command == "apply":
+        apply_quantization(client, collections[args.kind], args.mode or collection_quantization(args.kind))
+        print(json.dumps(describe(client, collections[args.kind]), indent=2))
+    else:
+        print(json.dumps([describe(client, collection) for collection in collections.values()], indent=2))
+
+
+if __name__ == "__main__":
+    main()
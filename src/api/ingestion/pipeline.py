@@ -0,0 +1,348 @@
+"""Streaming, resumable ingestion of the items and reviews dumps into Qdrant
+
+    python -m api.ingestion.pipeline items data/meta_Electronics.jsonl.gz
+    python -m api.ingestion.pipeline reviews data/Electronics.jsonl.gz [--collection ...] [--restart]
+
+Three stages connected by bounded queues (a full queue pauses the stage before
+it, so memory stays flat whatever the file size):
+    - reader: streams the JSONL file and cuts batches of INGEST_BATCH_SIZE points
+    - embedders (INGEST_EMBED_CONCURRENCY): one embeddings request per batch,
+      under the INGEST_REQUESTS_PER_MINUTE / INGEST_TOKENS_PER_MINUTE limits
+    - upserters (INGEST_UPSERT_CONCURRENCY): write the batch to Qdrant
+
+Batches finish out of order; the progress file (INGEST_CHECKPOINT_DIR) stores
+the line before which every batch is written, and a new run of the same file
+into the same collection starts from there. Point ids are deterministic, so the
+batches in flight when a run stopped are simply written again. A run that
+wrote points bumps the catalog version of the collection
+(api/core/catalog_version.py).
+
+The embedder and the Qdrant client are arguments of ingest(), e.g. an in-memory
+AsyncQdrantClient(":memory:") and hashing_embedder() need no services.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import PointStruct, PayloadSchemaType
+
+from api.core.catalog_version import abump_catalog_version
+from api.core.config import config
+from api.core.llm import get_async_openai_client
+from api.core.qdrant import get_async_qdrant_client, close_async_qdrant_client
+from api.core.quantization import collection_quantization, quantization_config, vectors_config
+from api.ingestion.records import RECORD_BUILDERS, read_jsonl, content_hash, payload_hash
+from api.rag.sparse import encode_document, sparse_vectors_config
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_LOG_SECONDS = 10.0
+
+# Payload indexes the retrieval filters rely on
+PAYLOAD_INDEXES = {
+    "items": {"parent_asin": PayloadSchemaType.KEYWORD, "text": PayloadSchemaType.TEXT},
+    "reviews": {"parent_asin": PayloadSchemaType.KEYWORD},
+}
+
+
+def openai_embedder(model: str = config.EMBEDDING_MODEL):
+    async def embed(texts: list[str]) -> list[list[float]]:
+        response = await get_async_openai_client().embeddings.create(input=texts, model=model)
+        return [item.embedding for item in response.data]
+    embed.model = model # part of the content hash, a model change re-embeds everything
+    return embed
+
+
+def hashing_embedder(dim: int = 1536):
+    """Deterministic pseudo embeddings (seeded by the text), for runs without the embeddings API."""
+    async def embed(texts: list[str]) -> list[list[float]]:
+        vectors = []
+        for text in texts:
+            seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+            vectors.append(np.random.default_rng(seed).standard_normal(dim, dtype=np.float32).tolist())
+        return vectors
+    embed.model = f"hashing-{dim}"
+    return embed
+
+
+class RateLimiter:
+    """Requests and tokens per minute, as two token buckets holding one second of budget."""
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.request_rate = requests_per_minute / 60
+        self.token_rate = tokens_per_minute / 60
+        self._requests = max(1.0, self.request_rate)
+        self._tokens = self.token_rate
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.waited = 0.0
+
+    async def acquire(self, tokens: int):
+        async with self._lock: # callers are served in order
+            while True:
+                now = time.monotonic()
+                elapsed, self._updated = now - self._updated, now
+                self._requests = min(max(1.0, self.request_rate), self._requests + elapsed * self.request_rate)
+                # a batch larger than one second of budget fits once the bucket holds its tokens
+                self._tokens = min(max(self.token_rate, tokens), self._tokens + elapsed * self.token_rate)
+                if self._requests >= 1 and self._tokens >= tokens:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return
+                wait = max((1 - self._requests) / self.request_rate, (tokens - self._tokens) / self.token_rate)
+                self.waited += wait
+                await asyncio.sleep(wait)
+
+
+def estimate_tokens(texts: list[str]) -> int:
+    return sum(len(text) // 4 + 1 for text in texts)
+
+
+class Progress:
+    """Resume point of one (source file, collection) run, saved atomically after every batch."""
+
+    def __init__(self, path: Path, source: str, collection: str, restart: bool = False):
+        self.path = path
+        self.state = {"source": str(source), "collection": collection, "line": 0, "points": 0, "skipped": 0, "finished": False}
+        if path.exists() and not restart:
+            saved = json.loads(path.read_text())
+            if (saved.get("source"), saved.get("collection")) == (self.state["source"], collection):
+                self.state = saved
+            else:
+                logger.warning("Progress file %s is for another run, starting over", path)
+        self._next_batch = 0
+        self._done = {} # batch number -> (next line, points, skipped), waiting for earlier batches
+
+    @property
+    def line(self) -> int:
+        return self.state["line"]
+
+    def complete(self, batch_number: int, next_line: int, points: int, skipped: int):
+        self._done[batch_number] = (next_line, points, skipped)
+        advanced = False
+        while self._next_batch in self._done:
+            next_line, points, skipped = self._done.pop(self._next_batch)
+            self.state["line"] = next_line
+            self.state["points"] += points
+            self.state["skipped"] += skipped
+            self._next_batch += 1
+            advanced = True
+        if advanced:
+            self.save()
+
+    def finish(self, next_line: int, skipped: int):
+        self.state["line"] = next_line
+        self.state["skipped"] += skipped
+        self.state["finished"] = True
+        self.save()
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps({**self.state, "updated_at": time.time()}))
+        os.replace(tmp, self.path)
+
+
+def progress_path(kind: str, collection: str) -> Path:
+    return Path(config.INGEST_CHECKPOINT_DIR) / f"{collection}.{kind}.json"
+
+
+async def ensure_collection(client: AsyncQdrantClient, kind: str, collection: str, dim: int) -> bool:
+    """Create the collection (items with the BM25 sparse vector, ITEMS_ / REVIEWS_QUANTIZATION) and its payload indexes if missing.
+
+    Returns whether the collection has the sparse vector (older items collections
+    don't, see the backfill in api/rag/sparse.py).
+    """
+    if not await client.collection_exists(collection):
+        mode = collection_quantization(kind)
+        await client.create_collection(
+            collection,
+            vectors_config=vectors_config(dim, mode),
+            sparse_vectors_config=sparse_vectors_config() if kind == "items" else None,
+            quantization_config=quantization_config(mode),
+        )
+        logger.info("Created collection %s (%s dims, quantization: %s)", collection, dim, mode)
+
+    info = await client.get_collection(collection)
+    for field, field_schema in PAYLOAD_INDEXES[kind].items():
+        if field not in info.payload_schema:
+            await client.create_payload_index(collection, field, field_schema=field_schema, wait=True)
+
+    sparse = config.SPARSE_VECTOR_NAME in (info.config.params.sparse_vectors or {})
+    if kind == "items" and not sparse:
+        logger.warning("%s has no %s sparse vector, writing dense vectors only", collection, config.SPARSE_VECTOR_NAME)
+    return sparse
+
+
+def to_points(records: list[dict], embeddings: list[list[float]], sparse: bool) -> list[PointStruct]:
+    points = []
+    for record, embedding in zip(records, embeddings):
+        vector = embedding
+        if sparse: # keyword branch of the hybrid search (api/rag/sparse.py)
+            vector = {"": embedding, config.SPARSE_VECTOR_NAME: encode_document(record["payload"]["text"])}
+        points.append(PointStruct(id=record["id"], vector=vector, payload=record["payload"]))
+    return points
+
+
+async def ingest(
+    kind: str,
+    path: str,
+    collection: str,
+    embedder,
+    client: AsyncQdrantClient,
+    restart: bool = False,
+    limit: int | None = None,
+    batch_size: int = config.INGEST_BATCH_SIZE,
+    embed_concurrency: int = config.INGEST_EMBED_CONCURRENCY,
+    upsert_concurrency: int = config.INGEST_UPSERT_CONCURRENCY,
+    queue_size: int = config.INGEST_QUEUE_SIZE,
+    rate_limiter: RateLimiter | None = None,
+    progress_file: Path | None = None,
+    record_filter=None,
+) -> dict:
+    """Ingest `path` into `collection`, resuming a previous run unless `restart`. Returns the run stats.
+
+    Records for which record_filter(record) is false are not embedded (counted as skipped).
+    """
+    build_record = RECORD_BUILDERS[kind]
+    model = getattr(embedder, "model", "unknown")
+    progress = Progress(progress_file or progress_path(kind, collection), path, collection, restart=restart)
+    if progress.state["finished"]:
+        logger.info("%s was already ingested into %s (use --restart to run it again)", path, collection)
+        return {**progress.state, "run_points": 0, "elapsed_s": 0.0, "points_per_s": 0.0}
+
+    rate_limiter = rate_limiter or RateLimiter(config.INGEST_REQUESTS_PER_MINUTE, config.INGEST_TOKENS_PER_MINUTE)
+    embed_queue = asyncio.Queue(maxsize=queue_size)
+    upsert_queue = asyncio.Queue(maxsize=queue_size)
+    collection_ready = asyncio.Lock()
+    run = {"points": 0, "sparse": None, "started": time.perf_counter(), "last_log": time.perf_counter()}
+    start_line = progress.line
+    if start_line:
+        logger.info("Resuming %s at line %s (%s points already written)", path, start_line, progress.state["points"])
+
+    lines = read_jsonl(path, start_line)
+    position = {"next_line": start_line, "records": 0, "eof": False}
+
+    def read_batch() -> tuple[list[dict], int]:
+        """Next batch of records and the skipped lines in it (runs in a thread, the file read is blocking)."""
+        records, skipped = [], 0
+        for line_number, row in lines:
+            position["next_line"] = line_number + 1
+            record = build_record(row) if row is not None else None
+            if record is not None:
+                record["payload"]["payload_hash"] = payload_hash(record["payload"])
+                record["payload"]["content_hash"] = content_hash(record["text"], model)
+                record["payload"]["embedding_model"] = model
+            if record is None or (record_filter is not None and not record_filter(record)):
+                skipped += 1
+                continue
+            records.append(record)
+            position["records"] += 1
+            if len(records) == batch_size or (limit is not None and position["records"] >= limit):
+                return records, skipped
+        position["eof"] = True
+        return records, skipped
+
+    async def read():
+        batch_number = 0
+        while not position["eof"] and (limit is None or position["records"] < limit):
+            records, skipped = await asyncio.to_thread(read_batch)
+            if records:
+                await embed_queue.put((batch_number, records, position["next_line"], skipped))
+                batch_number += 1
+            elif skipped: # trailing unusable lines
+                position["trailing_skipped"] = skipped
+        for _ in range(embed_concurrency):
+            await embed_queue.put(None)
+
+    async def embed_worker():
+        while (batch := await embed_queue.get()) is not None:
+            batch_number, records, next_line, skipped = batch
+            texts = [record["text"] for record in records]
+            await rate_limiter.acquire(estimate_tokens(texts))
+            embeddings = await embedder(texts)
+            await upsert_queue.put((batch_number, records, embeddings, next_line, skipped))
+
+    async def upsert_worker():
+        while (batch := await upsert_queue.get()) is not None:
+            batch_number, records, embeddings, next_line, skipped = batch
+            async with collection_ready: # created from the first batch, when the vector size is known
+                if run["sparse"] is None:
+                    run["sparse"] = await ensure_collection(client, kind, collection, len(embeddings[0]))
+            points = to_points(records, embeddings, run["sparse"])
+            await client.upsert(collection, points=points, wait=True)
+            progress.complete(batch_number, next_line, len(points), skipped)
+            run["points"] += len(points)
+
+            now = time.perf_counter()
+            if now - run["last_log"] >= PROGRESS_LOG_SECONDS:
+                run["last_log"] = now
+                logger.info(
+                    "%s points written (%.1f points/s), line %s",
+                    progress.state["points"], run["points"] / (now - run["started"]), progress.line,
+                )
+
+    async with asyncio.TaskGroup() as tasks:
+        upserters = [tasks.create_task(upsert_worker()) for _ in range(upsert_concurrency)]
+        embedders = [tasks.create_task(embed_worker()) for _ in range(embed_concurrency)]
+        await read()
+        await asyncio.gather(*embedders)
+        for _ in upserters:
+            await upsert_queue.put(None)
+
+    if position["eof"]:
+        progress.finish(position["next_line"], position.get("trailing_skipped", 0))
+    if run["points"]:
+        await abump_catalog_version(client, collection, f"ingest {kind}") # answers and local indexes built on it are stale
+
+    elapsed = time.perf_counter() - run["started"]
+    stats = {
+        **progress.state,
+        "run_points": run["points"],
+        "elapsed_s": round(elapsed, 2),
+        "points_per_s": round(run["points"] / elapsed, 1) if elapsed else 0.0,
+        "rate_limited_s": round(rate_limiter.waited, 2),
+    }
+    logger.info("Ingestion %s: %s", "finished" if position["eof"] else "stopped at limit", stats)
+    return stats
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    parser = argparse.ArgumentParser(description="Stream a JSONL(.gz) dump into a Qdrant collection")
+    parser.add_argument("kind", choices=sorted(RECORD_BUILDERS))
+    parser.add_argument("path")
+    parser.add_argument("--collection", default=None, help="default: QDRANT_COLLECTION_NAME_ITEMS / _REVIEWS")
+    parser.add_argument("--restart", action="store_true", help="ignore the saved progress and start from the first line")
+    parser.add_argument("--limit", type=int, default=None, help="stop after this many records")
+    parser.add_argument("--fake-embeddings", action="store_true", help="hashing embedder, no embeddings API calls")
+    args = parser.parse_args()
+
+    collection = args.collection or (
+        config.QDRANT_COLLECTION_NAME_ITEMS if args.kind == "items" else config.QDRANT_COLLECTION_NAME_REVIEWS
+    )
+    embedder = hashing_embedder() if args.fake_embeddings else openai_embedder()
+
+    async def run():
+        try:
+            return await ingest(
+                args.kind, args.path, collection, embedder, get_async_qdrant_client(),
+                restart=args.restart, limit=args.limit,
+            )
+        finally:
+            await close_async_qdrant_client()
+
+    print(json.dumps(asyncio.run(run()), indent=2))
+
+
+if __name__ == "__main__":
+    main()
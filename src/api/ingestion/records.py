@@ -0,0 +1,95 @@
+"""Source records of the Amazon dumps, turned into points to embed
+
+Both dumps are JSON lines (optionally gzip compressed), read one line at a
+time so memory use doesn't depend on the file size:
+    - items (meta_Electronics...): text = title + features, as in the notebooks
+    - reviews (Electronics...): text = review title + review text
+
+Point ids are uuid5 of the natural key, so re-running an ingestion (or resuming
+one) overwrites the same points instead of adding duplicates. The payload also
+gets a hash of the embedded text and model (content_hash) and one of the rest
+of the payload (payload_hash), which the incremental reindex compares to embed
+only what changed (api/ingestion/reindex.py).
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import uuid
+from typing import Iterator
+
+logger = logging.getLogger(__name__)
+
+ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "amazon-electronics-rag")
+MAX_TEXT_CHARS = 30_000 # ~8k tokens, the embedding model input limit
+
+
+def read_jsonl(path: str, start_line: int = 0) -> Iterator[tuple[int, dict | None]]:
+    """Yield (line number, record) from line `start_line` on, record is None for an unreadable line."""
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line_number, line in enumerate(f):
+            if line_number < start_line:
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning("Skipping malformed line %s of %s", line_number, path)
+                yield line_number, None
+
+
+def point_id(*key) -> str:
+    return str(uuid.uuid5(ID_NAMESPACE, ":".join(str(part) for part in key)))
+
+
+def content_hash(text: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\n{text}".encode("utf-8")).hexdigest()[:32]
+
+
+def payload_hash(payload: dict) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:32]
+
+
+def first_large_image(row: dict) -> str:
+    images = row.get("images") or []
+    return (images[0].get("large") or "") if images else ""
+
+
+def item_record(row: dict) -> dict | None:
+    """Point of the items collection (same payload as notebook 09), None if there is nothing to embed."""
+    text = f"{row.get('title') or ''} {' '.join(row.get('features') or [])}".strip()
+    if not row.get("parent_asin") or not text:
+        return None
+    return {
+        "id": point_id("item", row["parent_asin"]),
+        "text": text[:MAX_TEXT_CHARS],
+        "payload": {
+            "text": text,
+            "first_large_image": first_large_image(row),
+            "average_rating": row.get("average_rating"),
+            "rating_number": row.get("rating_number"),
+            "price": row.get("price"),
+            "parent_asin": row["parent_asin"],
+        },
+    }
+
+
+def review_record(row: dict) -> dict | None:
+    text = f"{row.get('title') or ''} {row.get('text') or ''}".strip()
+    if not row.get("parent_asin") or not text:
+        return None
+    return {
+        "id": point_id("review", row["parent_asin"], row.get("user_id"), row.get("timestamp")),
+        "text": text[:MAX_TEXT_CHARS],
+        "payload": {
+            "text": text,
+            "parent_asin": row["parent_asin"],
+        },
+    }
+
+
+RECORD_BUILDERS = {
+    "items": item_record,
+    "reviews": review_record,
+}
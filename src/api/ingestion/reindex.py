@@ -0,0 +1,224 @@
+"""Incremental re-index: embed and write only what changed since the last ingestion
+
+    python -m api.ingestion.reindex items data/meta_Electronics.jsonl.gz --dry-run
+    python -m api.ingestion.reindex reviews data/Electronics.jsonl.gz [--no-delete]
+
+The hashes stored in the payload at ingestion are compared with the ones of
+the new dump, by point id:
+    - new: id not in the collection -> embedded and written
+    - changed: content_hash differs (embedded text or embedding model) -> embedded and written
+    - payload only: payload_hash differs (price, rating...) -> payload updated, no embedding
+    - deleted: id in the collection but not in the dump -> removed, after the writes
+Points written before content hashes existed (the notebook ingestion) show up
+as deleted and their records as new, so the first reindex replaces them all.
+
+Deletes are refused when they would remove more than --max-delete-fraction of
+the collection (a truncated or wrong dump), unless --force.
+
+Changes bump the catalog version of the collection (api/core/catalog_version.py),
+which every API worker polls: cached answers are dropped and the local items
+index is re-exported, without calling the API.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import PointIdsList, SetPayload, SetPayloadOperation
+
+from api.core.catalog_version import abump_catalog_version
+from api.core.config import config
+from api.core.qdrant import get_async_qdrant_client, close_async_qdrant_client
+from api.ingestion.pipeline import ingest, openai_embedder, hashing_embedder, progress_path
+from api.ingestion.records import RECORD_BUILDERS, read_jsonl, content_hash, payload_hash
+
+logger = logging.getLogger(__name__)
+
+SCROLL_BATCH_SIZE = 1000
+WRITE_BATCH_SIZE = 256
+SAMPLE_SIZE = 5 # parent_asins listed per category in the diff
+
+
+async def stored_hashes(client: AsyncQdrantClient, collection: str) -> dict:
+    """point id -> (content_hash, payload_hash, parent_asin) of every point of the collection."""
+    hashes = {}
+    if not await client.collection_exists(collection):
+        return hashes
+
+    offset = None
+    while True:
+        points, offset = await client.scroll(
+            collection_name=collection,
+            limit=SCROLL_BATCH_SIZE,
+            offset=offset,
+            with_payload=["content_hash", "payload_hash", "parent_asin"],
+            with_vectors=False,
+        )
+        for point in points:
+            payload = point.payload or {}
+            hashes[str(point.id)] = (payload.get("content_hash"), payload.get("payload_hash"), payload.get("parent_asin"))
+        if offset is None:
+            return hashes
+
+
+class Diff:
+    """Classifies the records of the dump against the stored hashes."""
+
+    def __init__(self, stored: dict):
+        self.stored = stored
+        self.seen = set()
+        self.new = []
+        self.changed = []
+        self.payload_only = {} # point id -> payload
+        self.unchanged = 0
+
+    def classify(self, record: dict) -> bool:
+        """True if the record has to be embedded (used as the ingest record_filter)."""
+        self.seen.add(record["id"])
+        stored = self.stored.get(record["id"])
+        payload = record["payload"]
+        if stored is None:
+            self.new.append(payload["parent_asin"])
+            return True
+        if stored[0] != payload["content_hash"]:
+            self.changed.append(payload["parent_asin"])
+            return True
+        if stored[1] != payload["payload_hash"]:
+            self.payload_only[record["id"]] = payload
+        else:
+            self.unchanged += 1
+        return False
+
+    def deleted(self) -> list[str]:
+        return [point_id for point_id in self.stored if point_id not in self.seen]
+
+    def summary(self) -> dict:
+        deleted = self.deleted()
+        return {
+            "stored_points": len(self.stored),
+            "new": len(self.new),
+            "changed": len(self.changed),
+            "payload_only": len(self.payload_only),
+            "unchanged": self.unchanged,
+            "deleted": len(deleted),
+            "sample": {
+                "new": self.new[:SAMPLE_SIZE],
+                "changed": self.changed[:SAMPLE_SIZE],
+                "payload_only": [payload["parent_asin"] for payload in list(self.payload_only.values())[:SAMPLE_SIZE]],
+                "deleted": [self.stored[point_id][2] for point_id in deleted[:SAMPLE_SIZE]],
+            },
+        }
+
+
+def dry_run_diff(kind: str, path: str, diff: Diff, model: str):
+    """Classify the dump without embedding anything (same record building as the ingestion)."""
+    build_record = RECORD_BUILDERS[kind]
+    for _, row in read_jsonl(path):
+        record = build_record(row) if row is not None else None
+        if record is None:
+            continue
+        record["payload"]["payload_hash"] = payload_hash(record["payload"])
+        record["payload"]["content_hash"] = content_hash(record["text"], model)
+        diff.classify(record)
+
+
+async def update_payloads(client: AsyncQdrantClient, collection: str, payloads: dict):
+    items = list(payloads.items())
+    for start in range(0, len(items), WRITE_BATCH_SIZE):
+        await client.batch_update_points(collection, update_operations=[
+            SetPayloadOperation(set_payload=SetPayload(payload=payload, points=[point_id]))
+            for point_id, payload in items[start:start + WRITE_BATCH_SIZE]
+        ])
+
+
+async def delete_points(client: AsyncQdrantClient, collection: str, point_ids: list[str]):
+    for start in range(0, len(point_ids), WRITE_BATCH_SIZE):
+        await client.delete(collection, points_selector=PointIdsList(points=point_ids[start:start + WRITE_BATCH_SIZE]), wait=True)
+
+
+async def reindex(
+    kind: str,
+    path: str,
+    collection: str,
+    embedder,
+    client: AsyncQdrantClient,
+    dry_run: bool = False,
+    delete: bool = True,
+    max_delete_fraction: float = 0.5,
+    force: bool = False,
+) -> dict:
+    """Bring `collection` in line with the dump at `path`, returns the diff (and the ingestion stats)."""
+    diff = Diff(await stored_hashes(client, collection))
+    model = getattr(embedder, "model", "unknown")
+
+    if dry_run:
+        await asyncio.to_thread(dry_run_diff, kind, path, diff, model)
+        return {"dry_run": True, **diff.summary()}
+
+    # always a full pass over the dump: deletes need every id of it
+    stats = await ingest(
+        kind, path, collection, embedder, client,
+        restart=True,
+        record_filter=diff.classify,
+        progress_file=progress_path(kind, collection).with_suffix(".reindex.json"),
+    )
+    await update_payloads(client, collection, diff.payload_only)
+
+    summary = diff.summary()
+    deleted = diff.deleted()
+    if delete and deleted:
+        if len(deleted) > max_delete_fraction * len(diff.stored) and not force:
+            logger.warning(
+                "Not deleting %s of %s points (over %.0f%%), check the dump or use --force",
+                len(deleted), len(diff.stored), max_delete_fraction * 100,
+            )
+            summary["deleted"] = 0
+        else:
+            await delete_points(client, collection, deleted)
+    elif not delete:
+        summary["deleted"] = 0
+
+    if summary["payload_only"] or summary["deleted"]:
+        await abump_catalog_version(client, collection, f"reindex {kind}") # the ingestion bumped it for embedded points
+
+    logger.info("Reindex of %s: %s", collection, {key: value for key, value in summary.items() if key != "sample"})
+    return {"dry_run": False, **summary, "embedded": stats["run_points"], "elapsed_s": stats["elapsed_s"]}
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    parser = argparse.ArgumentParser(description="Re-embed only new and changed records of a dump")
+    parser.add_argument("kind", choices=sorted(RECORD_BUILDERS))
+    parser.add_argument("path")
+    parser.add_argument("--collection", default=None, help="default: QDRANT_COLLECTION_NAME_ITEMS / _REVIEWS")
+    parser.add_argument("--dry-run", action="store_true", help="print the diff sizes, write nothing")
+    parser.add_argument("--no-delete", action="store_true", help="keep points that are not in the dump")
+    parser.add_argument("--max-delete-fraction", type=float, default=0.5)
+    parser.add_argument("--force", action="store_true", help="delete even above --max-delete-fraction")
+    parser.add_argument("--fake-embeddings", action="store_true", help="hashing embedder, no embeddings API calls")
+    args = parser.parse_args()
+
+    collection = args.collection or (
+        config.QDRANT_COLLECTION_NAME_ITEMS if args.kind == "items" else config.QDRANT_COLLECTION_NAME_REVIEWS
+    )
+    embedder = hashing_embedder() if args.fake_embeddings else openai_embedder()
+
+    async def run():
+        try:
+            return await reindex(
+                args.kind, args.path, collection, embedder, get_async_qdrant_client(),
+                dry_run=args.dry_run, delete=not args.no_delete,
+                max_delete_fraction=args.max_delete_fraction, force=args.force,
+            )
+        finally:
+            await close_async_qdrant_client()
+
+    result = asyncio.run(run())
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,19 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from httpx import AsyncClient
+import asyncio
 import logging
 from contextlib import asynccontextmanager
-from api.core.config import settings
+from api.core.config import config
+from api.core.qdrant import get_qdrant_client, close_qdrant_client, close_async_qdrant_client, check_qdrant_health, ensure_payload_index
+from api.core.postgres import open_postgres_pool, close_postgres_pool
+from api.core.checkpoints import checkpoint_serde, TimedAsyncPostgresSaver
+from api.core.llm import open_llm_clients, close_llm_clients
 from api.api.middleware import RequestIdMiddleware
 from api.api.endpoints import api_router
+from api.rag.graph import compile_graph
+from api.rag.history import get_encoding
+from api.rag.local_index import local_index
+from api.processors.feedback_spool import feedback_spool
 
 logging.basicConfig(
     level=logging.INFO,
@@ -13,14 +21,38 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-client = AsyncClient(timeout=settings.DEFAULT_TIMEOUT)
-
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Application is starting up...")
+    # OpenAI clients (pooled, keep-alive connections): mostly the openai / instructor imports,
+    # done in a thread while the Qdrant and Postgres setup below waits on the network
+    llm_clients = asyncio.create_task(asyncio.to_thread(open_llm_clients))
+    token_encoding = asyncio.create_task(asyncio.to_thread(get_encoding)) # history token counts (tiktoken file)
+    get_qdrant_client() # create the shared Qdrant client once per worker
+    ensure_payload_index(config.QDRANT_COLLECTION_NAME_ITEMS, "parent_asin") # bulk hydration filters on it
+    ensure_payload_index(config.QDRANT_COLLECTION_NAME_REVIEWS, "parent_asin") # review filter and group by
+    if config.LOCAL_INDEX_ENABLED:
+        try:
+            await asyncio.to_thread(local_index.start) # load (or export) the in-process items index
+        except Exception as e:
+            logger.warning("Local index unavailable, item retrieval stays on Qdrant: %s", e)
+
+    # Checkpointer on a connection pool + graph compiled once, instead of on every request
+    pool = await open_postgres_pool()
+    checkpointer = TimedAsyncPostgresSaver(pool, serde=checkpoint_serde()) # compressed blobs, load / save timed
+    await checkpointer.setup() # creates / migrates checkpoint tables, idempotent
+    compile_graph(checkpointer)
+    await llm_clients
+    await token_encoding
+    feedback_spool.start() # sends what an earlier run left in the spool, then new feedback
     yield
     logger.info("Application is shutting down...")
-    await client.aclose()
+    await asyncio.to_thread(feedback_spool.stop) # unsent feedback stays in the spool for the next start
+    local_index.stop()
+    await close_llm_clients()
+    close_qdrant_client()
+    await close_async_qdrant_client()
+    await close_postgres_pool()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -44,6 +76,8 @@ async def root():
     """Root endpoint"""
     return {"message": "API"}
 
-# @app.get("/health")
-# async def health():
-#     return {"status": "ok"}
\ No newline at end of file
+@app.get("/health")
+def health():
+    """Health check, includes a round trip to Qdrant"""
+    qdrant = check_qdrant_health()
+    return {"status": qdrant["status"], "qdrant": qdrant}
\ No newline at end of file
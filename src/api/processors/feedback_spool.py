@@ -0,0 +1,273 @@
+"""Durable feedback spool between /submit_feedback and LangSmith
+
+The endpoint only appends the feedback entries to a local SQLite file
+(FEEDBACK_SPOOL_PATH, WAL, committed before the response) and returns; a
+background thread sends them to LangSmith:
+    - every FEEDBACK_FLUSH_INTERVAL_SECONDS, or as soon as FEEDBACK_BATCH_SIZE
+      entries are waiting, up to FEEDBACK_BATCH_SIZE entries per flush
+    - a failed entry is retried after FEEDBACK_BACKOFF_SECONDS, doubled per
+      attempt (with jitter, capped at FEEDBACK_MAX_BACKOFF_SECONDS); the flush
+      stops at the first failure so an unavailable LangSmith is not hammered
+    - after FEEDBACK_MAX_ATTEMPTS, or at once when LangSmith rejects the entry
+      itself (LangSmithUserError, a 4xx other than 404 / 408 / 429 and the
+      credential errors 401 / 403), the entry is kept as dead for inspection
+      instead of being retried forever
+Every entry carries its own feedback_id, so an entry sent twice (timeout after
+LangSmith accepted it, a crash before the row was deleted) is stored once.
+Workers sharing the file claim batches in a write transaction.
+
+Entries left in the spool at shutdown are sent by the next start.
+"""
+
+import json
+import logging
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from langsmith.utils import LangSmithConflictError, LangSmithUserError
+
+from api.core.config import config
+from api.core.metrics import FEEDBACK_FLUSH_SECONDS, FEEDBACK_SENT, FEEDBACK_SPOOL_DEPTH
+from api.processors.submit_feedback import feedback_records, send_feedback_record
+
+logger = logging.getLogger(__name__)
+
+CLAIM_SECONDS = 60.0 # a claimed batch not finished by then (worker died) is picked up again
+# 4xx worth retrying: not found yet (the run is still being ingested), timeout, rate limit, and
+# credentials (the same for every entry, fixing them must not leave the spool dead)
+RETRYABLE_CLIENT_ERRORS = {401, 403, 404, 408, 429}
+STATUS_IN_MESSAGE = re.compile(r"\b(\d{3}) (?:Client|Server) Error\b") # requests.HTTPError, repeated by LangSmithError
+
+
+def status_code(error: Exception) -> int | None:
+    """HTTP status of a failed LangSmith call: from a response in the exception chain, or its message."""
+    seen = error
+    while seen is not None:
+        response = getattr(seen, "response", None)
+        if getattr(response, "status_code", None) is not None:
+            return response.status_code
+        seen = seen.__cause__ or seen.__context__
+    match = STATUS_IN_MESSAGE.search(str(error))
+    return int(match.group(1)) if match else None
+
+
+def rejected(error: Exception) -> bool:
+    """True when LangSmith refuses the entry itself, so sending it again can't succeed."""
+    if isinstance(error, LangSmithUserError):
+        return True
+    status = status_code(error)
+    return status is not None and 400 <= status < 500 and status not in RETRYABLE_CLIENT_ERRORS
+
+
+class FeedbackSpool:
+
+    def __init__(self, path: str, batch_size: int, flush_interval: float, max_attempts: int, backoff: float, max_backoff: float):
+        self.path = path or ":memory:" # empty: not durable, still off the request path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._db = None
+        self.retry_after = 0.0 # set after a failed send, the flush thread pauses that long
+        self.enqueued = 0
+        self.sent = 0
+        self.retries = 0
+        self.dropped = 0
+        self.last_flush = None
+        self.last_error = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None) # explicit transactions
+            self._db.execute("PRAGMA journal_mode=WAL") # several uvicorn workers can share the file
+            self._db.execute("PRAGMA busy_timeout=5000")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS feedback ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, feedback_id TEXT NOT NULL, record TEXT NOT NULL, "
+                "created_at REAL NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, next_attempt_at REAL NOT NULL, "
+                "dead INTEGER NOT NULL DEFAULT 0, last_error TEXT)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS feedback_due ON feedback (dead, next_attempt_at)")
+        return self._db
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction on the spool (IMMEDIATE: takes the write lock up front, workers queue on busy_timeout)."""
+        with self._lock:
+            db = self._connect()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+
+    def depth(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM feedback WHERE dead = 0").fetchone()[0]
+
+    #################################################################################
+    # Request path
+    #################################################################################
+
+    def enqueue(self, trace_id: str, feedback_score: int = None, feedback_text: str = "", feedback_source_type: str = "api") -> int:
+        """Persist the entries of one submission, returns how many were spooled."""
+        records = feedback_records(trace_id, feedback_score, feedback_text, feedback_source_type)
+        if not records:
+            return 0
+
+        now = time.time()
+        with self._transaction() as db:
+            db.executemany(
+                "INSERT INTO feedback (feedback_id, record, created_at, next_attempt_at) VALUES (?, ?, ?, ?)",
+                [(str(uuid.uuid4()), json.dumps(record), now, now) for record in records],
+            )
+        self.enqueued += len(records)
+
+        depth = self.depth()
+        FEEDBACK_SPOOL_DEPTH.set(depth)
+        if depth >= self.batch_size:
+            self._wake.set()
+        return len(records)
+
+    #################################################################################
+    # Background flush
+    #################################################################################
+
+    def _claim(self) -> list[tuple]:
+        """Due entries of this batch, pushed CLAIM_SECONDS ahead so other workers skip them."""
+        now = time.time()
+        with self._transaction() as db:
+            rows = db.execute(
+                "SELECT id, feedback_id, record, attempts FROM feedback "
+                "WHERE dead = 0 AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+                (now, self.batch_size),
+            ).fetchall()
+            db.executemany("UPDATE feedback SET next_attempt_at = ? WHERE id = ?", [(now + CLAIM_SECONDS, row[0]) for row in rows])
+        return rows
+
+    def retry_delay(self, attempts: int) -> float:
+        return min(self.max_backoff, self.backoff * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+
+    def flush(self) -> int:
+        """Send one batch, returns the number of entries delivered (fewer than claimed after a failure)."""
+        self.retry_after = 0.0
+        rows = self._claim()
+        if not rows:
+            return 0
+
+        start = time.perf_counter()
+        delivered, failed, dead, released = [], [], [], []
+        for index, (row_id, feedback_id, record, attempts) in enumerate(rows):
+            try:
+                send_feedback_record(json.loads(record), feedback_id=feedback_id, stop_after_attempt=1)
+                delivered.append((row_id,))
+            except LangSmithConflictError: # already stored by an earlier attempt
+                delivered.append((row_id,))
+            except Exception as e:
+                attempts += 1
+                self.last_error = repr(e)
+                if rejected(e) or attempts >= self.max_attempts:
+                    logger.error("Feedback %s dropped after %s attempts: %s", feedback_id, attempts, e)
+                    dead.append((attempts, repr(e), row_id))
+                else:
+                    logger.warning("Feedback %s not sent (attempt %s): %s", feedback_id, attempts, e)
+                    self.retry_after = self.retry_delay(attempts)
+                    failed.append((attempts, time.time() + self.retry_after, repr(e), row_id))
+                # stop at the first failure, the rest of the batch goes back to the queue
+                released = [(time.time(), row[0]) for row in rows[index + 1:]]
+                break
+
+        with self._transaction() as db:
+            db.executemany("DELETE FROM feedback WHERE id = ?", delivered)
+            db.executemany("UPDATE feedback SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?", failed)
+            db.executemany("UPDATE feedback SET attempts = ?, dead = 1, last_error = ? WHERE id = ?", dead)
+            db.executemany("UPDATE feedback SET next_attempt_at = ? WHERE id = ?", released)
+
+        FEEDBACK_FLUSH_SECONDS.observe(time.perf_counter() - start)
+        FEEDBACK_SENT.labels(result="sent").inc(len(delivered))
+        FEEDBACK_SENT.labels(result="retry").inc(len(failed))
+        FEEDBACK_SENT.labels(result="dropped").inc(len(dead))
+        FEEDBACK_SPOOL_DEPTH.set(self.depth())
+        self.sent += len(delivered)
+        self.retries += len(failed)
+        self.dropped += len(dead)
+        self.last_flush = time.time()
+        return len(delivered)
+
+    def start(self):
+        """Start the flush thread (entries spooled by an earlier run are sent first)."""
+        FEEDBACK_SPOOL_DEPTH.set(self.depth())
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="feedback-flush", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                delivered = self.flush()
+            except Exception as e: # e.g. the spool file stayed locked, try again later
+                logger.warning("Feedback flush failed: %s", e)
+                delivered, self.retry_after = 0, self.flush_interval
+
+            if self.retry_after: # LangSmith failing: wait out the backoff, new entries do not cut it short
+                self._stop.wait(self.retry_after)
+            elif delivered < self.batch_size: # a full batch means more may be waiting, flush again right away
+                self._wake.wait(self.flush_interval)
+            self._wake.clear()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the flush thread after its current batch; what is left stays in the spool."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            db = self._connect()
+            depth, dead, oldest = db.execute(
+                "SELECT SUM(dead = 0), SUM(dead = 1), MIN(CASE WHEN dead = 0 THEN created_at END) FROM feedback"
+            ).fetchone()
+        return {
+            "path": self.path,
+            "depth": depth or 0,
+            "dead": dead or 0,
+            "oldest_age_s": round(time.time() - oldest, 1) if oldest else 0.0,
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "retries": self.retries,
+            "dropped": self.dropped,
+            "last_flush": self.last_flush,
+            "last_error": self.last_error,
+        }
+
+
+feedback_spool = FeedbackSpool(
+    config.FEEDBACK_SPOOL_PATH,
+    batch_size=config.FEEDBACK_BATCH_SIZE,
+    flush_interval=config.FEEDBACK_FLUSH_INTERVAL_SECONDS,
+    max_attempts=config.FEEDBACK_MAX_ATTEMPTS,
+    backoff=config.FEEDBACK_BACKOFF_SECONDS,
+    max_backoff=config.FEEDBACK_MAX_BACKOFF_SECONDS,
+)
+
+
+def feedback_spool_stats() -> dict:
+    return feedback_spool.stats()
@@ -1,23 +1,24 @@
-from langsmith import Client
 from api.api.models import FeedbackRequest
+from api.core.langsmith_client import get_langsmith_client
 
-client = Client()
-
-def submit_feedback(trace_id: str, feedback_score: int = None, feedback_text: str = "", feedback_source_type: str = "api"):
+def feedback_records(trace_id: str, feedback_score: int = None, feedback_text: str = "", feedback_source_type: str = "api") -> list[dict]:
+    """LangSmith feedback entries (thumbs and / or comment) for one submission."""
+    records = []
     if feedback_score is not None:
-        client.create_feedback(
-            run_id=trace_id,
-            key="thumbs",
-            score=feedback_score,
-            feedback_source_type=feedback_source_type,
-        )
-    
+        records.append({"run_id": trace_id, "key": "thumbs", "score": feedback_score, "feedback_source_type": feedback_source_type})
+
     if len(feedback_text) > 0:
-        client.create_feedback(
-            run_id=trace_id,
-            key="comment",
-            value=feedback_text,
-            feedback_source_type=feedback_source_type,
-        )
+        records.append({"run_id": trace_id, "key": "comment", "value": feedback_text, "feedback_source_type": feedback_source_type})
+
+    return records
 
-        
\ No newline at end of file
+
+def send_feedback_record(record: dict, feedback_id: str = None, stop_after_attempt: int = 10):
+    """One blocking create_feedback call; a fixed feedback_id makes a resend of the same entry a no-op (409)."""
+    get_langsmith_client().create_feedback(**record, feedback_id=feedback_id, stop_after_attempt=stop_after_attempt)
+
+
+# Blocking, the API goes through the spool instead (see api/processors/feedback_spool.py)
+def submit_feedback(trace_id: str, feedback_score: int = None, feedback_text: str = "", feedback_source_type: str = "api"):
+    for record in feedback_records(trace_id, feedback_score, feedback_text, feedback_source_type):
+        send_feedback_record(record)
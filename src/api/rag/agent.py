@@ -1,14 +1,19 @@
 """	Agent node that does tool callin""" 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
 from typing import List
-import instructor
-from openai import OpenAI
+import logging
+import time
 from langsmith import traceable, get_current_run_tree
 from langchain_core.messages import AIMessage
 
-from api.rag.utils.utils import lc_messages_to_regular_messages
 from api.rag.utils.utils import prompt_template_config
+from api.rag.history import prepare_history, aprepare_history
+from api.rag.utils.streaming import emit_event, stream_tokens_enabled
 from api.core.config import config
+from api.core.llm import get_instructor_client, get_async_instructor_client
+from api.core.metrics import LLM_SECONDS, timed
+
+logger = logging.getLogger(__name__)
 
 
 # Pydantic models are needed for structured output, specifically Instructor
@@ -32,40 +37,33 @@ class AgentResponse(BaseModel):
 
 # Define the agent (cpoy agent node from notebook)
 
-@traceable(
-   name="agent_node",
-   run_type="llm",
-   metadata={"ls_provider": config.GENERATION_MODEL_PROVIDER, "ls_model_name": config.GENERATION_MODEL},
-)
-
-def agent_node(state) -> dict:
+# System prompt + conversation window in OpenAI format (shared by sync and async node)
+# available_tools is bound to the nodes in graph.py, it is static and not kept in the (persisted) state
+# conversation comes from prepare_history / aprepare_history (api/rag/history.py)
+def build_agent_messages(available_tools, conversation) -> list:
 
     # yaml file path and prompt template name
     prompt_template = prompt_template_config(config.RAG_PROMPT_TEMPLATE_PATH,"rag_generation") 
-    prompt = prompt_template.render(available_tools=state.available_tools)
+    prompt = prompt_template.render(available_tools=available_tools)
 
-    messages = state.messages
-    conversation = []
-    for msg in messages:
-        conversation.append(lc_messages_to_regular_messages(msg))
+    return [{"role": "system", "content": prompt}, *conversation]
 
-    client = instructor.from_openai(OpenAI())
 
-    response, raw_response = client.chat.completions.create_with_completion(
-        model=config.GENERATION_MODEL,
-        response_model=AgentResponse,
-        messages=[{"role": "system", "content": prompt}, *conversation],
-        temperature=0.5,
-    )
-    
+# Tracing metadata and state update from the LLM response
+# raw_response is None when the answer was streamed (no usage reported)
+def agent_state_update(state, response, raw_response) -> dict:
+
+    trace_id = ""
+
     # Add custom metadata for tracing
     current_run = get_current_run_tree()
     if current_run:
-        current_run.metadata["usage_metadata"] = {
-            "input_tokens": raw_response.usage.prompt_tokens, # is not tracked by default, we add it manually
-            "output_tokens": raw_response.usage.completion_tokens,
-            "total_tokens": raw_response.usage.total_tokens,  
-        }
+        if raw_response is not None:
+            current_run.metadata["usage_metadata"] = {
+                "input_tokens": raw_response.usage.prompt_tokens, # is not tracked by default, we add it manually
+                "output_tokens": raw_response.usage.completion_tokens,
+                "total_tokens": raw_response.usage.total_tokens,  
+            }
         trace_id = str(getattr(current_run, "trace_id", current_run.id))
 
 
@@ -99,5 +97,96 @@ def agent_node(state) -> dict:
     }
 
 
+@traceable(
+   name="agent_node",
+   run_type="llm",
+   metadata={"ls_provider": config.GENERATION_MODEL_PROVIDER, "ls_model_name": config.GENERATION_MODEL},
+)
+
+def agent_node(state, available_tools) -> dict:
+
+    client = get_instructor_client()
+    conversation, history_update = prepare_history(state)
+
+    with timed(LLM_SECONDS, stage="llm", node="agent_node"):
+        response, raw_response = client.chat.completions.create_with_completion(
+            model=config.GENERATION_MODEL,
+            response_model=AgentResponse,
+            messages=build_agent_messages(available_tools, conversation),
+            temperature=0.5,
+        )
+
+    return {**agent_state_update(state, response, raw_response), **history_update}
+
+
+# Async version, used by the /rag endpoint (graph.ainvoke), does not block the event loop
+@traceable(
+   name="agent_node",
+   run_type="llm",
+   metadata={"ls_provider": config.GENERATION_MODEL_PROVIDER, "ls_model_name": config.GENERATION_MODEL},
+)
+async def aagent_node(state, available_tools) -> dict:
+
+    client = get_async_instructor_client()
+
+    iteration = state.iteration + 1
+    emit_event("agent_start", iteration=iteration)
+    start = time.perf_counter()
+
+    conversation, history_update = await aprepare_history(state)
+    messages = build_agent_messages(available_tools, conversation)
+
+    with timed(LLM_SECONDS, stage="llm", node="agent_node"):
+        if stream_tokens_enabled():
+            response, raw_response = await astream_agent_response(client, messages, iteration), None
+        else:
+            response, raw_response = await client.chat.completions.create_with_completion(
+                model=config.GENERATION_MODEL,
+                response_model=AgentResponse,
+                messages=messages,
+                temperature=0.5,
+            )
+
+    emit_event(
+        "agent_end",
+        iteration=iteration,
+        duration_ms=round((time.perf_counter() - start) * 1000, 1),
+        tool_calls=[tc.name for tc in response.tool_calls],
+        final_answer=response.final_answer,
+    )
+
+    return {**agent_state_update(state, response, raw_response), **history_update}
+
 
+# Stream the structured response, emitting the answer field as it grows
+async def astream_agent_response(client, messages, iteration) -> AgentResponse:
 
+    answer = ""
+    partial = None
+    async for partial in client.chat.completions.create_partial(
+        model=config.GENERATION_MODEL,
+        response_model=AgentResponse,
+        messages=messages,
+        temperature=0.5,
+    ):
+        if partial.answer and len(partial.answer) > len(answer):
+            emit_event("token", iteration=iteration, delta=partial.answer[len(answer):])
+            answer = partial.answer
+
+    # the last partial is the full response, unless the stream ended early: fields it never
+    # reached take their defaults, and without a usable partial the turn is asked again unstreamed
+    if partial is not None:
+        fields = {key: value for key, value in partial.model_dump().items() if value is not None}
+        try:
+            return AgentResponse.model_validate({"retrieved_context_ids": [], **fields})
+        except ValidationError as e:
+            logger.warning("Incomplete streamed agent response, asking again without streaming: %s", e)
+    else:
+        logger.warning("Empty streamed agent response, asking again without streaming")
+
+    return await client.chat.completions.create(
+        model=config.GENERATION_MODEL,
+        response_model=AgentResponse,
+        messages=messages,
+        temperature=0.5,
+    )
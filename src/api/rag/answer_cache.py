@@ -0,0 +1,206 @@
+"""Semantic answer cache in front of the agent
+
+Answers (with their product cards) are stored under the query embedding. A new
+question is answered from the cache when a stored query in the same scope has
+cosine similarity >= ANSWER_CACHE_THRESHOLD. Scopes:
+    - "first_turn": questions without prior thread context
+    - "ctx:<hash>": follow-up questions, keyed by a hash of the thread so far
+      (only when ANSWER_CACHE_FOLLOW_UPS is enabled)
+
+The scope of a question comes from the thread so far. To keep the checkpoint
+read off misses, each worker remembers the scope after the last turn it ran in
+a thread (ANSWER_CACHE_MAX_THREADS threads), a thread it has not seen is looked
+up as a first turn, and the thread is only read from the checkpointer to
+confirm a hit (turns may have run on another worker); fresh answers are stored
+under the scope computed from the finished run's messages.
+
+Entries expire after a TTL, the cache is bounded (oldest entries are evicted),
+and everything is dropped when the items collection changes: its catalog
+version (bumped by ingestion, reindex, the BM25 backfill and /cache/invalidate,
+see api/core/catalog_version.py) or its points count.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from api.core.catalog_version import acatalog_fingerprint
+from api.core.config import config
+from api.core.metrics import record_cache_lookup
+from api.core.qdrant import get_async_qdrant_client
+
+logger = logging.getLogger(__name__)
+
+FIRST_TURN_SCOPE = "first_turn"
+
+
+def context_scope(messages) -> str:
+    """Scope key for a follow-up question: hash of the user / assistant turns so far (tool outputs excluded)."""
+    turns = []
+    for msg in messages:
+        role = msg.get("role") if isinstance(msg, dict) else getattr(msg, "type", "")
+        content = msg.get("content") if isinstance(msg, dict) else getattr(msg, "content", "")
+        if role in ("user", "human", "assistant", "ai") and content:
+            turns.append([role, content])
+    return "ctx:" + hashlib.sha256(json.dumps(turns).encode("utf-8")).hexdigest()
+
+
+def scope_of(messages) -> str:
+    """Scope of the next question of a thread whose messages so far are `messages`."""
+    return context_scope(messages) if messages else FIRST_TURN_SCOPE
+
+
+def question_scope(messages) -> str:
+    """Scope the last question of `messages` was asked in (the messages before it)."""
+    questions = [
+        index for index, msg in enumerate(messages)
+        if (msg.get("role") if isinstance(msg, dict) else getattr(msg, "type", "")) in ("user", "human")
+    ]
+    return scope_of(messages[:questions[-1]] if questions else [])
+
+
+class AnswerCache:
+
+    def __init__(self, threshold: float, ttl_seconds: float, max_entries: int, max_threads: int):
+        self.threshold = threshold
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self.max_threads = max_threads
+        self._threads = OrderedDict() # thread_id -> scope of its next question, least recent first
+        self._entries = OrderedDict() # id -> (scope, unit vector, result, created_at), oldest first
+        self._matrices = {} # scope -> (ids, stacked vectors), rebuilt lazily after writes
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.catalog_version = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _unit(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _scope_matrix(self, scope: str):
+        if scope not in self._matrices:
+            ids = [id for id, entry in self._entries.items() if entry[0] == scope]
+            vectors = np.stack([self._entries[id][1] for id in ids]) if ids else None
+            self._matrices[scope] = (ids, vectors)
+        return self._matrices[scope]
+
+    def lookup(self, embedding, scope: str, count: bool = True):
+        """Best cached result in scope above the similarity threshold, or None.
+
+        count=False leaves the hit / miss counters to the caller (record_lookup).
+        """
+        found = None
+        with self._lock:
+            ids, vectors = self._scope_matrix(scope)
+            if vectors is not None:
+                similarities = vectors @ self._unit(embedding)
+                now = time.monotonic()
+                for index in np.argsort(-similarities):
+                    if similarities[index] < self.threshold:
+                        break
+                    _, _, result, created_at = self._entries[ids[index]]
+                    if now - created_at <= self.ttl:
+                        found = {**result, "similarity": float(similarities[index])}
+                        break
+        if count:
+            self.record_lookup(found is not None)
+        return found
+
+    def record_lookup(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        record_cache_lookup("answer", hit)
+
+    def known_scope(self, thread_id) -> str | None:
+        """Scope of the next question of the thread, None if no turn of it ran on this worker."""
+        with self._lock:
+            return self._threads.get(thread_id)
+
+    def remember_scope(self, thread_id, scope: str):
+        with self._lock:
+            self._threads[thread_id] = scope
+            self._threads.move_to_end(thread_id)
+            while len(self._threads) > self.max_threads:
+                self._threads.popitem(last=False)
+
+    def store(self, embedding, scope: str, result: dict):
+        with self._lock:
+            self._entries[self._next_id] = (scope, self._unit(embedding), result, time.monotonic())
+            self._next_id += 1
+            self._matrices.pop(scope, None)
+
+            now = time.monotonic()
+            while self._entries:
+                oldest_id, (oldest_scope, _, _, created_at) = next(iter(self._entries.items()))
+                if len(self._entries) <= self.max_entries and now - created_at <= self.ttl:
+                    break
+                del self._entries[oldest_id] # over the size limit, or expired
+                self._matrices.pop(oldest_scope, None)
+
+    def invalidate(self, reason: str = ""):
+        with self._lock:
+            self._entries.clear()
+            self._matrices.clear()
+            self.invalidations += 1
+        logger.info("Answer cache invalidated %s", f"({reason})" if reason else "")
+
+    def check_catalog_version(self, version):
+        """Drop all answers when the items collection fingerprint changes."""
+        if self.catalog_version is not None and version != self.catalog_version:
+            self.invalidate(f"items collection changed: {self.catalog_version} -> {version}")
+        self.catalog_version = version
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "catalog_version": self.catalog_version,
+            "known_threads": len(self._threads),
+        }
+
+
+answer_cache = AnswerCache(
+    threshold=config.ANSWER_CACHE_THRESHOLD,
+    ttl_seconds=config.ANSWER_CACHE_TTL_SECONDS,
+    max_entries=config.ANSWER_CACHE_MAX_ENTRIES,
+    max_threads=config.ANSWER_CACHE_MAX_THREADS,
+)
+
+_last_version_check = 0.0
+
+async def acheck_catalog_version():
+    """Fingerprint the items collection (at most every ANSWER_CACHE_VERSION_CHECK_SECONDS)."""
+    global _last_version_check
+
+    if time.monotonic() - _last_version_check < config.ANSWER_CACHE_VERSION_CHECK_SECONDS:
+        return
+    _last_version_check = time.monotonic()
+
+    try:
+        fingerprint = await acatalog_fingerprint(get_async_qdrant_client(), config.QDRANT_COLLECTION_NAME_ITEMS)
+    except Exception as e:
+        logger.warning("Could not fingerprint the items collection: %s", e)
+        return
+    answer_cache.check_catalog_version(fingerprint)
+
+
+def answer_cache_stats() -> dict:
+    return {"enabled": config.ANSWER_CACHE_ENABLED, **answer_cache.stats()}
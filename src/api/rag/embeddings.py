@@ -0,0 +1,367 @@
+"""Embedding service shared by the tools and the legacy RAG pipeline
+
+get_embedding looks up two cache tiers before calling the embeddings API:
+    - in-process LRU (bounded, per worker)
+    - on-disk SQLite store (survives restarts, shared by workers on the same host)
+Both are keyed by (model, normalized text) and hold float32 vectors (6 KB per
+1536-dim vector, a list of Python floats is about 49 KB), converted to a list
+on read. aget_embedding checks the memory
+tier inline and reads / writes the SQLite tier off the event loop (read in a
+thread, write fire-and-forget on a single writer thread).
+
+Cache misses go through EmbeddingBatcher, which coalesces concurrent requests
+into one batched embeddings.create call.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from langsmith import traceable, get_current_run_tree
+
+from api.core.config import config
+from api.core.llm import get_openai_client, get_async_openai_client
+from api.core.metrics import EMBEDDING_SECONDS, add_stage, record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace and casefold, so trivially different queries share an entry."""
+    return " ".join(text.split()).casefold()
+
+
+class EmbeddingCache:
+    """Two-tier (memory LRU + SQLite) embedding cache with hit/miss counters."""
+
+    def __init__(self, max_size: int, path: str = ""):
+        self.max_size = max_size
+        self.path = path
+        self._memory = OrderedDict()
+        self._lock = threading.Lock() # memory tier, held for dict operations only
+        self._db_lock = threading.Lock() # SQLite connection, never taken on the event loop by aget_embedding
+        self._db = None
+        self._writer = None # single thread persisting the embeddings of the async path
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                self._db = sqlite3.connect(path, check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL") # several uvicorn workers can share the file
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings ("
+                    "model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL, "
+                    "PRIMARY KEY (model, text_hash))"
+                )
+                self._db.commit()
+                self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding-cache")
+            except sqlite3.Error as e:
+                logger.warning("On-disk embedding cache disabled (%s): %s", path, e)
+                self._db = None
+
+    @staticmethod
+    def key(model: str, text: str) -> tuple:
+        return model, hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+    @property
+    def disk_enabled(self) -> bool:
+        return self._db is not None
+
+    def get(self, model: str, text: str):
+        """Return (embedding, tier) where tier is "memory", "disk" or None on a miss."""
+        key = self.key(model, text)
+        embedding, tier = self.get_memory(key)
+        if embedding is None:
+            embedding, tier = self.get_disk(key)
+        return embedding, tier
+
+    def get_memory(self, key: tuple):
+        """Memory tier only, (None, None) on a miss (counted by get_disk)."""
+        with self._lock:
+            embedding = self._memory.get(key)
+            if embedding is None:
+                return None, None
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+        return embedding.tolist(), "memory"
+
+    def get_disk(self, key: tuple):
+        """Disk tier (blocking SQLite read), promotes a hit to the memory tier."""
+        if self._db is not None:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT vector FROM embeddings WHERE model = ? AND text_hash = ?", key
+                ).fetchone()
+            if row is not None:
+                embedding = array("f", row[0])
+                with self._lock:
+                    self._remember(key, embedding)
+                    self.disk_hits += 1
+                return embedding.tolist(), "disk"
+
+        with self._lock:
+            self.misses += 1
+        return None, None
+
+    async def aget_disk(self, key: tuple):
+        if self._db is None:
+            return self.get_disk(key) # counts the miss, nothing blocking
+        return await asyncio.to_thread(self.get_disk, key)
+
+    def put(self, model: str, text: str, embedding: list[float]):
+        key = self.key(model, text)
+        self.remember(key, embedding)
+        self.persist(key, embedding)
+
+    def remember(self, key: tuple, embedding: list[float]):
+        embedding = array("f", embedding) # converted outside the lock
+        with self._lock:
+            self._remember(key, embedding)
+
+    def persist(self, key: tuple, embedding: list[float]):
+        """Write to the disk tier (blocking INSERT + commit)."""
+        if self._db is None:
+            return
+        with self._db_lock:
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+                    (*key, array("f", embedding).tobytes()), # float32, 6 KB per 1536-dim vector
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.warning("Could not persist embedding: %s", e)
+
+    def persist_in_background(self, key: tuple, embedding: list[float]):
+        """Fire-and-forget persist, the request does not wait for the SQLite write."""
+        if self._writer is not None:
+            self._writer.submit(self.persist, key, embedding)
+
+    def _remember(self, key: tuple, embedding: array):
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        with self._lock:
+            memory_bytes = sum(len(vector) * vector.itemsize for vector in self._memory.values())
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            "memory_size": len(self._memory),
+            "memory_max_size": self.max_size,
+            "memory_bytes": memory_bytes, # vector data only
+            "disk_enabled": self._db is not None,
+        }
+
+
+embedding_cache = EmbeddingCache(config.EMBEDDING_CACHE_SIZE, config.EMBEDDING_CACHE_PATH)
+
+
+def embedding_cache_stats() -> dict:
+    return embedding_cache.stats()
+
+
+# Network call, only made on a cache miss
+def create_embeddings(texts: list[str], model: str) -> list[list[float]]:
+    response = get_openai_client().embeddings.create(
+        input=texts,
+        model=model,
+    )
+
+    current_run = get_current_run_tree()
+    if current_run:
+        current_run.metadata["usage_metadata"] = {
+            "input_tokens": response.usage.prompt_tokens, # is not tracked by default, we add it manually
+            "total_tokens": response.usage.total_tokens,
+        }
+
+    return [item.embedding for item in response.data]
+
+
+class EmbeddingBatcher:
+    """Coalesce concurrent embedding requests into batched API calls.
+
+    Callers submit one text and get a concurrent.futures.Future back. A collector
+    thread waits up to window_ms after the first pending text (or until max_size
+    texts are queued) and sends them as one request; the vectors are fanned back
+    out to the futures. Sync callers block on the future, async callers await it.
+    """
+
+    def __init__(self, embed_fn, window_ms: float, max_size: int, max_in_flight: int):
+        self.embed_fn = embed_fn # (texts, model) -> list of vectors
+        self.window = window_ms / 1000
+        self.max_size = max_size
+        self._queue = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="embedding-batch")
+        self._collector = None
+        self._start_lock = threading.Lock()
+        self.batches = 0
+        self.texts = 0
+
+    def submit(self, text: str, model: str) -> Future:
+        self._ensure_started()
+        future = Future()
+        self._queue.put((model, text, future))
+        return future
+
+    def embed(self, text: str, model: str) -> list[float]:
+        return self.submit(text, model).result()
+
+    async def aembed(self, text: str, model: str) -> list[float]:
+        return await asyncio.wrap_future(self.submit(text, model))
+
+    def _ensure_started(self):
+        if self._collector is None:
+            with self._start_lock:
+                if self._collector is None:
+                    self._collector = threading.Thread(target=self._collect, name="embedding-batcher", daemon=True)
+                    self._collector.start()
+
+    def _collect(self):
+        while True:
+            batch = [self._queue.get()] # block until there is work
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            # flush off the collector thread, so the next batch can form while this one is in flight
+            self._executor.submit(self._flush, batch)
+
+    def _flush(self, batch: list):
+        by_model = {}
+        for model, text, future in batch:
+            by_model.setdefault(model, {}).setdefault(text, []).append(future) # identical texts share one input
+
+        for model, futures_by_text in by_model.items():
+            texts = list(futures_by_text)
+            try:
+                embeddings = self.embed_fn(texts, model)
+            except Exception as e:
+                for futures in futures_by_text.values():
+                    for future in futures:
+                        future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.texts += len(texts)
+            for text, embedding in zip(texts, embeddings):
+                for future in futures_by_text[text]:
+                    future.set_result(embedding)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "texts": self.texts,
+            "avg_batch_size": round(self.texts / self.batches, 2) if self.batches else 0.0,
+            "window_ms": self.window * 1000,
+            "max_size": self.max_size,
+        }
+
+
+# Usage metadata of batched calls is not attached to the callers' runs (the call is made off their thread)
+embedding_batcher = EmbeddingBatcher(
+    create_embeddings,
+    window_ms=config.EMBEDDING_BATCH_WINDOW_MS,
+    max_size=config.EMBEDDING_BATCH_MAX_SIZE,
+    max_in_flight=config.EMBEDDING_BATCH_MAX_IN_FLIGHT,
+)
+
+
+def embedding_batcher_stats() -> dict:
+    return {"enabled": config.EMBEDDING_BATCHING_ENABLED, **embedding_batcher.stats()}
+
+
+async def acreate_embeddings(texts: list[str], model: str) -> list[list[float]]:
+    response = await get_async_openai_client().embeddings.create(
+        input=texts,
+        model=model,
+    )
+
+    current_run = get_current_run_tree()
+    if current_run:
+        current_run.metadata["usage_metadata"] = {
+            "input_tokens": response.usage.prompt_tokens,
+            "total_tokens": response.usage.total_tokens,
+        }
+
+    return [item.embedding for item in response.data]
+
+
+@traceable(
+    name="embed_query",
+    run_type="embedding",
+    metadata={"ls_provider": config.EMBEDDING_MODEL_PROVIDER, "ls_model_name": config.EMBEDDING_MODEL},
+)
+def get_embedding(text, model=config.EMBEDDING_MODEL):
+    start = time.perf_counter()
+    embedding, tier = embedding_cache.get(model, text)
+    record_cache_lookup("embedding", tier is not None)
+
+    current_run = get_current_run_tree()
+    if current_run:
+        current_run.metadata["embedding_cache"] = tier or "miss"
+
+    if embedding is None:
+        if config.EMBEDDING_BATCHING_ENABLED:
+            embedding = embedding_batcher.embed(text, model)
+        else:
+            embedding = create_embeddings([text], model)[0]
+        embedding_cache.put(model, text, embedding)
+
+    elapsed = time.perf_counter() - start
+    EMBEDDING_SECONDS.labels(cache=tier or "miss").observe(elapsed)
+    add_stage("embed", elapsed)
+    return embedding
+
+
+@traceable(
+    name="embed_query",
+    run_type="embedding",
+    metadata={"ls_provider": config.EMBEDDING_MODEL_PROVIDER, "ls_model_name": config.EMBEDDING_MODEL},
+)
+async def aget_embedding(text, model=config.EMBEDDING_MODEL):
+    start = time.perf_counter()
+    # memory tier inline, the SQLite tier in a thread: the event loop never waits on the disk
+    key = embedding_cache.key(model, text)
+    embedding, tier = embedding_cache.get_memory(key)
+    if embedding is None:
+        embedding, tier = await embedding_cache.aget_disk(key)
+    record_cache_lookup("embedding", tier is not None)
+
+    current_run = get_current_run_tree()
+    if current_run:
+        current_run.metadata["embedding_cache"] = tier or "miss"
+
+    if embedding is None:
+        if config.EMBEDDING_BATCHING_ENABLED:
+            embedding = await embedding_batcher.aembed(text, model)
+        else:
+            embedding = (await acreate_embeddings([text], model))[0]
+        embedding_cache.remember(key, embedding)
+        embedding_cache.persist_in_background(key, embedding)
+
+    elapsed = time.perf_counter() - start
+    EMBEDDING_SECONDS.labels(cache=tier or "miss").observe(elapsed)
+    add_stage("embed", elapsed)
+    return embedding
@@ -0,0 +1,257 @@
+"""Conversation history sent to the agent, windowed to a token budget
+
+State.messages grows with every turn (add reducer), so instead of resending
+the whole thread on every agent iteration, prepare_history builds a window:
+    - the current turn (last user message onwards) is always sent verbatim
+    - the HISTORY_KEEP_TURNS previous turns are sent verbatim
+    - older turns are sent with their tool outputs compacted into short stubs
+    - if the window is still over HISTORY_TOKEN_BUDGET, the oldest turns are
+      dropped; with HISTORY_SUMMARY_ENABLED they are folded into a rolling
+      summary (State.history_summary) sent as a system message instead
+
+Messages are converted to OpenAI format once per thread and cached
+(ConvertedHistory), so each iteration only converts the new messages. Token
+counts use the tiktoken encoding of the generation model, loaded at startup in
+a thread (the API lifespan): loading it reads, on the first run downloads, the
+BPE file, which must not happen on the event loop of the first request.
+"""
+
+import asyncio
+import json
+import logging
+import re
+import threading
+from collections import OrderedDict
+
+from langgraph.config import get_config
+
+from api.core.config import config
+from api.core.llm import get_openai_client, get_async_openai_client
+from api.core.metrics import LLM_SECONDS, timed
+from api.rag.utils.utils import lc_messages_to_regular_messages
+
+logger = logging.getLogger(__name__)
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def get_encoding():
+    """tiktoken encoding of the generation model, None if unavailable (chars / 4 is used instead)."""
+    global _encoding
+
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                try:
+                    import tiktoken
+                    try:
+                        _encoding = tiktoken.encoding_for_model(config.GENERATION_MODEL)
+                    except KeyError:
+                        _encoding = tiktoken.get_encoding("o200k_base")
+                except Exception as e: # not installed, or the encoding file can't be downloaded
+                    logger.warning("tiktoken unavailable, estimating tokens from characters: %s", e)
+                    _encoding = False
+    return _encoding or None
+
+
+def count_tokens(message: dict) -> int:
+    text = message.get("content") or ""
+    if message.get("tool_calls"):
+        text += json.dumps(message["tool_calls"])
+
+    encoding = get_encoding()
+    tokens = len(encoding.encode(text, disallowed_special=())) if encoding else len(text) // 4
+    return tokens + 4 # per-message overhead (role, separators)
+
+
+def _fingerprint(msg):
+    if isinstance(msg, dict):
+        return (msg.get("role"), msg.get("content"))
+    return (type(msg).__name__, getattr(msg, "content", str(msg)))
+
+
+class ConvertedHistory:
+    """Per-thread cache of messages already converted to OpenAI format, with their token counts.
+
+    Threads are append-only, so the cached list is a prefix of the current
+    one; it is checked by comparing the last cached message and rebuilt on mismatch.
+    """
+
+    def __init__(self, max_threads: int):
+        self.max_threads = max_threads
+        self._threads = OrderedDict() # thread_id -> (fingerprint of last message, converted, tokens)
+        self._lock = threading.Lock()
+        self.converted = 0
+        self.reused = 0
+
+    def convert(self, thread_id, messages) -> tuple[list[dict], list[int]]:
+        converted, tokens = [], []
+        if thread_id is not None:
+            with self._lock:
+                cached = self._threads.get(thread_id)
+                if cached is not None:
+                    self._threads.move_to_end(thread_id)
+            if cached is not None:
+                last, cached_converted, cached_tokens = cached
+                n = len(cached_converted)
+                if 0 < n <= len(messages) and _fingerprint(messages[n - 1]) == last:
+                    converted, tokens = list(cached_converted), list(cached_tokens)
+
+        reused = len(converted)
+        for msg in messages[reused:]:
+            message = lc_messages_to_regular_messages(msg)
+            converted.append(message)
+            tokens.append(count_tokens(message))
+
+        with self._lock:
+            self.reused += reused
+            self.converted += len(messages) - reused
+            if thread_id is not None and messages:
+                self._threads[thread_id] = (_fingerprint(messages[-1]), converted, tokens)
+                self._threads.move_to_end(thread_id)
+                while len(self._threads) > self.max_threads:
+                    self._threads.popitem(last=False)
+
+        return converted, tokens
+
+    def stats(self) -> dict:
+        return {
+            "threads": len(self._threads),
+            "max_threads": self.max_threads,
+            "messages_converted": self.converted,
+            "messages_reused": self.reused,
+        }
+
+
+converted_history = ConvertedHistory(config.HISTORY_CACHE_MAX_THREADS)
+
+
+def compact_tool_message(message: dict) -> dict:
+    """Replace an old tool output with a stub: its first characters and the item ids it listed."""
+    content = message.get("content") or ""
+    if len(content) <= config.HISTORY_TOOL_STUB_CHARS:
+        return message
+
+    ids = list(dict.fromkeys(re.findall(r"^- ([^,:\s]+)", content, flags=re.MULTILINE)))
+    stub = f"{content[:config.HISTORY_TOOL_STUB_CHARS]}... [earlier tool output compacted, {len(content)} chars"
+    stub += f", items: {', '.join(ids)}]" if ids else "]"
+    return {**message, "content": stub}
+
+
+def split_turns(messages: list[dict], start: int = 0) -> list[tuple[int, int]]:
+    """(start, end) index ranges of the turns in messages[start:], a turn begins with a user message."""
+    starts = [i for i in range(start, len(messages)) if messages[i]["role"] == "user"]
+    if not starts or starts[0] != start:
+        starts.insert(0, start)
+    return [(s, e) for s, e in zip(starts, starts[1:] + [len(messages)]) if s < e]
+
+
+def window_history(converted, tokens, summarized_messages, budget, keep_turns) -> tuple[list[dict], int]:
+    """Select the messages to send; returns the window and the index of its first message.
+
+    Messages before summarized_messages are already covered by the summary and are skipped.
+    """
+    turns = split_turns(converted, summarized_messages)
+    if not turns:
+        return [], summarized_messages
+
+    compact_before = turns[max(0, len(turns) - 1 - keep_turns)][0]
+
+    def turn_messages(s, e):
+        return [
+            compact_tool_message(converted[i]) if i < compact_before and converted[i]["role"] == "tool" else converted[i]
+            for i in range(s, e)
+        ]
+
+    window = [turn_messages(s, e) for s, e in turns]
+    window_tokens = [
+        sum(tokens[i] if m is converted[i] else count_tokens(m) for i, m in zip(range(s, e), msgs))
+        for (s, e), msgs in zip(turns, window)
+    ]
+
+    # drop the oldest turns until under budget, the current turn is always kept
+    first = 0
+    total = sum(window_tokens)
+    while total > budget and first < len(turns) - 1:
+        total -= window_tokens[first]
+        first += 1
+
+    return [m for msgs in window[first:] for m in msgs], turns[first][0]
+
+
+SUMMARY_PROMPT = """You maintain a short running summary of a conversation between a user and a shopping assistant.
+Update the summary with the new messages below. Keep the user's needs and preferences, the products
+discussed (with their IDs and prices) and any conclusions. Drop greetings and tool details. Answer with
+the summary only, at most 200 words.
+
+Current summary:
+{summary}
+
+New messages:
+{messages}"""
+
+
+def summary_request(summary: str, folded: list[dict]) -> dict:
+    lines = [f"{m['role']}: {m.get('content') or ''}" for m in folded if m["role"] in ("user", "assistant")]
+    return dict(
+        model=config.HISTORY_SUMMARY_MODEL,
+        messages=[{"role": "user", "content": SUMMARY_PROMPT.format(summary=summary or "(empty)", messages="\n".join(lines))}],
+        temperature=0,
+    )
+
+
+def current_thread_id():
+    try:
+        return get_config().get("configurable", {}).get("thread_id")
+    except RuntimeError: # called outside of a graph run
+        return None
+
+
+def _window(state):
+    converted, tokens = converted_history.convert(current_thread_id(), state.messages)
+    start = min(state.summarized_messages, len(converted))
+    window, first = window_history(
+        converted, tokens, start, config.HISTORY_TOKEN_BUDGET, config.HISTORY_KEEP_TURNS,
+    )
+    return converted[start:first], window, first
+
+
+def _with_summary(summary: str, window: list[dict]) -> list[dict]:
+    if not summary:
+        return window
+    return [{"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"}, *window]
+
+
+def prepare_history(state) -> tuple[list[dict], dict]:
+    """Conversation messages for the agent and the state update (rolling summary) that goes with them."""
+    folded, window, first = _window(state)
+    if not folded or not config.HISTORY_SUMMARY_ENABLED:
+        return _with_summary(state.history_summary, window), {}
+
+    with timed(LLM_SECONDS, stage="llm", node="history_summary"):
+        response = get_openai_client().chat.completions.create(**summary_request(state.history_summary, folded))
+    summary = response.choices[0].message.content or state.history_summary
+    return _with_summary(summary, window), {"history_summary": summary, "summarized_messages": first}
+
+
+async def aprepare_history(state) -> tuple[list[dict], dict]:
+    if _encoding is None: # not loaded by the lifespan (evals, notebooks)
+        await asyncio.to_thread(get_encoding)
+    folded, window, first = _window(state)
+    if not folded or not config.HISTORY_SUMMARY_ENABLED:
+        return _with_summary(state.history_summary, window), {}
+
+    with timed(LLM_SECONDS, stage="llm", node="history_summary"):
+        response = await get_async_openai_client().chat.completions.create(**summary_request(state.history_summary, folded))
+    summary = response.choices[0].message.content or state.history_summary
+    return _with_summary(summary, window), {"history_summary": summary, "summarized_messages": first}
+
+
+def history_stats() -> dict:
+    return {
+        "token_budget": config.HISTORY_TOKEN_BUDGET,
+        "keep_turns": config.HISTORY_KEEP_TURNS,
+        "summary_enabled": config.HISTORY_SUMMARY_ENABLED,
+        **converted_history.stats(),
+    }
@@ -0,0 +1,69 @@
+"""Product hydration: image and price for the items the agent cited
+
+All cited parent_asins are fetched with one filtered scroll (MatchAny on the
+keyword-indexed parent_asin field), only the fields needed for the product
+cards are returned, and the output keeps the order the agent cited them in.
+"""
+
+from qdrant_client.models import Filter, FieldCondition, MatchAny
+
+from api.core.config import config
+from api.core.qdrant import get_qdrant_client, get_async_qdrant_client
+from api.core.metrics import HYDRATION_SECONDS, QDRANT_SECONDS, timed
+
+HYDRATION_FIELDS = ["parent_asin", "first_large_image", "price"]
+
+
+def hydration_scroll_args(parent_asins: list[str]) -> dict:
+    return dict(
+        collection_name=config.QDRANT_COLLECTION_NAME_ITEMS,
+        scroll_filter=Filter(
+            must=[
+                FieldCondition(
+                    key="parent_asin",
+                    match=MatchAny(any=parent_asins)
+                )
+            ]
+        ),
+        limit=len(parent_asins),
+        with_payload=HYDRATION_FIELDS,
+        with_vectors=False,
+        timeout=config.QDRANT_QUERY_TIMEOUT,
+    )
+
+
+def images_from_points(context_ids, points) -> list[dict]:
+    """Product cards in citation order, items without an image are skipped."""
+    payload_by_asin = {}
+    for point in points:
+        payload_by_asin.setdefault(point.payload.get("parent_asin"), point.payload)
+
+    image_url_list = []
+    for id in context_ids:
+        payload = payload_by_asin.get(id.id, {})
+        image_url = payload.get("first_large_image")
+        price = payload.get("price")
+        if image_url:
+            image_url_list.append({"image_url": image_url, "price": price, "description": id.description})
+
+    return image_url_list
+
+
+def hydrate_items(context_ids) -> list[dict]:
+    parent_asins = list(dict.fromkeys(id.id for id in context_ids)) # unique, order kept
+    if not parent_asins:
+        return []
+
+    with timed(HYDRATION_SECONDS, stage="hydrate"), timed(QDRANT_SECONDS, operation="hydration_scroll"):
+        points, _ = get_qdrant_client().scroll(**hydration_scroll_args(parent_asins))
+        return images_from_points(context_ids, points)
+
+
+async def ahydrate_items(context_ids) -> list[dict]:
+    parent_asins = list(dict.fromkeys(id.id for id in context_ids))
+    if not parent_asins:
+        return []
+
+    with timed(HYDRATION_SECONDS, stage="hydrate"), timed(QDRANT_SECONDS, operation="hydration_scroll"):
+        points, _ = await get_async_qdrant_client().scroll(**hydration_scroll_args(parent_asins))
+        return images_from_points(context_ids, points)
@@ -0,0 +1,343 @@
+"""In-process index over the items collection (optional, LOCAL_INDEX_ENABLED)
+
+The items catalog is small (a few thousand products x 1536 float32), so the
+hybrid item retrieval can run in the worker instead of going to Qdrant:
+    - the collection is exported once to LOCAL_INDEX_DIR: a float32 .npy matrix
+      of unit vectors (opened memory-mapped, shared by workers through the page
+      cache) and a JSON sidecar with point ids and the retrieval payload
+    - dense top-k is an exact dot product over the matrix
+    - the text prefetch and the RRF fusion mirror what item_query_args asks
+      Qdrant for, so both paths return the same ranking (up to score ties):
+        * MatchText: case-sensitive substring match, or all query tokens
+          present when the collection has a full-text index on "text"
+        * filter-only prefetch results in point id order
+        * ITEM_KEYWORD_MODE "bm25": the same sparse vectors (api/rag/sparse.py)
+          scored with Qdrant's IDF, ln((N - n + 0.5) / (n + 0.5) + 1)
+        * RRF score = sum over prefetches of 1 / (2 + rank), rank 0-based
+
+Exports are written to a new version directory and published by atomically
+replacing the CURRENT pointer file; readers keep serving the previous version
+until the new one is loaded. Workers share LOCAL_INDEX_DIR: an flock on
+LOCAL_INDEX_DIR/.lock makes export, publish and prune exclusive and reading
+CURRENT shared, so no version is removed while a worker loads it, and a worker
+that waited for another one's export loads it instead of exporting again. A background thread re-exports when the collection
+changes (checked every LOCAL_INDEX_REFRESH_SECONDS): its catalog version, bumped
+by every writer (api/core/catalog_version.py), its points count or its text index.
+"""
+
+import fcntl
+import json
+import logging
+import math
+import os
+import re
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+from qdrant_client.models import ScoredPoint, PayloadSchemaType
+
+from api.core.catalog_version import catalog_version
+from api.core.config import config
+from api.core.qdrant import get_qdrant_client
+from api.rag.sparse import encode_document, encode_query
+
+logger = logging.getLogger(__name__)
+
+PAYLOAD_FIELDS = ["parent_asin", "text", "price"] # what item_context_from_points reads
+RRF_K = 2 # same constant as Qdrant's rrf fusion
+
+
+def _tokens(text: str) -> set[str]:
+    return set(re.findall(r"\w+", text.lower()))
+
+
+class LocalItemIndex:
+
+    def __init__(self, directory: Path, meta: dict, vectors: np.ndarray, points: list[dict]):
+        self.directory = directory
+        self.meta = meta
+        self.vectors = vectors # (n, dim) unit vectors, memory-mapped
+        self.ids = [point["id"] for point in points]
+        self.payloads = [point["payload"] for point in points]
+        self.text_index = meta.get("text_index", False)
+        self._texts = [payload.get("text") or "" for payload in self.payloads]
+        self._text_tokens = [_tokens(text) for text in self._texts] if self.text_index else None
+        self._postings = None # BM25 inverted index, built by prepare() (or on first use)
+
+    def _bm25_postings(self) -> dict[int, list[tuple[int, float]]]:
+        if self._postings is None:
+            postings = {}
+            for row, text in enumerate(self._texts):
+                vector = encode_document(text)
+                for index, value in zip(vector.indices, vector.values):
+                    postings.setdefault(index, []).append((row, value))
+            self._postings = postings
+        return self._postings
+
+    def prepare(self):
+        """Build what the keyword branch needs up front: encoding every document takes far too long for a query."""
+        if config.ITEM_KEYWORD_MODE == "bm25":
+            self._bm25_postings()
+
+    @classmethod
+    def load(cls, directory: Path) -> "LocalItemIndex":
+        meta = json.loads((directory / "meta.json").read_text())
+        vectors = np.load(directory / "vectors.npy", mmap_mode="r")
+        points = json.loads((directory / "points.json").read_text())
+        return cls(directory, meta, vectors, points)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def dense(self, query_embedding, limit: int) -> list[tuple[int, float]]:
+        """(row, cosine similarity) of the top `limit` rows, best first."""
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        scores = self.vectors @ (query / norm if norm else query)
+
+        limit = min(limit, len(scores))
+        if limit == 0:
+            return []
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(row), float(scores[row])) for row in top]
+
+    def text_match(self, query: str, limit: int) -> list[int]:
+        """First `limit` rows (point id order) whose text matches the query."""
+        rows = []
+        if self.text_index:
+            query_tokens = _tokens(query)
+            matches = (i for i, tokens in enumerate(self._text_tokens) if query_tokens <= tokens)
+        else:
+            matches = (i for i, text in enumerate(self._texts) if query in text)
+        for row in matches:
+            rows.append(row)
+            if len(rows) == limit:
+                break
+        return rows
+
+    def bm25(self, query: str, limit: int) -> list[int]:
+        """Top `limit` rows by BM25 (IDF computed over the exported points, as Qdrant does)."""
+        postings = self._bm25_postings()
+        n = len(self)
+        scores = {}
+        query_vector = encode_query(query)
+        for index, weight in zip(query_vector.indices, query_vector.values):
+            matches = postings.get(index, [])
+            idf = math.log((n - len(matches) + 0.5) / (len(matches) + 0.5) + 1)
+            for row, value in matches:
+                scores[row] = scores.get(row, 0.0) + idf * weight * value
+        return [row for row, _ in sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]]
+
+    def query(self, query: str, query_embedding, top_k: int, prefetch_limit: int) -> list[ScoredPoint]:
+        """Hybrid retrieval fused with RRF, returns the points item_context_from_points expects."""
+        if config.ITEM_KEYWORD_MODE == "bm25":
+            keyword = self.bm25(query, prefetch_limit)
+        else:
+            keyword = self.text_match(query, prefetch_limit)
+        rankings = [
+            [row for row, _ in self.dense(query_embedding, prefetch_limit)],
+            keyword,
+        ]
+
+        scores = {} # insertion ordered: ties keep the order the rows were first seen in
+        for ranking in rankings:
+            for rank, row in enumerate(ranking):
+                scores[row] = scores.get(row, 0.0) + 1 / (RRF_K + rank)
+
+        fused = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [
+            ScoredPoint(id=self.ids[row], version=0, score=score, payload=self.payloads[row])
+            for row, score in fused
+        ]
+
+
+#####################################################################################
+# Export and atomic refresh
+#####################################################################################
+
+def collection_fingerprint(client, collection: str) -> dict:
+    info = client.get_collection(collection)
+    return {
+        "catalog_version": catalog_version(client, collection), # read before the export scrolls: a bump during it re-exports
+        "points_count": info.points_count,
+        "text_index": (info.payload_schema.get("text") is not None
+                       and info.payload_schema["text"].data_type == PayloadSchemaType.TEXT),
+    }
+
+
+@contextmanager
+def directory_lock(directory: Path, exclusive: bool):
+    """Inter-process lock of the index directory: exclusive to export / publish / prune, shared to load."""
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / ".lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def export_local_index(directory: str | Path, client=None, collection: str = None, batch_size: int = 256) -> Path:
+    """Export the collection into a new version directory and publish it as CURRENT."""
+    with directory_lock(Path(directory), exclusive=True):
+        return _export(Path(directory), client, collection, batch_size)
+
+
+def _export(directory: Path, client=None, collection: str = None, batch_size: int = 256) -> Path:
+    """export_local_index, the directory lock already held."""
+    client = client or get_qdrant_client()
+    collection = collection or config.QDRANT_COLLECTION_NAME_ITEMS
+    start = time.perf_counter()
+
+    fingerprint = collection_fingerprint(client, collection)
+    points, vectors = [], []
+    offset = None
+    while True:
+        batch, offset = client.scroll(
+            collection_name=collection,
+            limit=batch_size,
+            offset=offset,
+            with_payload=PAYLOAD_FIELDS,
+            with_vectors=True,
+        )
+        for point in batch:
+            points.append({"id": point.id, "payload": point.payload})
+            # collections with named (sparse) vectors return a dict, "" is the dense default vector
+            vectors.append(point.vector[""] if isinstance(point.vector, dict) else point.vector)
+        if offset is None:
+            break
+
+    matrix = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.where(norms == 0, 1, norms)
+
+    version = f"v-{time.time_ns()}-{os.getpid()}" # sorts by export time
+    target = directory / version
+    target.mkdir(parents=True, exist_ok=True)
+    np.save(target / "vectors.npy", matrix)
+    (target / "points.json").write_text(json.dumps(points))
+    (target / "meta.json").write_text(json.dumps({
+        "collection": collection,
+        "dim": int(matrix.shape[1]) if len(matrix) else 0,
+        "exported_at": time.time(),
+        **fingerprint,
+    }))
+
+    pointer = directory / f"CURRENT.{os.getpid()}.tmp"
+    pointer.write_text(version)
+    os.replace(pointer, directory / "CURRENT") # atomic publish
+
+    logger.info("Local index exported: %s points in %.1fs (%s)", len(points), time.perf_counter() - start, target)
+    _remove_old_versions(directory, keep=config.LOCAL_INDEX_KEEP_VERSIONS)
+    return target
+
+
+def _remove_old_versions(directory: Path, keep: int):
+    current = (directory / "CURRENT").read_text().strip()
+    versions = sorted(path for path in directory.glob("v-*") if path.is_dir() and path.name != current)
+    for path in versions[:max(0, len(versions) - (keep - 1))]:
+        shutil.rmtree(path, ignore_errors=True) # mapped files of a removed version stay readable until unmapped
+
+
+def load_current(directory: str | Path) -> LocalItemIndex | None:
+    directory = Path(directory)
+    with directory_lock(directory, exclusive=False):
+        return _load_current(directory)
+
+
+def _load_current(directory: Path) -> LocalItemIndex | None:
+    """load_current, the directory lock already held."""
+    try:
+        version = (directory / "CURRENT").read_text().strip()
+    except FileNotFoundError:
+        return None
+    return LocalItemIndex.load(directory / version)
+
+
+class LocalIndexManager:
+    """Holds the index used by the tools and keeps it in sync with the collection."""
+
+    def __init__(self, directory: str, refresh_seconds: float):
+        self.directory = Path(directory)
+        self.refresh_seconds = refresh_seconds
+        self.index = None
+        self.refreshes = 0
+        self.last_check = None
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh(self, force: bool = False) -> bool:
+        """Load the published version, exporting a new one when it is missing or stale. True if swapped."""
+        with self._refresh_lock:
+            self.last_check = time.time()
+            fingerprint = collection_fingerprint(get_qdrant_client(), config.QDRANT_COLLECTION_NAME_ITEMS)
+
+            index = load_current(self.directory)
+            if force or self._stale(index, fingerprint):
+                with directory_lock(self.directory, exclusive=True):
+                    index = _load_current(self.directory) # another worker may have exported while this one waited
+                    if force or self._stale(index, fingerprint):
+                        _export(self.directory)
+                        index = _load_current(self.directory)
+
+            if self.index is not None and index.directory == self.index.directory:
+                return False
+            index.prepare() # in this thread (startup, refresh thread), not in the first query on the event loop
+            self.index = index # readers pick up the new index on their next query
+            self.refreshes += 1
+            logger.info("Local index loaded: %s points (%s)", len(index), index.directory.name)
+            return True
+
+    @staticmethod
+    def _stale(index: LocalItemIndex | None, fingerprint: dict) -> bool:
+        return index is None or any(index.meta.get(key) != value for key, value in fingerprint.items())
+
+    def start(self):
+        """Load the index now and keep refreshing it in a background thread."""
+        self.refresh()
+        if self._thread is None and self.refresh_seconds > 0:
+            self._thread = threading.Thread(target=self._run, name="local-index-refresh", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_seconds):
+            try:
+                self.refresh()
+            except Exception as e: # keep serving the loaded index
+                logger.warning("Local index refresh failed: %s", e)
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self) -> dict:
+        if self.index is None:
+            return {"enabled": config.LOCAL_INDEX_ENABLED, "status": "not loaded"}
+        return {
+            "enabled": config.LOCAL_INDEX_ENABLED,
+            "status": "loaded",
+            "version": self.index.directory.name,
+            "points": len(self.index),
+            "text_index": self.index.text_index,
+            "refreshes": self.refreshes,
+            "last_check": self.last_check,
+        }
+
+
+local_index = LocalIndexManager(config.LOCAL_INDEX_DIR, config.LOCAL_INDEX_REFRESH_SECONDS)
+
+
+def get_local_index() -> LocalItemIndex | None:
+    """The loaded index when the local path is enabled, otherwise None (query Qdrant)."""
+    if not config.LOCAL_INDEX_ENABLED:
+        return None
+    return local_index.index
+
+
+def local_index_stats() -> dict:
+    return local_index.stats()
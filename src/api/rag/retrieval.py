@@ -1,42 +1,20 @@
-import openai
-from qdrant_client import QdrantClient
-from qdrant_client.models import Prefetch, Filter, FieldCondition, MatchText, FusionQuery
+from qdrant_client.models import Prefetch, FusionQuery
 from langsmith import traceable, get_current_run_tree
-import instructor
 from pydantic import BaseModel
-from openai import OpenAI
 from typing import List
 import json
 
 from api.rag.utils.utils import prompt_template_config, prompt_template_regstry
 from api.core.config import config
+from api.core.qdrant import get_qdrant_client
+from api.core.llm import get_instructor_client
+from api.rag.embeddings import get_embedding
+from api.rag.sparse import keyword_prefetch
 
-#qdrant_client = QdrantClient(url=f"http://{config.QDRANT_URL}:6333")
 # Tracing / Evals: https://smith.langchain.com/
 
 
-# 1. Embed quer (data sample is already embedded)
-@traceable(
-    name="embed_query", # name for the span, any name
-    run_type="embedding", # type of operation, predefined by langsmith
-    metadata={"ls_provider": config.EMBEDDING_MODEL_PROVIDER, "ls_model_name": config.EMBEDDING_MODEL}, # keys are predefined by langsmith
-)
-def get_embedding(text, model=config.EMBEDDING_MODEL):
-    response = openai.embeddings.create(
-        input=[text],
-        model=model,
-    )
-    
-    # Add custom metadata for tracing
-    current_run = get_current_run_tree()
-    if current_run:
-        current_run.metadata["usage_metadata"] = {
-            "input_tokens": response.usage.prompt_tokens, # is not tracked by default, we add it manually
-            "total_tokens": response.usage.total_tokens,
-        }
-    
-    
-    return response.data[0].embedding
+# 1. Embed query: get_embedding is shared with the tools (api/rag/embeddings.py, cached)
 
 
 # 2. Ask a query and retrieve the context (include query embedding)
@@ -49,17 +27,16 @@ def retrieve_context(query, qdrant_client, top_k=5):
     query_embedding = get_embedding(query)
     
     results = qdrant_client.query_points(
-        collection_name=config.QDRANT_COLLECTION_NAME,
+        collection_name=config.QDRANT_COLLECTION_NAME_ITEMS,
         prefetch = [ # will return no more than 20 items from each prefetch (40 in total)
             Prefetch(
                 query = query_embedding,
                 limit = 20), # vector similarity search (dense)
-            Prefetch(
-                filter = Filter(must = [FieldCondition(key = "text",match = MatchText(text=query))]), # exact keyword search (sparse)
-                limit = 20), 
+            keyword_prefetch(query, limit = 20), # keyword search: MatchText filter or BM25 (ITEM_KEYWORD_MODE)
         ],
         query=FusionQuery(fusion='rrf'),  
         limit = top_k, 
+        timeout = config.QDRANT_QUERY_TIMEOUT,
     )
     
     # Add metadata to the run for debugging
@@ -161,7 +138,7 @@ class RAGGenerationResponse(BaseModel):
 )
 def generate_answer(prompt):
     
-    client = instructor.from_openai(OpenAI())
+    client = get_instructor_client()
     
     response, raw_response = client.chat.completions.create_with_completion(
         #model = "gpt-4.1",
@@ -206,15 +183,16 @@ def rag_pipeline(question, qdrant_client, top_k=5):
 # 6. Rag pipeline wrapper for api
 def rag_pipeline_wrapper(question, top_k=5):
     
-    qdrant_client = QdrantClient(url=f"http://{config.QDRANT_URL}:6333")
+    qdrant_client = get_qdrant_client()
     
     result = rag_pipeline(question, qdrant_client, top_k)
     
     image_url_list = []
     for id in result['answer'].retrieved_context_ids:
         payload = qdrant_client.retrieve(
-            collection_name=config.QDRANT_COLLECTION_NAME,
+            collection_name=config.QDRANT_COLLECTION_NAME_ITEMS,
             ids=[id.id],
+            timeout=config.QDRANT_QUERY_TIMEOUT,
         )[0].payload
         image_url = payload.get('first_large_image')
         price = payload.get('price')
@@ -0,0 +1,185 @@
+"""BM25 sparse vectors for the keyword branch of the hybrid item search
+
+ITEM_KEYWORD_MODE selects the keyword prefetch fused (RRF) with the dense one:
+    - "text_filter": Filter(MatchText(text=query)), a boolean full-text filter
+      returning unranked matches (original behaviour)
+    - "bm25": query on the named sparse vector SPARSE_VECTOR_NAME, ranked by BM25
+
+Sparse vectors are computed locally, no model needed:
+    - tokens: lowercased words, English stopwords and single letters removed
+    - vocabulary: each token is hashed to a stable 31-bit index (no vocabulary
+      file to build or ship; collisions are negligible at catalog scale)
+    - documents store the BM25 term-frequency part
+      tf * (k1 + 1) / (tf + k1 * (1 - b + b * len / BM25_AVG_DOC_LEN))
+    - queries store 1 per distinct token; Qdrant applies IDF at query time
+      (sparse vector configured with Modifier.IDF), so document values don't
+      change when the catalog grows
+
+Collections created before this need the sparse vector, which Qdrant can't add
+to an existing collection; the backfill copies the points into a new one:
+    python -m api.rag.sparse backfill [--collection items] [--target items-bm25]
+"""
+
+import argparse
+import hashlib
+import logging
+import re
+from collections import Counter
+
+from qdrant_client import models
+from qdrant_client.models import Prefetch, Filter, FieldCondition, MatchText, SparseVector
+
+from api.core.catalog_version import bump_catalog_version
+from api.core.config import config
+from api.core.qdrant import get_qdrant_client
+
+logger = logging.getLogger(__name__)
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have i if in into is it its me my no not of on or our so such
+that the their them then there these they this to too was we were what when which while who will with
+would you your can could do does did just than very also any all some only own same other more most
+""".split())
+
+
+def tokenize(text: str) -> list[str]:
+    return [token for token in re.findall(r"\w+", (text or "").lower()) if token not in STOPWORDS and (len(token) > 1 or token.isdigit())]
+
+
+def token_index(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=4).digest(), "big") & 0x7FFFFFFF
+
+
+def _sparse(weights: dict[int, float]) -> SparseVector:
+    indices = sorted(weights)
+    return SparseVector(indices=indices, values=[weights[index] for index in indices])
+
+
+def encode_document(text: str) -> SparseVector:
+    tokens = tokenize(text)
+    k1, b = config.BM25_K1, config.BM25_B
+    norm = k1 * (1 - b + b * len(tokens) / config.BM25_AVG_DOC_LEN)
+
+    weights = {}
+    for token, tf in Counter(tokens).items():
+        index = token_index(token)
+        weights[index] = weights.get(index, 0.0) + tf * (k1 + 1) / (tf + norm)
+    return _sparse(weights)
+
+
+def encode_query(text: str) -> SparseVector:
+    return _sparse({token_index(token): 1.0 for token in tokenize(text)})
+
+
+def sparse_vectors_config() -> dict:
+    return {config.SPARSE_VECTOR_NAME: models.SparseVectorParams(modifier=models.Modifier.IDF)}
+
+
+def keyword_prefetch(query: str, limit: int) -> Prefetch:
+    """Keyword half of the hybrid search, according to ITEM_KEYWORD_MODE."""
+    if config.ITEM_KEYWORD_MODE == "bm25":
+        return Prefetch(query=encode_query(query), using=config.SPARSE_VECTOR_NAME, limit=limit)
+
+    return Prefetch(
+        filter=Filter(
+            must=[
+                FieldCondition(
+                    key="text",
+                    match=MatchText(text=query)
+                )
+            ]
+        ),
+        limit=limit
+    )
+
+
+#####################################################################################
+# Backfill
+#####################################################################################
+
+def backfill(client, collection: str, target: str, batch_size: int = 256) -> str:
+    """Write BM25 vectors for every point of `collection`, returns the collection written to.
+
+    If the collection already has the sparse vector they are updated in place,
+    otherwise all points are copied into `target` (created with the dense config
+    of the source plus the sparse vector).
+    """
+    info = client.get_collection(collection)
+    in_place = config.SPARSE_VECTOR_NAME in (info.config.params.sparse_vectors or {})
+    if not in_place and not client.collection_exists(target):
+        client.create_collection(
+            target,
+            vectors_config=info.config.params.vectors,
+            sparse_vectors_config=sparse_vectors_config(),
+        )
+        for field, schema in (info.payload_schema or {}).items():
+            client.create_payload_index(target, field, field_schema=schema.data_type)
+
+    copied, doc_lengths = 0, []
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection,
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=not in_place,
+        )
+        if points:
+            sparse = {point.id: encode_document(point.payload.get("text", "")) for point in points}
+            doc_lengths += [len(tokenize(point.payload.get("text", ""))) for point in points]
+            if in_place:
+                client.update_vectors(collection, points=[
+                    models.PointVectors(id=point_id, vector={config.SPARSE_VECTOR_NAME: vector})
+                    for point_id, vector in sparse.items()
+                ])
+            else:
+                client.upsert(target, points=[
+                    models.PointStruct(
+                        id=point.id,
+                        vector={**_dense_vectors(point.vector), config.SPARSE_VECTOR_NAME: sparse[point.id]},
+                        payload=point.payload,
+                    )
+                    for point in points
+                ])
+            copied += len(points)
+        if offset is None:
+            break
+
+    if doc_lengths:
+        logger.info(
+            "Average document length: %.1f tokens (BM25_AVG_DOC_LEN is %s)",
+            sum(doc_lengths) / len(doc_lengths), config.BM25_AVG_DOC_LEN,
+        )
+    written = collection if in_place else target
+    logger.info("BM25 vectors written for %s points (%s)", copied, written)
+    if copied:
+        bump_catalog_version(client, written, "bm25 backfill")
+    return written
+
+
+def _dense_vectors(vector) -> dict:
+    """Dense vectors of a scrolled point as a named dict ("" is the unnamed default vector)."""
+    if isinstance(vector, dict):
+        return {name: value for name, value in vector.items() if not isinstance(value, SparseVector)}
+    return {"": vector}
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    parser = argparse.ArgumentParser(description="BM25 sparse vectors for the items collection")
+    commands = parser.add_subparsers(dest="command", required=True)
+    fill = commands.add_parser("backfill", help="compute and store BM25 vectors for all points")
+    fill.add_argument("--collection", default=config.QDRANT_COLLECTION_NAME_ITEMS)
+    fill.add_argument("--target", default=None, help="collection to copy into when the source has no sparse vector (default: <collection>-bm25)")
+    args = parser.parse_args()
+
+    target = args.target or f"{args.collection}-{config.SPARSE_VECTOR_NAME}"
+    written = backfill(get_qdrant_client(), args.collection, target)
+    if written != args.collection:
+        logger.info("Points copied, set QDRANT_COLLECTION_NAME_ITEMS=%s and ITEM_KEYWORD_MODE=bm25 to use them", written)
+
+
+if __name__ == "__main__":
+    main()
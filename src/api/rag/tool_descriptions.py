@@ -0,0 +1,100 @@
+"""Precomputed tool descriptions of the agent prompt
+
+get_tool_descriptions_from_node (api/rag/utils/utils.py) reads the source of
+every tool and parses it (inspect + ast), on every import of the graph. The
+result only changes with the tools, so it is written once to
+TOOL_DESCRIPTIONS_PATH (JSON, committed next to the prompts) and loaded at
+import instead:
+    - the file carries a fingerprint of the tools (name, signature, docstring),
+      computed from the function objects without reading their source
+    - a missing file or a fingerprint mismatch (a tool changed, the file was not
+      regenerated) falls back to parsing, with a warning, so the prompt never
+      describes a stale tool
+
+Regenerate after changing a tool (or the parser); check fails when stale:
+    python -m api.rag.tool_descriptions write
+    python -m api.rag.tool_descriptions check
+"""
+
+import argparse
+import hashlib
+import inspect
+import json
+import logging
+import sys
+
+import api.rag.tools as tools
+from api.core.config import config
+from api.rag.utils.utils import get_tool_descriptions_from_node
+
+logger = logging.getLogger(__name__)
+
+
+def tools_fingerprint(tool_node) -> str:
+    """Hash of what the descriptions are parsed from, for the tools of the node (in order)."""
+    digest = hashlib.sha256()
+    for tool_name in tool_node.tools_by_name:
+        function = getattr(tools, tool_name) # same lookup as get_tool_descriptions_from_node
+        digest.update(f"{tool_name}\0{inspect.signature(function)}\0{function.__doc__ or ''}\0".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def load_tool_descriptions(tool_node, path: str = None) -> list[dict]:
+    """Descriptions from the precomputed file when it matches the tools, parsed from their source otherwise."""
+    path = path or config.TOOL_DESCRIPTIONS_PATH
+    try:
+        with open(path, "r") as f:
+            cached = json.load(f)
+    except FileNotFoundError:
+        logger.info("No precomputed tool descriptions at %s, parsing the tool sources", path)
+    except (OSError, ValueError) as e:
+        logger.warning("Could not read tool descriptions from %s (%s), parsing the tool sources", path, e)
+    else:
+        if cached.get("fingerprint") == tools_fingerprint(tool_node):
+            return cached["tools"]
+        logger.warning("Tool descriptions in %s are stale, parsing the tool sources (run python -m api.rag.tool_descriptions write)", path)
+
+    return get_tool_descriptions_from_node(tool_node)
+
+
+def write_tool_descriptions(tool_node, path: str = None) -> dict:
+    path = path or config.TOOL_DESCRIPTIONS_PATH
+    descriptions = get_tool_descriptions_from_node(tool_node)
+    if not isinstance(descriptions, list):
+        raise RuntimeError(descriptions) # "Could not extract tool descriptions"
+
+    content = {"fingerprint": tools_fingerprint(tool_node), "tools": descriptions}
+    with open(path, "w") as f:
+        f.write(json.dumps(content, indent=2) + "\n")
+    return content
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    parser = argparse.ArgumentParser(description="Precomputed tool descriptions of the agent prompt")
+    parser.add_argument("command", choices=["write", "check"])
+    parser.add_argument("--path", default=config.TOOL_DESCRIPTIONS_PATH)
+    args = parser.parse_args()
+
+    from api.rag.graph import tool_node # the tools as registered in the graph
+
+    if args.command == "write":
+        content = write_tool_descriptions(tool_node, args.path)
+        logger.info("Wrote %s tool descriptions to %s (fingerprint %s)", len(content["tools"]), args.path, content["fingerprint"])
+        return
+
+    try:
+        with open(args.path, "r") as f:
+            cached = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error("Could not read %s: %s", args.path, e)
+        sys.exit(1)
+    if cached.get("fingerprint") != tools_fingerprint(tool_node) or cached.get("tools") != get_tool_descriptions_from_node(tool_node):
+        logger.error("%s is stale, run python -m api.rag.tool_descriptions write", args.path)
+        sys.exit(1)
+    logger.info("%s is up to date", args.path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""Tool node that runs the tool calls of one agent step concurrently
+
+Replaces langgraph's ToolNode in the graph:
+    - independent tool calls run in parallel on a bounded pool (threads for graph.invoke,
+      a semaphore for graph.ainvoke)
+    - identical (name, arguments) calls in the same step are executed once
+    - each tool has a timeout, counted from when the tool starts running (time
+      queued behind other requests' calls on the shared thread pool is not
+      charged to it); a slow tool returns a structured "tool timed out"
+      message to the agent instead of stalling the request
+    - a timed out sync tool is abandoned, its thread keeps a pool worker until
+      it returns; a call that can't start within queue_timeout (every worker
+      held by hung tools) is cancelled and gets the same timeout message, so
+      a saturated pool degrades the answers instead of blocking the requests
+    - tool_start / tool_end progress events are emitted for the streaming endpoint
+    - duration and outcome of each execution go to the Prometheus metrics
+      (tool label: registered tool name, "unknown" for anything else)
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from langchain_core.messages import ToolMessage
+
+from api.core.metrics import TOOL_CALLS, TOOL_SECONDS
+from api.rag.utils.streaming import emit_event
+
+logger = logging.getLogger(__name__)
+
+
+class ConcurrentToolNode:
+
+    def __init__(self, tools, max_concurrency: int, default_timeout: float, timeouts: dict = None, queue_timeout: float = 30.0):
+        self.tools_by_name = {tool.name: tool for tool in tools} # same attribute as ToolNode (used for tool descriptions)
+        self.max_concurrency = max_concurrency
+        self.default_timeout = default_timeout
+        self.timeouts = timeouts or {}
+        self.queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="tool")
+
+    def timeout_for(self, tool_name: str) -> float:
+        return self.timeouts.get(tool_name, self.default_timeout)
+
+    @staticmethod
+    def tool_calls_from_state(state) -> list:
+        last_message = state.messages[-1]
+        return getattr(last_message, "tool_calls", None) or []
+
+    @staticmethod
+    def dedupe(tool_calls) -> dict:
+        """(name, canonical arguments) -> tool calls sharing that execution"""
+        unique = {}
+        for call in tool_calls:
+            key = (call["name"], json.dumps(call["args"], sort_keys=True, default=str))
+            unique.setdefault(key, []).append(call)
+        return unique
+
+    #################################################################################
+    # Tool results
+    #################################################################################
+
+    def unknown_tool_content(self, name: str) -> str:
+        return f"Error: {name} is not a valid tool, try one of [{', '.join(self.tools_by_name)}]."
+
+    @staticmethod
+    def error_content(e: Exception) -> str:
+        return f"Error: {repr(e)}\n Please fix your mistakes."
+
+    @staticmethod
+    def timeout_content(name: str, timeout: float) -> str:
+        return json.dumps({
+            "error": "tool_timeout",
+            "tool": name,
+            "timeout_seconds": timeout,
+            "message": f"The tool {name} timed out after {timeout} seconds. Try a narrower query or answer with the available products.",
+        })
+
+    @staticmethod
+    def record(name: str, outcome: str, started: float, calls: int):
+        """Metrics of one execution, shared by `calls` identical tool calls (outcome: success, error, timeout)."""
+        TOOL_SECONDS.labels(tool=name, status=outcome).observe(time.monotonic() - started)
+        TOOL_CALLS.labels(tool=name, status=outcome).inc(calls)
+
+    def to_messages(self, tool_calls, results: dict) -> dict:
+        """One ToolMessage per tool call id, in the order the agent requested them."""
+        messages = []
+        for call in tool_calls:
+            key = (call["name"], json.dumps(call["args"], sort_keys=True, default=str))
+            content, status = results[key]
+            messages.append(ToolMessage(content=content, name=call["name"], tool_call_id=call["id"], status=status))
+        return {"messages": messages}
+
+    #################################################################################
+    # Sync (graph.invoke)
+    #################################################################################
+
+    @staticmethod
+    def _run_stamped(fn, args, stamp: dict, running: threading.Event):
+        """Runs in the worker thread: records when the tool actually starts."""
+        stamp["started"] = time.monotonic()
+        running.set()
+        return fn(args)
+
+    def invoke(self, state) -> dict:
+        tool_calls = self.tool_calls_from_state(state)
+        unique = self.dedupe(tool_calls)
+
+        futures = {}
+        results = {}
+        for key, calls in unique.items():
+            name, args = key[0], calls[0]["args"]
+            tool = self.tools_by_name.get(name)
+            if tool is None:
+                results[key] = (self.unknown_tool_content(name), "error")
+                TOOL_CALLS.labels(tool="unknown", status="error").inc(len(calls))
+                continue
+            emit_event("tool_start", tool=name, arguments=args)
+            context = contextvars.copy_context() # keep the tracing parent run in the worker thread
+            stamp, running = {}, threading.Event()
+            future = self._executor.submit(context.run, self._run_stamped, tool.invoke, args, stamp, running)
+            futures[key] = (future, stamp, running, time.monotonic())
+
+        for key, (future, stamp, running, queued) in futures.items():
+            name = key[0]
+            timeout = self.timeout_for(name)
+            # still queued in the pool: the timeout starts with the tool, the wait to start is bounded too
+            if not running.wait(max(0.0, queued + self.queue_timeout - time.monotonic())) and future.cancel():
+                logger.warning("Tool %s did not start within %ss (tool pool saturated)", name, self.queue_timeout)
+                results[key] = (self.timeout_content(name, self.queue_timeout), "error")
+                self.record(name, "timeout", queued, len(unique[key]))
+                emit_event("tool_end", tool=name, status="error", duration_ms=round((time.monotonic() - queued) * 1000, 1))
+                continue
+            running.wait() # started as the wait ran out (cancel failed), set right away
+            started = stamp["started"]
+            try:
+                remaining = max(0.0, timeout - (time.monotonic() - started))
+                results[key] = (str(future.result(timeout=remaining)), "success")
+                outcome = "success"
+            except FutureTimeoutError:
+                logger.warning("Tool %s timed out after %ss", name, timeout)
+                results[key] = (self.timeout_content(name, timeout), "error")
+                outcome = "timeout"
+            except Exception as e:
+                logger.warning("Tool %s failed: %s", name, e)
+                results[key] = (self.error_content(e), "error")
+                outcome = "error"
+            self.record(name, outcome, started, len(unique[key]))
+            emit_event("tool_end", tool=name, status=results[key][1], duration_ms=round((time.monotonic() - started) * 1000, 1))
+
+        return self.to_messages(tool_calls, results)
+
+    #################################################################################
+    # Async (graph.ainvoke)
+    #################################################################################
+
+    async def ainvoke(self, state) -> dict:
+        tool_calls = self.tool_calls_from_state(state)
+        unique = self.dedupe(tool_calls)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run(key, calls):
+            name, args = key[0], calls[0]["args"]
+            tool = self.tools_by_name.get(name)
+            if tool is None:
+                TOOL_CALLS.labels(tool="unknown", status="error").inc(len(calls))
+                return key, (self.unknown_tool_content(name), "error")
+
+            timeout = self.timeout_for(name)
+            async with semaphore:
+                emit_event("tool_start", tool=name, arguments=args)
+                started = time.monotonic()
+                try:
+                    result = (str(await asyncio.wait_for(tool.ainvoke(args), timeout=timeout)), "success")
+                    outcome = "success"
+                except asyncio.TimeoutError:
+                    logger.warning("Tool %s timed out after %ss", name, timeout)
+                    result = (self.timeout_content(name, timeout), "error")
+                    outcome = "timeout"
+                except Exception as e:
+                    logger.warning("Tool %s failed: %s", name, e)
+                    result = (self.error_content(e), "error")
+                    outcome = "error"
+                self.record(name, outcome, started, len(calls))
+                emit_event("tool_end", tool=name, status=result[1], duration_ms=round((time.monotonic() - started) * 1000, 1))
+                return key, result
+
+        results = dict(await asyncio.gather(*[run(key, calls) for key, calls in unique.items()]))
+
+        return self.to_messages(tool_calls, results)
@@ -5,80 +5,52 @@ Retrieval tool:
     - get_embedding: embed the query
     - retrieve_context: retrieve the top k context
     - process_context: process the context    
+
+Each tool has an async twin (prefixed with "a") used by the async /rag path,
+the sync version stays the source of the tool description.
 """
 
-from langsmith import traceable, get_current_run_tree
-from qdrant_client import QdrantClient
-from qdrant_client.models import Prefetch, Filter, FieldCondition, MatchText, FusionQuery, MatchAny
-import openai
+from langsmith import traceable
+from qdrant_client.models import Prefetch, Filter, FieldCondition, FusionQuery, MatchAny
 from api.core.config import config
-
-
-# Functions needed to retrieve context, copied from retrieval.py
-@traceable(
-    name="embed_query",
-    run_type="embedding",
-    # metadata={"ls_provider": "openai", "ls_model_name": "text-embedding-3-small"}
-    metadata={"ls_provider": config.EMBEDDING_MODEL_PROVIDER, "ls_model_name": config.EMBEDDING_MODEL},
-)
-# def get_embedding(text, model="text-embedding-3-small"):
-def get_embedding(text, model=config.EMBEDDING_MODEL):
-    response = openai.embeddings.create(
-        input=[text],
-        model=model,
-    )
-
-    current_run = get_current_run_tree()
-    if current_run:
-        current_run.metadata["usage_metadata"] = {
-            "input_tokens": response.usage.prompt_tokens,
-            "total_tokens": response.usage.total_tokens,
-        }
-
-    return response.data[0].embedding
+from api.core.qdrant import get_qdrant_client, get_async_qdrant_client
+from api.core.metrics import QDRANT_SECONDS, timed
+from api.core.quantization import search_params
+from api.rag.embeddings import get_embedding, aget_embedding
+from api.rag.local_index import get_local_index
+from api.rag.sparse import keyword_prefetch
 
 
 ### Items tool ###
 
-@traceable(
-    name="retrieve_top_n",
-    run_type="retriever"
-)
-def retrieve_item_context(query, top_k=5):
-    query_embedding = get_embedding(query)
-
-    #qdrant_client = QdrantClient(url=f"{config.QDRANT_URL}")
-    qdrant_client = QdrantClient(url=f"http://{config.QDRANT_URL}:6333")
+ITEM_PREFETCH_LIMIT = 20 # candidates per prefetch (dense / text) before fusion
 
-    results = qdrant_client.query_points(
+# Query arguments shared by the sync and async retrieval
+def item_query_args(query, query_embedding, top_k):
+    return dict(
         collection_name = config.QDRANT_COLLECTION_NAME_ITEMS,
         prefetch=[
             Prefetch(
                 query=query_embedding,
-                limit=20
+                params=search_params(), # oversampling / rescoring when the collection is quantized
+                limit=ITEM_PREFETCH_LIMIT
             ),
-            Prefetch(
-                filter=Filter(
-                    must=[
-                        FieldCondition(
-                            key="text",
-                            match=MatchText(text=query)
-                        )
-                    ]
-                ),
-                limit=20
-            )
+            keyword_prefetch(query, ITEM_PREFETCH_LIMIT) # MatchText filter or BM25, see ITEM_KEYWORD_MODE
         ],
         query=FusionQuery(fusion="rrf"),
-        limit=top_k
+        limit=top_k,
+        timeout=config.QDRANT_QUERY_TIMEOUT
     )
 
+
+def item_context_from_points(points):
+
     retrieved_context_ids = []
     retrieved_context = []
     retrieved_prices = [] # NEW: to add to conext
     similarity_scores = []
 
-    for result in results.points:
+    for result in points:
         retrieved_context_ids.append(result.payload['parent_asin']) # get actual product id
         retrieved_context.append(result.payload['text'])
         retrieved_prices.append(result.payload.get('price', 'N/A'))  #NEW: to add to conext
@@ -92,6 +64,44 @@ def retrieve_item_context(query, top_k=5):
     }
 
 
+@traceable(
+    name="retrieve_top_n",
+    run_type="retriever"
+)
+def retrieve_item_context(query, top_k=5):
+    query_embedding = get_embedding(query)
+
+    local_index = get_local_index()
+    if local_index is not None:
+        return item_context_from_points(local_index.query(query, query_embedding, top_k, ITEM_PREFETCH_LIMIT))
+
+    qdrant_client = get_qdrant_client()
+
+    with timed(QDRANT_SECONDS, stage="retrieve", operation="item_search"):
+        results = qdrant_client.query_points(**item_query_args(query, query_embedding, top_k))
+
+    return item_context_from_points(results.points)
+
+
+@traceable(
+    name="retrieve_top_n",
+    run_type="retriever"
+)
+async def aretrieve_item_context(query, top_k=5):
+    query_embedding = await aget_embedding(query)
+
+    local_index = get_local_index()
+    if local_index is not None: # in-process search over a prepared index (BM25 postings built at load), run inline
+        return item_context_from_points(local_index.query(query, query_embedding, top_k, ITEM_PREFETCH_LIMIT))
+
+    qdrant_client = get_async_qdrant_client()
+
+    with timed(QDRANT_SECONDS, stage="retrieve", operation="item_search"):
+        results = await qdrant_client.query_points(**item_query_args(query, query_embedding, top_k))
+
+    return item_context_from_points(results.points)
+
+
 @traceable(
     name="format_retrieved_context",
     run_type="prompt"
@@ -125,43 +135,64 @@ def get_formatted_item_context(query: str, top_k: int = 5) -> str:
     return formatted_context
 
 
+async def aget_formatted_item_context(query: str, top_k: int = 5) -> str:
+    """Async version of get_formatted_item_context."""
+
+    context = await aretrieve_item_context(query, top_k)
+    formatted_context = process_item_context(context)
+
+    return formatted_context
+
+
 ### Reviews tool ###
 
-@traceable(
-    name="retrieve_top_n",
-    run_type="retriever"
-)
-def retrieve_review_context(query, item_list, top_k=20):
-    query_embedding = get_embedding(query)
+def review_filter(item_list):
+    return Filter(
+        must=[
+            FieldCondition(
+                key="parent_asin",
+                match=MatchAny(
+                    any=item_list
+                )
+            )
+        ]
+    )
 
-    qdrant_client = QdrantClient(url=config.QDRANT_URL)
 
-    results = qdrant_client.query_points(
+# Global top k over all the items (REVIEW_RETRIEVAL_MODE="global")
+def review_query_args(query_embedding, item_list, top_k):
+    return dict(
         collection_name=config.QDRANT_COLLECTION_NAME_REVIEWS,
-        prefetch=[
-            Prefetch(
-                query=query_embedding,
-                filter=Filter(
-                    must=[
-                        FieldCondition(
-                            key="parent_asin",
-                            match=MatchAny(
-                                any=item_list
-                            )
-                        )
-                    ]
-                ),
-                limit=top_k
-            )
-        ],
-        query=FusionQuery(fusion="rrf"), # not really needed, as we only have one prefetch, which filters by id, but kept for consistency
-        limit=top_k
+        query=query_embedding,
+        query_filter=review_filter(item_list),
+        search_params=search_params(),
+        limit=top_k,
+        timeout=config.QDRANT_QUERY_TIMEOUT
     )
 
+
+# Top reviews per item in one round trip (REVIEW_RETRIEVAL_MODE="grouped"). Each group may fill the
+# whole top_k budget (an item may get the slots of items with few or no reviews); review_context_from_groups
+# deals it out evenly, so one popular item can't take every slot
+def review_group_args(query_embedding, item_list, top_k):
+    return dict(
+        collection_name=config.QDRANT_COLLECTION_NAME_REVIEWS,
+        query=query_embedding,
+        query_filter=review_filter(item_list),
+        search_params=search_params(),
+        group_by="parent_asin",
+        limit=len(item_list),
+        group_size=top_k,
+        timeout=config.QDRANT_QUERY_TIMEOUT
+    )
+
+
+def review_context_from_points(points):
+
     retrieved_context_ids = []
     retrieved_context = []
 
-    for result in results.points:
+    for result in points:
         retrieved_context_ids.append(result.payload['parent_asin'])
         retrieved_context.append(result.payload['text'])
 
@@ -171,6 +202,70 @@ def retrieve_review_context(query, item_list, top_k=20):
     }
 
 
+def review_context_from_groups(groups, item_list, top_k):
+    """Reviews ordered by item (in the order the agent listed them), best first within an item.
+
+    At most top_k in total, dealt one per item in turn: every item gets
+    top_k // len(item_list), the first ones one more, and the slots of an item
+    with fewer reviews go to the next ones.
+    """
+    hits_by_item = {group.id: group.hits for group in groups}
+    ranked = [sorted(hits_by_item.get(item, []), key=lambda hit: (-hit.score, str(hit.id))) for item in item_list]
+    taken = [0] * len(ranked)
+    budget = top_k
+    while budget > 0:
+        dealt = budget
+        for i, hits in enumerate(ranked):
+            if budget > 0 and taken[i] < len(hits):
+                taken[i] += 1
+                budget -= 1
+        if budget == dealt: # every item is out of reviews
+            break
+    return review_context_from_points([hit for hits, count in zip(ranked, taken) for hit in hits[:count]])
+
+
+@traceable(
+    name="retrieve_top_n",
+    run_type="retriever"
+)
+def retrieve_review_context(query, item_list, top_k=20):
+    query_embedding = get_embedding(query)
+    item_list = list(dict.fromkeys(item_list)) # dedupe, keep order
+
+    qdrant_client = get_qdrant_client()
+
+    if config.REVIEW_RETRIEVAL_MODE == "grouped" and item_list:
+        with timed(QDRANT_SECONDS, stage="retrieve", operation="review_groups"):
+            results = qdrant_client.query_points_groups(**review_group_args(query_embedding, item_list, top_k))
+        return review_context_from_groups(results.groups, item_list, top_k)
+
+    with timed(QDRANT_SECONDS, stage="retrieve", operation="review_search"):
+        results = qdrant_client.query_points(**review_query_args(query_embedding, item_list, top_k))
+
+    return review_context_from_points(results.points)
+
+
+@traceable(
+    name="retrieve_top_n",
+    run_type="retriever"
+)
+async def aretrieve_review_context(query, item_list, top_k=20):
+    query_embedding = await aget_embedding(query)
+    item_list = list(dict.fromkeys(item_list))
+
+    qdrant_client = get_async_qdrant_client()
+
+    if config.REVIEW_RETRIEVAL_MODE == "grouped" and item_list:
+        with timed(QDRANT_SECONDS, stage="retrieve", operation="review_groups"):
+            results = await qdrant_client.query_points_groups(**review_group_args(query_embedding, item_list, top_k))
+        return review_context_from_groups(results.groups, item_list, top_k)
+
+    with timed(QDRANT_SECONDS, stage="retrieve", operation="review_search"):
+        results = await qdrant_client.query_points(**review_query_args(query_embedding, item_list, top_k))
+
+    return review_context_from_points(results.points)
+
+
 @traceable(
     name="format_retrieved_context",
     run_type="prompt"
@@ -201,4 +296,13 @@ def get_formatted_review_context(query: str, item_list: list[str], top_k: int =
     context = retrieve_review_context(query, item_list, top_k)
     formatted_context = process_review_context(context)
 
-    return formatted_context
\ No newline at end of file
+    return formatted_context
+
+
+async def aget_formatted_review_context(query: str, item_list: list[str], top_k: int = 20) -> str:
+    """Async version of get_formatted_review_context."""
+
+    context = await aretrieve_review_context(query, item_list, top_k)
+    formatted_context = process_review_context(context)
+
+    return formatted_context
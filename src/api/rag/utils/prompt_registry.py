@@ -0,0 +1,129 @@
+"""Cache of compiled prompt templates
+
+Templates are cached by (source, name, version):
+    - yaml: version is the file's mtime, the file is re-read only when it changes
+    - registry (LangSmith): refreshed in the background once older than the TTL
+      (stale-while-revalidate); the last known good copy is served, and written to
+      disk, so an unreachable LangSmith does not fail requests or restarts
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+import yaml
+from jinja2 import Template
+
+from api.core.config import config
+
+logger = logging.getLogger(__name__)
+
+
+class PromptRegistry:
+
+    def __init__(self, fetch_registry_template, ttl_seconds: float, cache_dir: str = ""):
+        self.fetch_registry_template = fetch_registry_template # prompt name -> (template string, version)
+        self.ttl = ttl_seconds
+        self.cache_dir = cache_dir
+        self._yaml = {} # (path, key) -> (mtime, version, Template)
+        self._registry = {} # name -> (fetched_at, version, Template)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    #################################################################################
+    # yaml
+    #################################################################################
+
+    def get_yaml(self, yaml_file: str, prompt_key: str) -> Template:
+        mtime = os.stat(yaml_file).st_mtime_ns
+        cached = self._yaml.get((yaml_file, prompt_key))
+        if cached and cached[0] == mtime:
+            return cached[2]
+
+        with open(yaml_file, "r") as f:
+            prompt_config = yaml.safe_load(f)
+        version = prompt_config.get("metadata", {}).get("version", "")
+        template = Template(prompt_config["prompts"][prompt_key]) # convert the string to jinja template
+
+        self._yaml[(yaml_file, prompt_key)] = (mtime, version, template)
+        logger.info("Loaded prompt %s from %s (version %s)", prompt_key, yaml_file, version)
+        return template
+
+    #################################################################################
+    # registry
+    #################################################################################
+
+    def get_registry(self, prompt_name: str) -> Template:
+        cached = self._registry.get(prompt_name)
+
+        if cached is None:
+            try:
+                return self._fetch(prompt_name)
+            except Exception as e:
+                lkg = self._load_last_known_good(prompt_name)
+                if lkg is None:
+                    raise
+                logger.warning("Prompt registry unreachable (%s), serving last known good %s", e, prompt_name)
+                return lkg
+
+        fetched_at, _, template = cached
+        if time.monotonic() - fetched_at > self.ttl:
+            self._refresh_in_background(prompt_name)
+        return template # stale copy is served while the refresh runs
+
+    def _fetch(self, prompt_name: str) -> Template:
+        template_content, version = self.fetch_registry_template(prompt_name)
+        template = Template(template_content)
+        self._registry[prompt_name] = (time.monotonic(), version, template)
+        self._save_last_known_good(prompt_name, template_content, version)
+        return template
+
+    def _refresh_in_background(self, prompt_name: str):
+        with self._lock:
+            if prompt_name in self._refreshing: # single flight per prompt
+                return
+            self._refreshing.add(prompt_name)
+
+        def refresh():
+            try:
+                self._fetch(prompt_name)
+            except Exception as e:
+                logger.warning("Prompt %s refresh failed, keeping last known good: %s", prompt_name, e)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(prompt_name)
+
+        threading.Thread(target=refresh, name=f"prompt-refresh-{prompt_name}", daemon=True).start()
+
+    def _lkg_path(self, prompt_name: str) -> str:
+        return os.path.join(self.cache_dir, f"{prompt_name}.json")
+
+    def _save_last_known_good(self, prompt_name: str, template_content: str, version: str):
+        if not self.cache_dir:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = self._lkg_path(prompt_name) + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"template": template_content, "version": version}, f)
+            os.replace(tmp_path, self._lkg_path(prompt_name))
+        except OSError as e:
+            logger.warning("Could not save last known good prompt %s: %s", prompt_name, e)
+
+    def _load_last_known_good(self, prompt_name: str):
+        if not self.cache_dir or not os.path.exists(self._lkg_path(prompt_name)):
+            return None
+        with open(self._lkg_path(prompt_name)) as f:
+            saved = json.load(f)
+        template = Template(saved["template"])
+        # fetched_at 0: stale, so the next call retries the registry in the background
+        self._registry[prompt_name] = (0.0, saved.get("version", ""), template)
+        return template
+
+    def versions(self) -> dict:
+        return {
+            "yaml": {f"{path}:{key}": version for (path, key), (_, version, _) in self._yaml.items()},
+            "registry": {name: version for name, (_, version, _) in self._registry.items()},
+        }
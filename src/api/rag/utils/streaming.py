@@ -0,0 +1,30 @@
+"""Progress events emitted from inside graph nodes for the /rag/stream endpoint
+
+Nodes call emit_event(...); the events reach the endpoint through langgraph's
+"custom" stream mode. Outside a streamed run (graph.invoke / ainvoke) they are no-ops.
+"""
+
+import json
+
+from langgraph.config import get_config, get_stream_writer
+
+
+def emit_event(event: str, **data):
+    try:
+        writer = get_stream_writer()
+    except RuntimeError: # called outside of a graph run
+        return
+    writer({"event": event, **data})
+
+
+def stream_tokens_enabled() -> bool:
+    """True when the run was started by the streaming endpoint (answer tokens are wanted)."""
+    try:
+        return bool(get_config().get("configurable", {}).get("stream_tokens"))
+    except RuntimeError:
+        return False
+
+
+def sse_event(event: str, data: dict) -> str:
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
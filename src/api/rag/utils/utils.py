@@ -1,37 +1,38 @@
-import yaml
-from jinja2 import Template
-from langsmith import Client
 import ast
 from typing import Dict, Any
 import inspect
 import json
 from langchain_core.messages import AIMessage, ToolMessage
 import api.rag.tools as tools
+from api.rag.utils.prompt_registry import PromptRegistry
+from api.core.config import config
+from api.core.langsmith_client import get_langsmith_client
 
 
 #####################################################################################
 # Prompt template
 #####################################################################################
 
-# Read the yaml file and return the template
+# Read the yaml file and return the template (cached, re-read only when the file changes)
 def prompt_template_config(yaml_file, prompt_key):
-    
-    with open(yaml_file, "r") as f:
-        config = yaml.safe_load(f)    
-    template_content = config["prompts"][prompt_key] # a string
-    template = Template(template_content) # convert the string to jinja template
-    
-    return template
+    return prompt_registry.get_yaml(yaml_file, prompt_key)
 
 
-# Load from registry
-ls_client = Client()
-def prompt_template_regstry(prompt_name):
+# Load from registry (the LangSmith client is created on the first pull, not at import)
+def fetch_registry_template(prompt_name):
     # get_promt return metadata, pull - template; 0- system, 1 user
-    # returns a string
-    template_content = ls_client.pull_prompt(prompt_name).messages[1].prompt.template 
-    template = Template(template_content) # convert the string to jinja template
-    return template
+    # returns a string and the commit hash as version
+    prompt = get_langsmith_client().pull_prompt(prompt_name)
+    template_content = prompt.messages[1].prompt.template
+    version = (prompt.metadata or {}).get("lc_hub_commit_hash", "")
+    return template_content, version
+
+
+prompt_registry = PromptRegistry(fetch_registry_template, config.PROMPT_REGISTRY_TTL_SECONDS, config.PROMPT_CACHE_DIR)
+
+# Cached, refreshed in the background (stale-while-revalidate)
+def prompt_template_regstry(prompt_name):
+    return prompt_registry.get_registry(prompt_name)
 
 
 #####################################################################################
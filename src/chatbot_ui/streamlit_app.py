@@ -1,6 +1,7 @@
 import streamlit as st
 import requests
 import uuid
+import json
 import logging
 from src.chatbot_ui.core.config import settings
 
@@ -58,6 +59,31 @@ def api_call(method, url, **kwargs):
         return False, {"message": str(e)}
 
 
+def api_stream(url, **kwargs):
+    """Yield (event, data) pairs from a server-sent events endpoint"""
+
+    try:
+        with requests.post(url, stream=True, **kwargs) as response:
+            if not response.ok:
+                yield "error", {"message": f"Server returned {response.status_code}"}
+                return
+
+            event, data_lines = None, []
+            for line in response.iter_lines(chunk_size=None, decode_unicode=True): # chunk_size=None: yield data as it arrives
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    data_lines.append(line[len("data:"):].strip())
+                elif line == "" and event: # blank line ends an event
+                    yield event, json.loads("\n".join(data_lines))
+                    event, data_lines = None, []
+
+    except requests.exceptions.ConnectionError:
+        yield "error", {"message": "Connection error. Please check your network connection."}
+    except requests.exceptions.Timeout:
+        yield "error", {"message": "The request timed out. Please try again later."}
+
+
 def submit_feedback(feedback_type=None, feedback_text=""):
     """Submit feedback to the API endpoint"""
 
@@ -113,15 +139,8 @@ if "trace_id" not in st.session_state:
     st.session_state.trace_id = None
     
 
-# Sidebar - Suggestions
-with st.sidebar:
-    st.markdown("### Suggestions")
-    
-    # Create or get the placeholder
-    if st.session_state.sidebar_placeholder is None:
-        st.session_state.sidebar_placeholder = st.empty()
-    
-    # Clear and rebuild the suggestions
+def render_suggestions():
+    """Clear and rebuild the suggestions"""
     with st.session_state.sidebar_placeholder.container():
         if st.session_state.retrieved_items:
             for idx, item in enumerate(st.session_state.retrieved_items):
@@ -133,6 +152,15 @@ with st.sidebar:
         else:
             st.info("No suggestions yet")
 
+
+# Sidebar - Suggestions
+with st.sidebar:
+    st.markdown("### Suggestions")
+    
+    # New placeholder on every run, so the stream can refill it when product cards arrive
+    st.session_state.sidebar_placeholder = st.empty()
+    render_suggestions()
+
 # Main content - Chat interface
 
 # Display all messages
@@ -224,18 +252,38 @@ if prompt := st.chat_input("Hello! How can I assist you today?"):
     with st.chat_message("user"):
         st.markdown(prompt)
     
-    with st.spinner("Thinking..."):
-        # NEW, add the session id to the request
-        status, output = api_call("post", f"{settings.API_URL}/rag", json={"query": prompt, "thread_id": session_id})
-        # Update retrieved items
-        st.session_state.retrieved_items = output.get("used_image_urls", [])
-        st.session_state.trace_id = output.get("trace_id", None)
-        
-        # Clear the sidebar placeholder to force refresh
-        if st.session_state.sidebar_placeholder is not None:
-            st.session_state.sidebar_placeholder.empty()
-        
-        response_content = output.get("answer", str(output))
-    
+    # Stream the answer: progress of the agent steps and tools, answer tokens, then product cards
+    with st.chat_message("assistant"):
+        progress = st.status("Thinking...", expanded=False)
+        answer_placeholder = st.empty()
+        answer_text = ""
+        response_content = None
+
+        for event, data in api_stream(f"{settings.API_URL}/rag/stream", json={"query": prompt, "thread_id": session_id}):
+            if event == "agent_start":
+                answer_text = "" # every agent step writes a new answer, only the last one is final
+                progress.update(label=f"Thinking (step {data['iteration']})...")
+            elif event == "token":
+                answer_text += data["delta"]
+                answer_placeholder.markdown(answer_text + "▌")
+            elif event == "tool_start":
+                progress.write(f"Running {data['tool']}...")
+            elif event == "tool_end":
+                progress.write(f"{data['tool']} finished in {data['duration_ms']:.0f} ms ({data['status']})")
+            elif event == "products":
+                # Update retrieved items
+                st.session_state.retrieved_items = data.get("used_image_urls", [])
+                render_suggestions()
+            elif event == "done":
+                st.session_state.trace_id = data.get("trace_id", None)
+                response_content = data.get("answer")
+            elif event == "error":
+                st.session_state["error_popup"] = {"visible": True, "message": data.get("message")}
+                response_content = data.get("message")
+
+        response_content = response_content or answer_text
+        progress.update(label="Done", state="complete")
+        answer_placeholder.markdown(response_content)
+
     st.session_state.messages.append({"role": "assistant", "content": response_content})
     st.rerun()
\ No newline at end of file
@@ -0,0 +1,28 @@
+"""Offline settings of the tests (same placeholders as benchmarks/common.py)
+
+Set before anything imports api.core.config: without a .env it fills in the
+settings it requires, and it always turns LangSmith tracing and the on-disk
+embedding cache off. No test calls a network service.
+"""
+
+import os
+
+OFFLINE_ENV = {
+    "OPENAI_API_KEY": "offline",
+    "GROQ_API_KEY": "offline",
+    "GOOGLE_API_KEY": "offline",
+    "QDRANT_URL": "localhost",
+    "QDRANT_COLLECTION_NAME_ITEMS": "test-items",
+    "QDRANT_COLLECTION_NAME_REVIEWS": "test-reviews",
+    "EMBEDDING_MODEL": "text-embedding-3-small",
+    "EMBEDDING_MODEL_PROVIDER": "openai",
+    "GENERATION_MODEL": "gpt-4.1",
+    "GENERATION_MODEL_PROVIDER": "openai",
+    "LANGSMITH_ENDPOINT": "http://localhost:1",
+    "LANGSMITH_API_KEY": "offline",
+    "LANGSMITH_PROJECT": "tests",
+}
+for key, value in OFFLINE_ENV.items():
+    os.environ.setdefault(key, value)
+os.environ["LANGSMITH_TRACING"] = "false"
+os.environ["EMBEDDING_CACHE_PATH"] = ""
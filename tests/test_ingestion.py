@@ -0,0 +1,177 @@
+"""Ingestion pipeline and incremental reindex against an in-memory Qdrant (no embeddings API)"""
+
+import asyncio
+import json
+
+import pytest
+from qdrant_client import AsyncQdrantClient
+
+from api.core.catalog_version import acatalog_version
+from api.core.config import config
+from api.ingestion.pipeline import ingest, hashing_embedder
+from api.ingestion.records import point_id
+from api.ingestion.reindex import reindex
+
+COLLECTION = "test-items"
+DIM = 8
+
+
+def item_row(asin: str, price: float = 10.0, title: str = None) -> dict:
+    return {
+        "parent_asin": asin,
+        "title": title or f"Wireless earbuds {asin}",
+        "features": ["bluetooth", "long battery life"],
+        "price": price,
+        "average_rating": 4.5,
+        "rating_number": 120,
+        "images": [{"large": f"https://img/{asin}.jpg"}],
+    }
+
+
+def write_dump(path, rows):
+    lines = [row if isinstance(row, str) else json.dumps(row) for row in rows]
+    path.write_text("\n".join(lines) + "\n")
+    return path
+
+
+async def all_points(client) -> dict:
+    points, _ = await client.scroll(COLLECTION, limit=1000, with_payload=True)
+    return {str(point.id): point.payload for point in points}
+
+
+def failing_embedder(fail_on_call: int):
+    """hashing_embedder() that raises on its fail_on_call-th call, as an interrupted run."""
+    embed = hashing_embedder(DIM)
+    calls = {"count": 0}
+
+    async def flaky(texts):
+        calls["count"] += 1
+        if calls["count"] == fail_on_call:
+            raise RuntimeError("embeddings API down")
+        return await embed(texts)
+    flaky.model = embed.model
+    return flaky
+
+
+@pytest.fixture
+def checkpoint_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "INGEST_CHECKPOINT_DIR", str(tmp_path / "ingestion"))
+    return tmp_path / "ingestion"
+
+
+def run_ingest(client, path, embedder=None, **kwargs):
+    kwargs = {"batch_size": 2, "embed_concurrency": 1, "upsert_concurrency": 1, **kwargs}
+    return ingest("items", str(path), COLLECTION, embedder or hashing_embedder(DIM), client, **kwargs)
+
+
+def test_ingest_writes_every_record(tmp_path, checkpoint_dir):
+    dump = write_dump(tmp_path / "items.jsonl", [item_row(f"A{i}") for i in range(5)])
+
+    async def scenario():
+        client = AsyncQdrantClient(":memory:")
+        stats = await run_ingest(client, dump)
+        return stats, await all_points(client), await acatalog_version(client, COLLECTION)
+
+    stats, points, version = asyncio.run(scenario())
+    assert stats["finished"] and stats["points"] == 5 and stats["run_points"] == 5
+    assert set(points) == {point_id("item", f"A{i}") for i in range(5)}
+    assert all(payload["content_hash"] and payload["payload_hash"] for payload in points.values())
+    assert version # a run that wrote points bumps the catalog version
+
+
+def test_ingest_skips_malformed_lines(tmp_path, checkpoint_dir):
+    dump = write_dump(tmp_path / "items.jsonl", [
+        item_row("A0"),
+        "{not json",
+        {"title": "no parent_asin"},
+        item_row("A1"),
+        {"parent_asin": "A2"}, # nothing to embed
+    ])
+
+    async def scenario():
+        client = AsyncQdrantClient(":memory:")
+        return await run_ingest(client, dump), await all_points(client)
+
+    stats, points = asyncio.run(scenario())
+    assert stats["finished"] and stats["points"] == 2 and stats["skipped"] == 3
+    assert set(points) == {point_id("item", "A0"), point_id("item", "A1")}
+
+
+def test_ingest_resumes_after_an_interrupted_run(tmp_path, checkpoint_dir):
+    dump = write_dump(tmp_path / "items.jsonl", [item_row(f"A{i}") for i in range(7)])
+
+    async def scenario():
+        client = AsyncQdrantClient(":memory:")
+        with pytest.raises(ExceptionGroup):
+            await run_ingest(client, dump, embedder=failing_embedder(fail_on_call=3)) # batches 1 and 2 written
+        interrupted = await all_points(client)
+        resumed = await run_ingest(client, dump)
+        return interrupted, resumed, await all_points(client)
+
+    interrupted, resumed, points = asyncio.run(scenario())
+    assert len(interrupted) == 4
+    assert resumed["run_points"] == 3 # only what the interrupted run did not write
+    assert resumed["finished"] and resumed["points"] == 7 and resumed["line"] == 7
+    assert set(points) == {point_id("item", f"A{i}") for i in range(7)}
+
+
+def test_ingest_does_not_rerun_a_finished_file(tmp_path, checkpoint_dir):
+    dump = write_dump(tmp_path / "items.jsonl", [item_row(f"A{i}") for i in range(3)])
+
+    async def scenario():
+        client = AsyncQdrantClient(":memory:")
+        await run_ingest(client, dump)
+        return await run_ingest(client, dump), await run_ingest(client, dump, restart=True)
+
+    again, restarted = asyncio.run(scenario())
+    assert again["run_points"] == 0
+    assert restarted["run_points"] == 3
+
+
+def test_reindex_applies_the_diff(tmp_path, checkpoint_dir):
+    rows = [item_row(f"A{i}") for i in range(6)]
+    dump = write_dump(tmp_path / "items.jsonl", rows)
+
+    async def scenario():
+        client = AsyncQdrantClient(":memory:")
+        await run_ingest(client, dump)
+        before = await all_points(client)
+        version = await acatalog_version(client, COLLECTION)
+
+        new_rows = [
+            item_row("A0"), # unchanged
+            item_row("A1", title="Noise cancelling earbuds A1"), # changed: re-embedded
+            item_row("A2", price=5.0), # payload only
+            item_row("A3"), item_row("A4"),
+            item_row("A9"), # new
+        ] # A5 deleted
+        write_dump(dump, new_rows)
+        dry_run = await reindex("items", str(dump), COLLECTION, hashing_embedder(DIM), client, dry_run=True)
+        result = await reindex("items", str(dump), COLLECTION, hashing_embedder(DIM), client)
+        return before, version, dry_run, result, await all_points(client), await acatalog_version(client, COLLECTION)
+
+    before, version, dry_run, result, points, new_version = asyncio.run(scenario())
+    counts = {key: result[key] for key in ("new", "changed", "payload_only", "unchanged", "deleted")}
+    assert counts == {"new": 1, "changed": 1, "payload_only": 1, "unchanged": 3, "deleted": 1}
+    assert {key: dry_run[key] for key in counts} == counts
+    assert result["embedded"] == 2 # new and changed only
+
+    assert set(points) == {point_id("item", asin) for asin in ["A0", "A1", "A2", "A3", "A4", "A9"]}
+    assert points[point_id("item", "A2")]["price"] == 5.0
+    assert points[point_id("item", "A1")]["content_hash"] != before[point_id("item", "A1")]["content_hash"]
+    assert new_version != version
+
+
+def test_reindex_refuses_mass_deletes(tmp_path, checkpoint_dir):
+    dump = write_dump(tmp_path / "items.jsonl", [item_row(f"A{i}") for i in range(6)])
+
+    async def scenario():
+        client = AsyncQdrantClient(":memory:")
+        await run_ingest(client, dump)
+        write_dump(dump, [item_row("A0")]) # truncated dump
+        result = await reindex("items", str(dump), COLLECTION, hashing_embedder(DIM), client)
+        return result, await all_points(client)
+
+    result, points = asyncio.run(scenario())
+    assert result["deleted"] == 0
+    assert len(points) == 6
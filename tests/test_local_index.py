@@ -0,0 +1,49 @@
+"""In-process items index: several workers exporting into the shared LOCAL_INDEX_DIR"""
+
+import multiprocessing
+
+from qdrant_client import QdrantClient
+from qdrant_client.models import VectorParams, Distance, PointStruct
+
+WORKERS = 6
+ROUNDS = 15
+
+
+def refresh_worker(directory: str, errors):
+    """One API worker: its own client over the same points, forced refreshes (export, publish, prune, load)."""
+    from api.core.config import config
+    from api.rag import local_index
+
+    client = QdrantClient(":memory:")
+    client.create_collection("items", vectors_config=VectorParams(size=8, distance=Distance.COSINE))
+    client.upsert("items", points=[
+        PointStruct(id=i, vector=[float(i + 1)] * 8, payload={"parent_asin": f"A{i}", "text": f"item {i}", "price": i})
+        for i in range(200)
+    ])
+    local_index.get_qdrant_client = lambda: client
+    config.QDRANT_COLLECTION_NAME_ITEMS = "items"
+    config.LOCAL_INDEX_KEEP_VERSIONS = 2
+
+    manager = local_index.LocalIndexManager(directory, refresh_seconds=0)
+    for _ in range(ROUNDS):
+        try:
+            manager.refresh(force=True)
+        except Exception as e:
+            errors.put(repr(e))
+
+
+def test_concurrent_exports_never_remove_a_version_being_loaded(tmp_path):
+    context = multiprocessing.get_context("fork")
+    errors = context.Queue()
+    workers = [context.Process(target=refresh_worker, args=(str(tmp_path), errors)) for _ in range(WORKERS)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+
+    failures = []
+    while not errors.empty():
+        failures.append(errors.get())
+    assert failures == []
+    assert all(worker.exitcode == 0 for worker in workers)
+    assert len([path for path in tmp_path.glob("v-*") if path.is_dir()]) <= 2
@@ -0,0 +1,43 @@
+"""Grouped review retrieval: one query_points_groups call, the top_k budget dealt between the items"""
+
+from types import SimpleNamespace
+
+from api.rag.tools import review_context_from_groups, review_group_args
+
+TOP_K = 20
+
+
+def group(asin: str, count: int, group_size: int = TOP_K) -> SimpleNamespace:
+    """The group of an item with `count` matching reviews, as Qdrant returns it: at most group_size hits."""
+    hits = [
+        SimpleNamespace(id=f"{asin}-{i}", score=1.0 - i / 100, payload={"parent_asin": asin, "text": f"{asin} review {i}"})
+        for i in range(min(count, group_size))
+    ]
+    return SimpleNamespace(id=asin, hits=hits)
+
+
+def test_each_group_may_take_the_whole_budget():
+    args = review_group_args([0.0] * 8, ["A", "B"], TOP_K)
+    assert args["limit"] == 2
+    assert args["group_size"] == TOP_K
+
+
+def test_slots_of_an_item_with_few_reviews_go_to_the_others():
+    # A has only 2 reviews, B plenty
+    group_size = review_group_args([0.0] * 8, ["A", "B"], TOP_K)["group_size"]
+    groups = [group("A", 2, group_size), group("B", 25, group_size)]
+    context = review_context_from_groups(groups, ["A", "B"], TOP_K)
+    assert context["retrieved_context_ids"] == ["A"] * 2 + ["B"] * 18
+    assert context["retrieved_context"][:3] == ["A review 0", "A review 1", "B review 0"]
+
+
+def test_budget_is_split_evenly_between_popular_items():
+    groups = [group("B", TOP_K), group("A", TOP_K), group("C", TOP_K)]
+    context = review_context_from_groups(groups, ["A", "B", "C"], TOP_K)
+    # in the order the agent listed the items, the first ones get the remainder
+    assert context["retrieved_context_ids"] == ["A"] * 7 + ["B"] * 7 + ["C"] * 6
+
+
+def test_items_without_reviews_are_skipped():
+    context = review_context_from_groups([group("B", 3)], ["A", "B", "C"], TOP_K)
+    assert context["retrieved_context_ids"] == ["B"] * 3
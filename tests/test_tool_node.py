@@ -0,0 +1,63 @@
+"""Sync tool node: timeouts when hung tools hold every worker of the shared pool"""
+
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import StructuredTool
+
+from api.rag.tool_node import ConcurrentToolNode
+
+TIMEOUT = 0.3
+
+
+def agent_step(*names) -> SimpleNamespace:
+    tool_calls = [{"name": name, "args": {}, "id": f"call_{index}"} for index, name in enumerate(names)]
+    return SimpleNamespace(messages=[AIMessage(content="", tool_calls=tool_calls)])
+
+
+def invoke_within(node, state, seconds: float) -> dict | None:
+    """node.invoke(state) in a thread, None if it has not returned after `seconds`."""
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(node.invoke(state)), daemon=True)
+    thread.start()
+    thread.join(seconds)
+    return None if thread.is_alive() else result
+
+
+def test_stuck_tool_does_not_block_later_calls():
+    release = threading.Event()
+    stuck = StructuredTool.from_function(lambda: release.wait() and "late", name="stuck", description="never returns")
+    fast = StructuredTool.from_function(lambda: "ok", name="fast", description="returns at once")
+    node = ConcurrentToolNode([stuck, fast], max_concurrency=1, default_timeout=TIMEOUT, queue_timeout=TIMEOUT)
+    try:
+        first = invoke_within(node, agent_step("stuck"), seconds=5)
+        assert first is not None
+        assert json.loads(first["messages"][0].content)["error"] == "tool_timeout"
+
+        # the stuck tool still holds the only worker: the call can't start, it times out instead of waiting forever
+        start = time.monotonic()
+        second = invoke_within(node, agent_step("fast"), seconds=5)
+        assert second is not None
+        assert time.monotonic() - start < 5 * TIMEOUT
+        assert json.loads(second["messages"][0].content)["error"] == "tool_timeout"
+    finally:
+        release.set()
+
+    # once the pool has a free worker again, tools run normally
+    third = invoke_within(node, agent_step("fast"), seconds=5)
+    assert third is not None and third["messages"][0].content == "ok"
+
+
+def test_queued_time_is_not_charged_to_the_tool():
+    slow = StructuredTool.from_function(lambda n=0: time.sleep(TIMEOUT * 0.6) or "done", name="slow", description="takes a while")
+    node = ConcurrentToolNode([slow], max_concurrency=1, default_timeout=TIMEOUT, queue_timeout=5 * TIMEOUT)
+    # three calls on one worker: the last one waits 1.2 timeouts for it, then runs within its own timeout
+    state = SimpleNamespace(messages=[AIMessage(content="", tool_calls=[
+        {"name": "slow", "args": {"n": n}, "id": f"call_{n}"} for n in range(3)
+    ])])
+    result = invoke_within(node, state, seconds=5)
+    assert result is not None
+    assert [message.content for message in result["messages"]] == ["done", "done", "done"]